@@ -0,0 +1,114 @@
+import os, threading, time
+from collections import deque
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# ------------------------------------------------------
+# Configuración del motor de base de datos
+# ------------------------------------------------------
+# URI y parámetros del pool salen de variables de entorno:
+#   DATABASE_URI          base de datos principal
+#   DATABASE_REPLICA_URI  réplica de lectura opcional (bind "replica")
+#   DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT
+#   DB_POOL_RECYCLE       segundos; menor que wait_timeout de MySQL
+#   DB_POOL_PRE_PING      true/false; descarta conexiones cerradas por el servidor
+# Cada worker de gunicorn tiene su propio pool: el máximo de conexiones
+# por contenedor es workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW). Por defecto
+# 5 + 3 = 8, una por hilo (WEB_THREADS): con 4 workers son 32 por réplica, y
+# réplicas * 32 (más los consumidores) debe quedar por debajo de
+# max_connections de MySQL (151 por defecto).
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "3"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "280"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_WAIT_SAMPLES = 1024
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout por una conexión."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._waits = deque(maxlen=DB_POOL_WAIT_SAMPLES)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+                self._waits.append(wait)
+
+    def stats(self):
+        with self._stats_lock:
+            waits = sorted(self._waits)
+            checkouts, timeouts = self.checkouts, self.timeouts
+            wait_total, wait_max = self.wait_total, self.wait_max
+        capacity = self.size() + self._max_overflow
+        checked_out = self.checkedout()
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": checked_out,
+            "overflow": max(self.overflow(), 0),
+            "utilization": round(checked_out / capacity, 3) if capacity > 0 else None,
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_ms_avg": round(wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+            "wait_ms_p99": round(waits[min(int(len(waits) * 0.99), len(waits) - 1)] * 1000, 3) if waits else 0.0,
+            "wait_ms_max": round(wait_max * 1000, 3),
+        }
+
+
+def engine_options(uri):
+    """Opciones de create_engine para la URI dada."""
+    if uri.startswith("sqlite"):
+        # SQLite no usa un pool de red; sólo se alarga la espera por el lock del archivo
+        return {"connect_args": {"timeout": 30}}
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def configure_database(app, default_uri):
+    """Configura la app con DATABASE_URI (o default_uri) y la réplica opcional."""
+    uri = os.getenv("DATABASE_URI", default_uri)
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(uri)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    replica_uri = os.getenv("DATABASE_REPLICA_URI")
+    if replica_uri:
+        app.config["SQLALCHEMY_BINDS"] = {"replica": dict(engine_options(replica_uri), url=replica_uri)}
+
+
+def pool_stats(db):
+    """Uso del pool de cada motor (requiere app context)."""
+    stats = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        name = key or "primary"
+        if isinstance(pool, TimedQueuePool):
+            stats[name] = pool.stats()
+        else:
+            stats[name] = {"status": pool.status()}
+    return stats
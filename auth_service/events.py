@@ -0,0 +1,131 @@
+import json, os, queue, threading, time
+import pika
+from sqlalchemy.exc import SQLAlchemyError
+from metrics import metrics
+from tracing import tracer
+
+# ------------------------------------------------------
+# Publicación de revocaciones de tokens (logout)
+# ------------------------------------------------------
+# Los servicios que validan JWT localmente (purchase_service) escuchan el
+# exchange fanout token_revocations para invalidar su caché de claims.
+# El /logout sólo encola el mensaje; lo publica un hilo de E/S propio de
+# cada proceso, así que un broker lento o caído no frena las peticiones.
+# Cada suscriptor (de auth o de purchase) recarga las revocaciones
+# vigentes tras enlazar su cola, de modo que un mensaje perdido durante
+# una caída del broker se recupera en la siguiente reconexión.
+
+REVOCATION_EXCHANGE = "token_revocations"
+REVOCATION_MAX_PENDING = int(os.getenv("REVOCATION_MAX_PENDING", "10000"))
+
+metrics.histogram("rabbitmq_publish_duration_seconds", "Publicación de un evento hasta la confirmación del broker")
+
+
+class RevocationPublisher:
+    """Publica revocaciones desde un hilo de E/S con conexión persistente."""
+
+    def __init__(self, host, max_pending=REVOCATION_MAX_PENDING):
+        self.host = host
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pending = None
+        self._connection = None
+        self._channel = None
+        self.stats = {"published": 0, "dropped": 0, "errors": 0}
+
+    def publish(self, message):
+        """Encola la revocación sin bloquear. False si la cola local está llena."""
+        self._ensure_started()
+        try:
+            # La traza se toma aquí: el hilo de E/S no tiene la de la petición
+            self._pending.put_nowait((json.dumps(message), tracer.inject({})))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            print("[Auth Service] ❌ Cola de revocaciones llena, se descarta la publicación")
+            return False
+        return True
+
+    def _ensure_started(self):
+        # Tras un fork (workers de gunicorn) el hilo no existe en el hijo
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pending = queue.Queue(maxsize=self.max_pending)
+            self._connection = None
+            self._channel = None
+            threading.Thread(target=self._run, daemon=True, name="revocation-publisher").start()
+            self._pid = os.getpid()
+
+    def _connect(self):
+        self._connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+        self._channel = self._connection.channel()
+        self._channel.exchange_declare(exchange=REVOCATION_EXCHANGE, exchange_type="fanout")
+        self._channel.confirm_delivery()
+
+    def _send(self, body, headers):
+        """Publica una revocación; reintenta una vez si la conexión estaba caída."""
+        with metrics.timed("rabbitmq_publish_duration_seconds", target=REVOCATION_EXCHANGE):
+            for attempt in range(2):
+                try:
+                    if self._channel is None or not self._connection.is_open:
+                        self._connect()
+                    self._channel.basic_publish(exchange=REVOCATION_EXCHANGE, routing_key="", body=body,
+                                                properties=pika.BasicProperties(headers=headers))
+                    self.stats["published"] += 1
+                    return True
+                except pika.exceptions.AMQPError as e:
+                    self._connection = None
+                    self._channel = None
+                    if attempt:
+                        self.stats["errors"] += 1
+                        print(f"[Auth Service] ❌ No se pudo publicar la revocación: {e}")
+        return False
+
+    def _run(self):
+        while True:
+            self._send(*self._pending.get())
+
+
+class RevocationSubscriber:
+    """Replica en memoria las revocaciones hechas en otras réplicas de auth_service."""
+
+    def __init__(self, host, store):
+        self.host = host
+        self.store = store
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name="revocation-subscriber").start()
+
+    def _on_message(self, ch, method, properties, body):
+        msg = json.loads(body)
+        if msg.get("jti") and msg.get("exp"):
+            self.store.add(msg["jti"], msg["exp"])
+
+    def _run(self):
+        while True:
+            connection = None
+            try:
+                connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+                channel = connection.channel()
+                channel.exchange_declare(exchange=REVOCATION_EXCHANGE, exchange_type="fanout")
+                declared = channel.queue_declare(queue="", exclusive=True)
+                channel.queue_bind(exchange=REVOCATION_EXCHANGE, queue=declared.method.queue)
+                channel.basic_consume(queue=declared.method.queue,
+                                      on_message_callback=self._on_message, auto_ack=True)
+                # Con la cola ya enlazada: recupera lo revocado mientras no lo estaba
+                self.store.load()
+                channel.start_consuming()
+            except pika.exceptions.AMQPError as e:
+                print(f"[Auth Service] ❌ Suscripción de revocaciones caída ({e}), reintentando en 3s...")
+            except SQLAlchemyError as e:
+                print(f"[Auth Service] ❌ No se pudieron cargar las revocaciones ({e}), reintentando en 3s...")
+            finally:
+                try:
+                    if connection is not None and connection.is_open:
+                        connection.close()
+                except pika.exceptions.AMQPError:
+                    pass
+            time.sleep(3)
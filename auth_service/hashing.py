@@ -0,0 +1,114 @@
+import multiprocessing, os, threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash
+from metrics import metrics
+
+# ------------------------------------------------------
+# Hashing de contraseñas en un pool de procesos
+# ------------------------------------------------------
+# PBKDF2 es trabajo de CPU: se ejecuta fuera del hilo de la petición para
+# que /validate no espere detrás de una ráfaga de logins. La cola es
+# acotada; cuando está llena, o la operación no termina en HASH_TIMEOUT, se
+# rechaza la petición (503) en lugar de acumular latencia. Los procesos del
+# pool se crean con forkserver: un fork del worker (que ya tiene hilos) podría
+# heredar locks tomados.
+
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+# Cada worker de gunicorn tiene su propio pool: por defecto los núcleos
+# disponibles repartidos entre WEB_WORKERS, entre 1 y 2 procesos por worker
+AVAILABLE_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+HASH_WORKERS = int(os.getenv("HASH_WORKERS") or
+                   max(1, min(2, AVAILABLE_CPUS // max(int(os.getenv("WEB_WORKERS", "1")), 1))))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "32"))
+HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", "10"))
+
+# Los procesos del pool parten de un servidor de forkserver que ya importó
+# este módulo (y werkzeug): cada proceso nuevo no tiene que volver a hacerlo
+_MP_CONTEXT = multiprocessing.get_context("forkserver")
+_MP_CONTEXT.set_forkserver_preload([__name__])
+
+metrics.histogram("password_hash_seconds", "Hash o verificación de contraseña, incluida la espera en el pool")
+
+
+class HashingOverloaded(Exception):
+    """No hay capacidad para más operaciones de hash en este momento."""
+
+
+def hash_prefix(hashed):
+    """Parte del hash que describe el método y sus parámetros."""
+    return hashed.split("$", 1)[0]
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(stored, password, method, prefix):
+    """Verifica y, si los parámetros cambiaron, devuelve el nuevo hash."""
+    if not check_password_hash(stored, password):
+        return False, None
+    if hash_prefix(stored) != prefix:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+class PasswordHasher:
+    """Hash y verificación de contraseñas con capacidad acotada."""
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=HASH_WORKERS,
+                 queue_size=HASH_QUEUE_SIZE, timeout=HASH_TIMEOUT):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        # Forma canónica de los parámetros (p. ej. "pbkdf2:sha256:600000")
+        self.prefix = hash_prefix(generate_password_hash("", method=method))
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.stats = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0, "timeouts": 0}
+
+    def _pool(self):
+        # Un pool por proceso (también tras el fork de un worker de gunicorn)
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=_MP_CONTEXT)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            self.stats["rejected"] += 1
+            raise HashingOverloaded("servicio de autenticación saturado")
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # El hueco se libera cuando el pool termina la operación, no cuando el
+        # llamante deja de esperarla: así la cola acota el trabajo real
+        future.add_done_callback(lambda _: self._slots.release())
+        with metrics.timed("password_hash_seconds", op=fn.__name__.lstrip("_")):
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()
+                self.stats["timeouts"] += 1
+                raise HashingOverloaded("servicio de autenticación saturado (timeout)")
+
+    def hash(self, password):
+        """Genera el hash de una contraseña con los parámetros configurados."""
+        self.stats["hashed"] += 1
+        return self._run(_hash, password, self.method)
+
+    def verify(self, stored, password):
+        """Devuelve (válida, nuevo_hash); nuevo_hash sólo si hay que rehashear."""
+        self.stats["verified"] += 1
+        ok, new_hash = self._run(_verify, stored, password, self.method, self.prefix)
+        if new_hash:
+            self.stats["rehashed"] += 1
+        return ok, new_hash
@@ -0,0 +1,44 @@
+import fcntl, os, tempfile, threading
+
+# ------------------------------------------------------
+# Coordinación entre workers de un mismo contenedor
+# ------------------------------------------------------
+# Con gunicorn cada worker importa la aplicación por separado. Las tareas
+# que sólo deben ejecutarse una vez por contenedor (crear tablas, consumir
+# la cola, purgas periódicas) se coordinan con un flock sobre un archivo
+# en LOCK_DIR: el kernel libera el lock si el proceso que lo tiene muere,
+# y otro worker toma el relevo.
+
+LOCK_DIR = os.getenv("LOCK_DIR", tempfile.gettempdir())
+
+_held = []
+
+
+def _open_lock(name):
+    return open(os.path.join(LOCK_DIR, f"{name}.lock"), "a+")
+
+
+def run_exclusive(name, fn):
+    """Ejecuta fn con el lock tomado; los demás workers esperan su turno."""
+    with _open_lock(name) as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            return fn()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def start_as_leader(name, start):
+    """Llama a start() en el primer worker que obtenga el lock.
+
+    Los demás quedan esperando en un hilo y toman el relevo si el líder muere.
+    """
+    def wait_for_lock():
+        lock_file = _open_lock(name)
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # El lock dura lo que dure el proceso
+        _held.append(lock_file)
+        print(f"[leader] pid {os.getpid()} ejecuta {name}")
+        start()
+
+    threading.Thread(target=wait_for_lock, daemon=True, name=f"leader-{name}").start()
@@ -0,0 +1,5 @@
+from models import db
+class RevokedToken(db.Model):
+    __tablename__ = "revoked_token"
+    jti = db.Column(db.String(64), primary_key=True)
+    expires_at = db.Column(db.Float, nullable=False, index=True)
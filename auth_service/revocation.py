@@ -0,0 +1,120 @@
+import heapq, os, threading, time
+from sqlalchemy.exc import IntegrityError
+from models import db
+from models.revoked_token import RevokedToken
+
+# ------------------------------------------------------
+# Almacén de tokens revocados (logout)
+# ------------------------------------------------------
+# Las entradas se indexan por el jti del token y desaparecen solas cuando
+# pasa su "exp". La consulta en /validate es siempre un acceso O(1) a un
+# diccionario en memoria; el backend MySQL sólo añade persistencia entre
+# reinicios, y las réplicas se mantienen sincronizadas por el exchange
+# token_revocations (ver events.RevocationSubscriber).
+
+REVOCATION_BACKEND = os.getenv("REVOCATION_BACKEND", "mysql")  # memory | mysql
+REVOCATION_PRUNE_INTERVAL = float(os.getenv("REVOCATION_PRUNE_INTERVAL", "60"))
+
+
+class MemoryRevocationStore:
+    """Revocaciones en memoria: dict jti -> exp más un heap por expiración."""
+
+    def __init__(self):
+        self._entries = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def add(self, jti, exp):
+        """Registra la revocación localmente (sin persistir)."""
+        with self._lock:
+            if jti in self._entries:
+                return
+            self._entries[jti] = exp
+            heapq.heappush(self._heap, (exp, jti))
+
+    def load(self):
+        """Nada que cargar: las revocaciones sólo viven en memoria."""
+
+    def revoke(self, jti, exp):
+        self.add(jti, exp)
+
+    def is_revoked(self, jti):
+        exp = self._entries.get(jti)
+        return exp is not None and exp > time.time()
+
+    def active(self):
+        """Revocaciones vigentes como [(jti, exp)]."""
+        now = time.time()
+        with self._lock:
+            return [(jti, exp) for jti, exp in self._entries.items() if exp > now]
+
+    def prune(self):
+        """Elimina las entradas expiradas. Devuelve cuántas se borraron."""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, jti = heapq.heappop(self._heap)
+                self._entries.pop(jti, None)
+                removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MySQLRevocationStore(MemoryRevocationStore):
+    """Revocaciones persistidas en la tabla revoked_token con copia en memoria."""
+
+    def __init__(self, app):
+        super().__init__()
+        self.app = app
+
+    def load(self):
+        """Carga en memoria las revocaciones vigentes (al arrancar)."""
+        with self.app.app_context():
+            rows = RevokedToken.query.filter(RevokedToken.expires_at > time.time()).all()
+            for row in rows:
+                self.add(row.jti, row.expires_at)
+
+    def active(self):
+        """Revocaciones vigentes según la tabla (también las de otras réplicas)."""
+        rows = RevokedToken.query.filter(RevokedToken.expires_at > time.time()).all()
+        return [(row.jti, row.expires_at) for row in rows]
+
+    def revoke(self, jti, exp):
+        self.add(jti, exp)
+        db.session.add(RevokedToken(jti=jti, expires_at=exp))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Ya estaba revocado (logout repetido o desde otra réplica)
+            db.session.rollback()
+
+    def prune(self):
+        removed = super().prune()
+        with self.app.app_context():
+            RevokedToken.query.filter(RevokedToken.expires_at <= time.time()) \
+                .delete(synchronize_session=False)
+            db.session.commit()
+        return removed
+
+
+def create_store(app, backend=REVOCATION_BACKEND):
+    """Crea el almacén configurado (vacío hasta llamar a load())."""
+    if backend == "mysql":
+        return MySQLRevocationStore(app)
+    return MemoryRevocationStore()
+
+
+def start_pruning(store):
+    """Arranca la purga periódica de las revocaciones expiradas."""
+    def prune_forever():
+        while True:
+            time.sleep(REVOCATION_PRUNE_INTERVAL)
+            try:
+                store.prune()
+            except Exception as e:
+                print(f"[Auth Service] ❌ Error purgando revocaciones: {e}")
+
+    threading.Thread(target=prune_forever, daemon=True, name="revocation-prune").start()
@@ -0,0 +1,16 @@
+import os, sys, tempfile
+
+# ------------------------------------------------------
+# Pruebas de auth_service
+# ------------------------------------------------------
+# Los módulos del servicio se importan como en el contenedor (desde su
+# directorio) y la base de datos es un SQLite desechable; ninguna prueba
+# necesita MySQL ni RabbitMQ. El forkserver del pool de hashing es un
+# intérprete nuevo: encuentra hashing.py por PYTHONPATH.
+# Uso:  cd auth_service && python -m pytest -q
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [SERVICE_DIR, os.environ.get("PYTHONPATH")]))
+os.environ["DATABASE_URI"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "auth.db")
+os.environ.pop("DATABASE_REPLICA_URI", None)
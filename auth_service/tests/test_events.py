@@ -0,0 +1,109 @@
+import json, threading, time
+import pika
+import pytest
+import events
+from events import RevocationPublisher, RevocationSubscriber
+
+
+class FakeChannel:
+    def __init__(self, log):
+        self.log = log
+
+    def exchange_declare(self, **kwargs):
+        pass
+
+    def confirm_delivery(self):
+        pass
+
+    def queue_declare(self, **kwargs):
+        return type("Declared", (), {"method": type("Method", (), {"queue": "q"})})
+
+    def queue_bind(self, **kwargs):
+        self.log.append("bind")
+
+    def basic_consume(self, **kwargs):
+        pass
+
+    def start_consuming(self):
+        self.log.append("consume")
+        raise pika.exceptions.AMQPConnectionError("caída")
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.log.append(json.loads(body))
+
+
+class FakeConnection:
+    is_open = True
+
+    def __init__(self, log):
+        self._channel = FakeChannel(log)
+
+    def channel(self):
+        return self._channel
+
+    def close(self):
+        pass
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_publish_does_not_wait_for_the_broker(monkeypatch):
+    log = []
+    release = threading.Event()
+
+    def slow_connection(params):
+        release.wait(2)
+        return FakeConnection(log)
+
+    monkeypatch.setattr(events.pika, "BlockingConnection", slow_connection)
+    publisher = RevocationPublisher("rabbitmq")
+    started = time.monotonic()
+    assert publisher.publish({"jti": "a", "exp": 1})
+    assert time.monotonic() - started < 0.5
+    release.set()
+    assert wait_for(lambda: publisher.stats["published"] == 1)
+    assert log == [{"jti": "a", "exp": 1}]
+
+
+def test_publish_drops_when_queue_is_full(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(events.pika, "BlockingConnection",
+                        lambda params: release.wait(2) and FakeConnection([]))
+    publisher = RevocationPublisher("rabbitmq", max_pending=1)
+    publisher.publish({"jti": "a"})
+    assert wait_for(lambda: publisher._pending.empty())
+    assert publisher.publish({"jti": "b"})
+    assert publisher.publish({"jti": "c"}) is False
+    assert publisher.stats["dropped"] == 1
+    release.set()
+
+
+class Stop(Exception):
+    pass
+
+
+class FakeStore:
+    def __init__(self, log):
+        self.log = log
+
+    def load(self):
+        self.log.append("load")
+
+
+def test_subscriber_reloads_store_after_every_bind(monkeypatch):
+    log = []
+
+    def sleep(seconds):
+        if log.count("consume") == 2:
+            raise Stop()
+
+    monkeypatch.setattr(events.pika, "BlockingConnection", lambda params: FakeConnection(log))
+    monkeypatch.setattr(events.time, "sleep", sleep)
+    with pytest.raises(Stop):
+        RevocationSubscriber("rabbitmq", FakeStore(log))._run()
+    assert log == ["bind", "load", "consume"] * 2
@@ -0,0 +1,52 @@
+import threading, time
+import pytest
+from hashing import HashingOverloaded, PasswordHasher, hash_prefix
+
+FAST = "pbkdf2:sha256:1000"
+
+
+@pytest.fixture(scope="module")
+def hasher():
+    return PasswordHasher(method=FAST, workers=1, queue_size=0, timeout=5)
+
+
+def test_hash_and_verify_in_pool(hasher):
+    hashed = hasher.hash("secreto")
+    assert hash_prefix(hashed) == FAST
+    assert hasher.verify(hashed, "secreto") == (True, None)
+    assert hasher.verify(hashed, "otro") == (False, None)
+
+
+def test_verify_rehashes_when_parameters_change(hasher):
+    old = PasswordHasher(method="pbkdf2:sha256:2000", workers=0).hash("secreto")
+    valid, new_hash = hasher.verify(old, "secreto")
+    assert valid and hash_prefix(new_hash) == FAST
+    assert hasher.stats["rehashed"] >= 1
+
+
+def test_inline_without_workers():
+    hasher = PasswordHasher(method=FAST, workers=0)
+    assert hasher.verify(hasher.hash("secreto"), "secreto") == (True, None)
+
+
+def test_full_queue_is_rejected(hasher):
+    busy = threading.Thread(target=hasher._run, args=(time.sleep, 0.5))
+    busy.start()
+    time.sleep(0.1)
+    with pytest.raises(HashingOverloaded):
+        hasher.hash("secreto")
+    busy.join()
+    assert hasher.stats["rejected"] == 1
+
+
+def test_timeout_keeps_slot_until_work_ends():
+    hasher = PasswordHasher(method=FAST, workers=1, queue_size=0, timeout=0.2)
+    hasher.hash("calentar")  # arranca el proceso del pool
+    with pytest.raises(HashingOverloaded):
+        hasher._run(time.sleep, 0.6)
+    assert hasher.stats["timeouts"] == 1
+    # El proceso sigue ocupado: el hueco no se libera hasta que termina
+    with pytest.raises(HashingOverloaded):
+        hasher.hash("secreto")
+    time.sleep(0.6)
+    assert hash_prefix(hasher.hash("secreto")) == FAST
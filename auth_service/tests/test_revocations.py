@@ -0,0 +1,36 @@
+import time
+from types import SimpleNamespace
+import pytest
+import app as app_module
+from app import app, create_token, db
+from revocation import MemoryRevocationStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    published = []
+    monkeypatch.setattr(app_module.revocation_publisher, "publish", published.append)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        client = app.test_client()
+        client.published = published
+        yield client
+        db.session.remove()
+
+
+def test_active_skips_expired_entries():
+    store = MemoryRevocationStore()
+    store.add("vigente", time.time() + 60)
+    store.add("expirado", time.time() - 1)
+    assert [jti for jti, _ in store.active()] == ["vigente"]
+
+
+def test_logout_is_listed_in_revocations(client):
+    token = create_token(SimpleNamespace(id=1, email="ana@example.com"))
+    assert client.get("/revocations").get_json() == {"revocations": []}
+    assert client.post("/logout", json={"token": token}).status_code == 200
+    jti = client.published[0]["jti"]
+    assert client.get("/revocations").get_json()["revocations"] == [
+        {"jti": jti, "exp": client.published[0]["exp"]}]
+    assert client.post("/validate", json={"token": token}).status_code == 401
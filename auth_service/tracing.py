@@ -0,0 +1,253 @@
+import contextvars, json, os, random, threading, time
+from collections import deque
+from contextlib import contextmanager
+from flask import g, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# ------------------------------------------------------
+# Trazas distribuidas (W3C traceparent)
+# ------------------------------------------------------
+# Cada petición HTTP abre un span que continúa el traceparent recibido (o
+# empieza una traza nueva con probabilidad TRACE_SAMPLE_RATE). El contexto
+# viaja en la cabecera traceparent de las llamadas HTTP salientes, en el
+# outbox y en los mensajes de RabbitMQ (campo "trace" de cada evento y
+# cabecera AMQP traceparent), así que el consumidor del catálogo cuelga
+# sus spans de la petición que originó el cambio. Los commits de la
+# sesión SQLAlchemy dentro de un span muestreado generan su propio span.
+#
+# Exportadores locales, sin servicios externos (TRACE_EXPORTER):
+#   memory  últimos TRACE_MEMORY_SPANS spans del proceso, en GET /traces/<trace_id>
+#   file    una línea JSON por span en TRACE_FILE (varios servicios pueden
+#           compartir el archivo; ver benchmarks/trace_breakdown.py)
+#   none    sólo propagación
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "memory")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.ndjson")
+TRACE_MEMORY_SPANS = int(os.getenv("TRACE_MEMORY_SPANS", "10000"))
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+def parse_traceparent(value):
+    """Devuelve (trace_id, span_id, muestreado) o None si la cabecera no es válida."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "sampled",
+                 "start", "_started", "attributes", "status")
+
+    def __init__(self, trace_id, parent_id, name, sampled, start=None, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.start = start if start is not None else time.time()
+        self._started = time.perf_counter()
+        self.attributes = attributes or {}
+        self.status = "ok"
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+class MemoryExporter:
+    """Últimos spans del proceso en memoria."""
+
+    def __init__(self, maxlen=TRACE_MEMORY_SPANS):
+        self.spans = deque(maxlen=maxlen)
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def find(self, trace_id):
+        return [span for span in list(self.spans) if span["trace_id"] == trace_id]
+
+
+class FileExporter:
+    """Una línea JSON por span, en modo append (seguro entre procesos)."""
+
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def export(self, span):
+        line = json.dumps(span) + "\n"
+        with self._lock:
+            if self._pid != os.getpid():
+                self._file = open(self.path, "a", buffering=1)
+                self._pid = os.getpid()
+            self._file.write(line)
+
+
+def create_exporter(kind=TRACE_EXPORTER):
+    if kind == "file":
+        return FileExporter()
+    if kind == "memory":
+        return MemoryExporter()
+    return None
+
+
+class Tracer:
+    """Crea, propaga y exporta spans."""
+
+    def __init__(self, service="", exporter=None, sample_rate=TRACE_SAMPLE_RATE):
+        self.service = service
+        self.exporter = exporter if exporter is not None else create_exporter()
+        self.sample_rate = sample_rate
+        self.stats = {"started": 0, "sampled": 0, "exported": 0}
+
+    # --------------------------------------------------
+    # Spans
+    # --------------------------------------------------
+    def start_span(self, name, parent=None, start=None, **attributes):
+        """Nuevo span hijo de parent (Span o traceparent) o, si no hay, del actual."""
+        if parent is None:
+            parent = _current.get()
+        if isinstance(parent, str):
+            parent = parse_traceparent(parent)
+        elif isinstance(parent, Span):
+            parent = (parent.trace_id, parent.span_id, parent.sampled)
+        self.stats["started"] += 1
+        if parent is None:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < self.sample_rate
+        else:
+            trace_id, parent_id, sampled = parent
+        if sampled:
+            self.stats["sampled"] += 1
+        return Span(trace_id, parent_id, name, sampled, start, attributes)
+
+    def end_span(self, span, status=None, end=None):
+        if status is not None:
+            span.status = status
+        if not span.sampled or self.exporter is None:
+            return
+        duration = (end - span.start if end is not None
+                    else time.perf_counter() - span._started)
+        self.exporter.export({
+            "trace_id": span.trace_id, "span_id": span.span_id, "parent_id": span.parent_id,
+            "service": self.service, "name": span.name, "start": span.start,
+            "duration_ms": round(duration * 1000, 3), "status": span.status,
+            "attributes": span.attributes,
+        })
+        self.stats["exported"] += 1
+
+    @contextmanager
+    def span(self, name, parent=None, **attributes):
+        """Span alrededor del bloque; es el span actual mientras dura."""
+        span = self.start_span(name, parent=parent, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException:
+            span.status = "error"
+            raise
+        finally:
+            _current.reset(token)
+            self.end_span(span)
+
+    def record(self, name, parent, start, end, **attributes):
+        """Exporta un span ya terminado (p. ej. medido entre dos procesos)."""
+        span = self.start_span(name, parent=parent, start=start, **attributes)
+        self.end_span(span, end=end)
+
+    def traceparent(self):
+        """traceparent del span actual para propagarlo, o None si no se muestrea."""
+        span = _current.get()
+        return span.traceparent if span is not None and span.sampled else None
+
+    def inject(self, headers):
+        """Añade traceparent a un dict de cabeceras (HTTP o AMQP)."""
+        value = self.traceparent()
+        if value:
+            headers["traceparent"] = value
+        return headers
+
+    # --------------------------------------------------
+    # Integración con Flask y SQLAlchemy
+    # --------------------------------------------------
+    def init_app(self, app, service):
+        """Span por petición, spans de commit y GET /traces/<trace_id>."""
+        self.service = service
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        event.listen(Session, "before_commit", self._before_commit)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+        app.add_url_rule("/traces/<trace_id>", "traces", self._traces_view, methods=["GET"])
+
+    def _before_request(self):
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        span = self.start_span(f"{request.method} {rule}", parent=request.headers.get("traceparent") or None)
+        g.trace_span, g.trace_token = span, _current.set(span)
+
+    def _after_request(self, response):
+        span = g.get("trace_span")
+        if span is not None:
+            span.attributes["status_code"] = response.status_code
+            if span.sampled:
+                response.headers["X-Trace-Id"] = span.trace_id
+        return response
+
+    def _teardown_request(self, exc):
+        span = g.pop("trace_span", None)
+        if span is None:
+            return
+        _current.reset(g.pop("trace_token"))
+        failed = exc is not None or span.attributes.get("status_code", 200) >= 500
+        self.end_span(span, status="error" if failed else None)
+
+    def _before_commit(self, session):
+        parent = _current.get()
+        if parent is not None and parent.sampled:
+            session.info["trace_commit"] = self.start_span("db.commit", parent=parent)
+
+    def _after_commit(self, session):
+        span = session.info.pop("trace_commit", None)
+        if span is not None:
+            self.end_span(span)
+
+    def _after_rollback(self, session):
+        span = session.info.pop("trace_commit", None)
+        if span is not None:
+            self.end_span(span, status="error")
+
+    def _traces_view(self, trace_id):
+        """
+        Spans de una traza registrados por este proceso (TRACE_EXPORTER=memory)
+        ---
+        tags:
+          - Estado
+        parameters:
+          - in: path
+            name: trace_id
+            required: true
+            type: string
+        responses:
+          200:
+            description: Spans ordenados por inicio
+          404:
+            description: El exportador no es memory
+        """
+        if not isinstance(self.exporter, MemoryExporter):
+            return jsonify({"error": "TRACE_EXPORTER no es memory"}), 404
+        return jsonify(sorted(self.exporter.find(trace_id), key=lambda s: s["start"]))
+
+
+tracer = Tracer()
@@ -0,0 +1,74 @@
+"""
+Benchmark de carga mixta sobre auth_service.
+
+Lanza hilos que hacen login continuamente (trabajo PBKDF2) mientras otros
+llaman a /validate, y reporta logins por segundo y la latencia de cola
+de /validate. Ejecutar una vez con HASH_WORKERS=0 (hash en el hilo de la
+petición) y otra con el pool de procesos para comparar.
+
+Uso:
+    AUTH_BASE_URL=http://localhost:5001 python benchmarks/auth_login_bench.py --seconds 20
+"""
+import argparse, os, threading, time
+import requests
+
+AUTH_BASE_URL = os.getenv("AUTH_BASE_URL", "http://localhost:5001")
+EMAIL = "bench@bookstore.local"
+PASSWORD = "bench-password"
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--login-threads", type=int, default=16)
+    parser.add_argument("--validate-threads", type=int, default=4)
+    args = parser.parse_args()
+
+    requests.post(f"{AUTH_BASE_URL}/register", json={"email": EMAIL, "password": PASSWORD})
+    token = requests.post(f"{AUTH_BASE_URL}/login", json={"email": EMAIL, "password": PASSWORD}).json()["token"]
+
+    deadline = time.monotonic() + args.seconds
+    lock = threading.Lock()
+    logins = {"ok": 0, "rejected": 0, "errors": 0}
+    validate_latencies = []
+
+    def login_worker():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            resp = session.post(f"{AUTH_BASE_URL}/login", json={"email": EMAIL, "password": PASSWORD})
+            key = "ok" if resp.status_code == 200 else "rejected" if resp.status_code == 503 else "errors"
+            with lock:
+                logins[key] += 1
+
+    def validate_worker():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            session.post(f"{AUTH_BASE_URL}/validate", json={"token": token})
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                validate_latencies.append(elapsed)
+
+    threads = [threading.Thread(target=login_worker) for _ in range(args.login_threads)]
+    threads += [threading.Thread(target=validate_worker) for _ in range(args.validate_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(f"logins/s:            {logins['ok'] / args.seconds:.1f}")
+    print(f"logins rechazados:   {logins['rejected']} (503)  errores: {logins['errors']}")
+    print(f"/validate llamadas:  {len(validate_latencies)}")
+    for p in (50, 95, 99):
+        print(f"/validate p{p}:       {percentile(validate_latencies, p):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark de importación/exportación masiva de libros en purchase_service.
+
+Envía N libros generados al vuelo a POST /books/bulk (cuerpo en streaming,
+sin construirlo en memoria) e informa filas por segundo y el pico de
+memoria del servidor; después descarga GET /books/export en streaming.
+Con --single compara contra el mismo número de POST /books individuales.
+
+Uso:
+    PURCHASE_BASE_URL=http://localhost:5003 \\
+        python benchmarks/bulk_import_bench.py --rows 100000 --format ndjson --single 500
+"""
+import argparse, csv, io, json, os, time
+import requests
+
+PURCHASE_BASE_URL = os.getenv("PURCHASE_BASE_URL", "http://localhost:5003")
+FIELDS = ("title", "author", "description", "price", "stock")
+
+
+def book(i):
+    return {"title": f"Libro masivo {i}", "author": f"Autor {i % 500}",
+            "description": "Importado por bulk_import_bench " * 3,
+            "price": round(5 + (i % 90) * 0.5, 2), "stock": i % 40}
+
+
+def generate_body(rows, fmt):
+    """Cuerpo por bloques de 1000 filas (requests lo envía con chunked encoding)."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+        writer.writeheader()
+    for start in range(0, rows, 1000):
+        books = [book(i) for i in range(start, min(start + 1000, rows))]
+        if fmt == "csv":
+            writer.writerows(books)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            chunk = "".join(json.dumps(b) + "\n" for b in books)
+        yield chunk.encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--single", type=int, default=0,
+                        help="libros a crear con POST /books uno a uno para comparar")
+    args = parser.parse_args()
+
+    session = requests.Session()
+    content_type = "text/csv" if args.format == "csv" else "application/x-ndjson"
+
+    start = time.perf_counter()
+    response = session.post(f"{PURCHASE_BASE_URL}/books/bulk", params={"format": args.format},
+                            data=generate_body(args.rows, args.format),
+                            headers={"Content-Type": content_type})
+    elapsed = time.perf_counter() - start
+    report = response.json()
+    print(f"POST /books/bulk ({args.format}) -> {response.status_code}")
+    print(f"  importados:           {report.get('imported')} en {elapsed:.2f}s "
+          f"({report.get('imported', 0) / elapsed:,.0f} filas/s extremo a extremo)")
+    print(f"  servidor:             {report.get('rows_per_second')} filas/s, "
+          f"{report.get('chunks')} lotes, {report.get('events')} eventos")
+    print(f"  memoria del servidor: pico {report.get('max_rss_mb')} MB "
+          f"(+{report.get('max_rss_growth_mb')} MB durante el import)")
+    if report.get("rejected"):
+        print(f"  rechazadas:           {report['rejected']}")
+
+    start = time.perf_counter()
+    exported = 0
+    with session.get(f"{PURCHASE_BASE_URL}/books/export", params={"format": args.format},
+                     stream=True) as export:
+        for _ in export.iter_lines():
+            exported += 1
+    elapsed = time.perf_counter() - start
+    if args.format == "csv":
+        exported -= 1
+    print(f"GET /books/export ({args.format}): {exported} libros en {elapsed:.2f}s "
+          f"({exported / elapsed:,.0f} filas/s)")
+
+    if args.single:
+        start = time.perf_counter()
+        for i in range(args.single):
+            session.post(f"{PURCHASE_BASE_URL}/books", json=book(i))
+        elapsed = time.perf_counter() - start
+        print(f"POST /books x{args.single}: {args.single / elapsed:,.0f} filas/s")
+
+
+if __name__ == "__main__":
+    main()
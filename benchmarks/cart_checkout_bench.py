@@ -0,0 +1,64 @@
+"""
+Benchmark de checkout: N llamadas a POST /purchase contra un POST /purchases/batch.
+
+Crea libros de prueba en purchase_service, obtiene un token en
+auth_service y compara el tiempo de comprar un carrito de N libros con N
+llamadas individuales frente a una sola llamada al endpoint de carrito.
+
+Uso:
+    AUTH_BASE_URL=http://localhost:5001 PURCHASE_BASE_URL=http://localhost:5003 \\
+        python benchmarks/cart_checkout_bench.py --cart-size 10 --carts 50
+"""
+import argparse, os, time
+import requests
+
+AUTH_BASE_URL = os.getenv("AUTH_BASE_URL", "http://localhost:5001")
+PURCHASE_BASE_URL = os.getenv("PURCHASE_BASE_URL", "http://localhost:5003")
+EMAIL = "cart-bench@bookstore.local"
+PASSWORD = "bench-password"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cart-size", type=int, default=10)
+    parser.add_argument("--carts", type=int, default=50)
+    args = parser.parse_args()
+
+    session = requests.Session()
+    session.post(f"{AUTH_BASE_URL}/register", json={"email": EMAIL, "password": PASSWORD})
+    token = session.post(f"{AUTH_BASE_URL}/login", json={"email": EMAIL, "password": PASSWORD}).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    stock = args.carts * 2 + 10
+    book_ids = [
+        session.post(f"{PURCHASE_BASE_URL}/books", json={
+            "title": f"Libro de carrito {i}", "author": "Bench", "description": "",
+            "price": 10.0 + i, "stock": stock}).json()["book_id"]
+        for i in range(args.cart_size)
+    ]
+    cart = [{"book_id": book_id, "quantity": 1} for book_id in book_ids]
+
+    start = time.perf_counter()
+    for _ in range(args.carts):
+        for line in cart:
+            resp = session.post(f"{PURCHASE_BASE_URL}/purchase", json=line, headers=headers)
+            assert resp.status_code == 201, resp.text
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.carts):
+        resp = session.post(f"{PURCHASE_BASE_URL}/purchases/batch", json={"items": cart}, headers=headers)
+        assert resp.status_code == 201, resp.text
+    batch = time.perf_counter() - start
+
+    print(f"carritos: {args.carts} x {args.cart_size} libros")
+    print(f"{'modo':<28}{'segundos':>10}{'ms/carrito':>12}{'líneas/s':>10}")
+    lines = args.carts * args.cart_size
+    for label, seconds in ((f"{args.cart_size} x POST /purchase", single),
+                           ("1 x POST /purchases/batch", batch)):
+        print(f"{label:<28}{seconds:>10.2f}{seconds / args.carts * 1000:>12.1f}{lines / seconds:>10.0f}")
+    print(f"aceleración: {single / batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
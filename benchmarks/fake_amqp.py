@@ -0,0 +1,262 @@
+"""
+Sustituto en memoria de RabbitMQ/pika para la suite de carga.
+
+Implementa el subconjunto de pika.BlockingConnection que usan los
+servicios (colas, exchanges fanout, publicación con mandatory, consumo
+con prefetch, ack/nack y start_consuming) sobre un único broker en el
+proceso. install() lo registra como módulo "pika" antes de importar los
+servicios, de modo que purchase → catalog y auth → purchase intercambian
+eventos sin un broker real.
+"""
+import itertools, sys, threading, types
+from collections import deque
+
+
+class AMQPError(Exception):
+    pass
+
+
+class AMQPConnectionError(AMQPError):
+    pass
+
+
+class ChannelClosedByBroker(AMQPError):
+    pass
+
+
+class UnroutableError(AMQPError):
+    def __init__(self, messages=None):
+        self.messages = messages or []
+        super().__init__(f"{len(self.messages)} mensajes sin cola de destino")
+
+
+class NackError(UnroutableError):
+    pass
+
+
+class Broker:
+    """Colas y bindings compartidos por todas las conexiones del proceso."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.queues = {}
+        self.bindings = {}
+        self.seq = 0
+        self._names = itertools.count(1)
+        self.stats = {"published": 0, "delivered": 0, "unroutable": 0}
+
+    def declare_queue(self, name, passive=False):
+        with self.cond:
+            if not name:
+                name = f"amq.gen-{next(self._names)}"
+            if name not in self.queues:
+                if passive:
+                    raise ChannelClosedByBroker(f"NOT_FOUND - no queue '{name}'")
+                self.queues[name] = deque()
+            return name, len(self.queues[name])
+
+    def declare_exchange(self, name):
+        with self.cond:
+            self.bindings.setdefault(name, set())
+
+    def bind(self, exchange, queue):
+        with self.cond:
+            self.bindings.setdefault(exchange, set()).add(queue)
+
+    def delete_queue(self, name):
+        with self.cond:
+            self.queues.pop(name, None)
+            for queues in self.bindings.values():
+                queues.discard(name)
+
+    def publish(self, exchange, routing_key, properties, body, mandatory):
+        with self.cond:
+            targets = [routing_key] if not exchange else list(self.bindings.get(exchange, ()))
+            targets = [name for name in targets if name in self.queues]
+            if not targets:
+                self.stats["unroutable"] += 1
+                if mandatory:
+                    raise UnroutableError([body])
+            for name in targets:
+                self.queues[name].append((properties, body))
+            self.stats["published"] += 1
+            self.seq += 1
+            self.cond.notify_all()
+
+    def take(self, queue, limit=None):
+        with self.cond:
+            pending = self.queues.get(queue)
+            if not pending:
+                return []
+            count = len(pending) if limit is None else min(limit, len(pending))
+            items = [pending.popleft() for _ in range(count)]
+            self.stats["delivered"] += len(items)
+            return items
+
+    def requeue(self, queue, items):
+        with self.cond:
+            pending = self.queues.get(queue)
+            if pending is None:
+                return
+            pending.extendleft(reversed(items))
+            self.seq += 1
+            self.cond.notify_all()
+
+    def wait(self, seq, timeout):
+        """Espera a que llegue algo nuevo desde la secuencia seq."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != seq, timeout)
+
+    def depth(self):
+        with self.cond:
+            return sum(len(pending) for pending in self.queues.values())
+
+
+BROKER = Broker()
+
+
+class BasicProperties:
+    def __init__(self, content_type=None, delivery_mode=None, headers=None, **kwargs):
+        self.content_type = content_type
+        self.delivery_mode = delivery_mode
+        self.headers = headers
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+def ConnectionParameters(host="localhost", **kwargs):
+    return types.SimpleNamespace(host=host, **kwargs)
+
+
+class BlockingChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.prefetch = 0
+        self.consumers = []
+        self.unacked = {}
+        self._tags = itertools.count(1)
+        self._consuming = False
+
+    def queue_declare(self, queue="", passive=False, durable=False, exclusive=False,
+                      auto_delete=False, arguments=None):
+        name, count = BROKER.declare_queue(queue, passive)
+        if exclusive:
+            self.connection.exclusive.append(name)
+        return types.SimpleNamespace(method=types.SimpleNamespace(queue=name, message_count=count))
+
+    def exchange_declare(self, exchange, exchange_type="direct", **kwargs):
+        BROKER.declare_exchange(exchange)
+
+    def queue_bind(self, queue, exchange, routing_key=None, **kwargs):
+        BROKER.bind(exchange, queue)
+
+    def basic_qos(self, prefetch_count=0, **kwargs):
+        self.prefetch = prefetch_count
+
+    def confirm_delivery(self):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.connection.check_open()
+        BROKER.publish(exchange, routing_key, properties or BasicProperties(), body, mandatory)
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, **kwargs):
+        self.consumers.append((queue, on_message_callback, auto_ack))
+        return f"ctag-{len(self.consumers)}"
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        for tag in [t for t in self.unacked if t == delivery_tag or (multiple and t <= delivery_tag)]:
+            del self.unacked[tag]
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        tags = sorted(t for t in self.unacked if t == delivery_tag or (multiple and t <= delivery_tag))
+        items = [self.unacked.pop(tag) for tag in tags]
+        if requeue:
+            self._requeue(items)
+
+    def start_consuming(self):
+        self._consuming = True
+        while self._consuming and self.connection.is_open:
+            self.connection.process_data_events(time_limit=1)
+
+    def stop_consuming(self):
+        self._consuming = False
+
+    def _requeue(self, items):
+        by_queue = {}
+        for queue, properties, body in items:
+            by_queue.setdefault(queue, []).append((properties, body))
+        for queue, messages in by_queue.items():
+            BROKER.requeue(queue, messages)
+
+    def deliver(self):
+        delivered = 0
+        for queue, callback, auto_ack in list(self.consumers):
+            limit = None
+            if not auto_ack and self.prefetch:
+                limit = self.prefetch - len(self.unacked)
+                if limit <= 0:
+                    continue
+            for properties, body in BROKER.take(queue, limit):
+                tag = next(self._tags)
+                if not auto_ack:
+                    self.unacked[tag] = (queue, properties, body)
+                callback(self, types.SimpleNamespace(delivery_tag=tag, routing_key=queue), properties, body)
+                delivered += 1
+        return delivered
+
+    def close(self):
+        self._requeue(self.unacked.values())
+        self.unacked.clear()
+
+
+class BlockingConnection:
+    def __init__(self, parameters=None):
+        self.parameters = parameters
+        self.is_open = True
+        self.channels = []
+        self.exclusive = []
+
+    def channel(self):
+        self.check_open()
+        channel = BlockingChannel(self)
+        self.channels.append(channel)
+        return channel
+
+    def check_open(self):
+        if not self.is_open:
+            raise AMQPConnectionError("conexión cerrada")
+
+    def process_data_events(self, time_limit=0):
+        self.check_open()
+        seq = BROKER.seq
+        if sum(channel.deliver() for channel in self.channels) or not time_limit:
+            return
+        BROKER.wait(seq, time_limit)
+        for channel in self.channels:
+            channel.deliver()
+
+    def close(self):
+        if not self.is_open:
+            return
+        for channel in self.channels:
+            channel.stop_consuming()
+            channel.close()
+        for name in self.exclusive:
+            BROKER.delete_queue(name)
+        self.is_open = False
+
+
+def install():
+    """Registra este módulo como "pika" (antes de importar los servicios)."""
+    exceptions = types.ModuleType("pika.exceptions")
+    for error in (AMQPError, AMQPConnectionError, ChannelClosedByBroker, UnroutableError, NackError):
+        setattr(exceptions, error.__name__, error)
+    pika = types.ModuleType("pika")
+    pika.exceptions = exceptions
+    pika.BlockingConnection = BlockingConnection
+    pika.ConnectionParameters = ConnectionParameters
+    pika.BasicProperties = BasicProperties
+    sys.modules["pika"] = pika
+    sys.modules["pika.exceptions"] = exceptions
+    return BROKER
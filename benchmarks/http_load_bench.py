@@ -0,0 +1,138 @@
+"""
+Prueba de carga HTTP: req/s y p99 por configuración del servidor.
+
+Con --url mide un servicio ya levantado. Con --service arranca el
+servicio indicado una vez por configuración y mide cada una:
+"dev" es el servidor de desarrollo (python app.py) y "WxT" es gunicorn
+con W workers y T hilos por worker (gunicorn.conf.py del servicio).
+
+Uso:
+    python benchmarks/http_load_bench.py --url "http://localhost:5002/books?limit=50"
+
+    RABBITMQ_HOST=localhost python benchmarks/http_load_bench.py --service catalog_service \\
+        --path "/books?limit=50" --configs dev,1x8,4x8,8x16 --clients 64 --duration 20
+"""
+import argparse, os, signal, subprocess, sys, threading, time
+import requests
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+SERVICE_PORTS = {"auth_service": 5001, "catalog_service": 5002, "purchase_service": 5003}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def load(url, clients, duration, warmup):
+    """Lanza clients hilos (conexiones keep-alive) contra url durante duration segundos."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start_at = time.monotonic() + warmup
+    stop_at = start_at + duration
+
+    def client():
+        session = requests.Session()
+        local = []
+        failed = 0
+        while True:
+            t0 = time.monotonic()
+            if t0 >= stop_at:
+                break
+            try:
+                ok = session.get(url, timeout=30).status_code < 500
+            except requests.RequestException:
+                ok = False
+            t1 = time.monotonic()
+            if t0 >= start_at:
+                if ok:
+                    local.append(t1 - t0)
+                else:
+                    failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+
+def start_service(service, config, port):
+    """Arranca el servicio con la configuración dada y espera a que responda."""
+    env = dict(os.environ, PORT=str(port))
+    if config == "dev":
+        cmd = [sys.executable, "app.py"]
+    else:
+        workers, threads = config.lower().split("x")
+        env.update(WEB_WORKERS=workers, WEB_THREADS=threads)
+        cmd = ["gunicorn", "-c", "gunicorn.conf.py"]
+    proc = subprocess.Popen(cmd, cwd=os.path.join(ROOT, service), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{service} ({config}) terminó con código {proc.returncode}")
+        try:
+            requests.get(f"http://localhost:{port}/", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.5)
+    stop_service(proc)
+    raise RuntimeError(f"{service} ({config}) no respondió en 60s")
+
+
+def stop_service(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+def report(label, latencies, errors, duration):
+    print(f"{label:<10}{len(latencies) / duration:>10.0f}{percentile(latencies, 0.50) * 1000:>10.1f}"
+          f"{percentile(latencies, 0.99) * 1000:>10.1f}{errors:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="URL de un servicio ya levantado")
+    parser.add_argument("--service", choices=sorted(SERVICE_PORTS))
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--port", type=int, help="puerto para el servicio arrancado (por defecto el suyo)")
+    parser.add_argument("--configs", default="dev,1x8,4x8")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--warmup", type=float, default=3)
+    args = parser.parse_args()
+    if not args.url and not args.service:
+        parser.error("indique --url o --service")
+
+    print(f"{args.clients} clientes, {args.duration:.0f}s por configuración")
+    print(f"{'config':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errores':>9}")
+    if args.url:
+        latencies, errors = load(args.url, args.clients, args.duration, args.warmup)
+        report("externo", latencies, errors, args.duration)
+        return
+
+    port = args.port or SERVICE_PORTS[args.service]
+    for config in args.configs.split(","):
+        proc = start_service(args.service, config, port)
+        try:
+            latencies, errors = load(f"http://localhost:{port}{args.path}",
+                                     args.clients, args.duration, args.warmup)
+        finally:
+            stop_service(proc)
+        report(config, latencies, errors, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Suite de carga reproducible de los tres servicios en un solo proceso.
+
+Levanta auth, catalog y purchase (apps Flask con su test client, sin red)
+contra SQLite en un directorio temporal, o contra las bases indicadas, y
+un RabbitMQ en memoria (fake_amqp.py) por el que fluyen los eventos entre
+servicios. Siembra usuarios y libros y reproduce las cargas definidas en
+benchmarks/workloads.jsonl (una por línea): ráfagas de login, navegación
+del catálogo, compras sobre títulos populares y actualizaciones masivas.
+
+Por endpoint informa rendimiento, latencia p50/p95/p99 y consultas SQL por
+petición, y guarda el resultado en JSON para comparar entre commits:
+
+    python benchmarks/load_suite.py --output base.json
+    python benchmarks/load_suite.py --output head.json --compare base.json --tolerance 0.2
+
+Con --compare el proceso termina con código 1 si algún endpoint empeora
+(p95 o rendimiento) más que la tolerancia.
+
+Variables: AUTH_DATABASE_URI, CATALOG_DATABASE_URI, PURCHASE_DATABASE_URI
+(por defecto SQLite) y las de cada servicio (PASSWORD_HASH_METHOD, ...).
+"""
+import argparse, importlib, json, multiprocessing.forkserver, os, platform, random, subprocess, sys, \
+    tempfile, threading, time
+from urllib.parse import urlsplit
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+
+import fake_amqp
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SERVICES = ("auth", "catalog", "purchase")
+# Módulos sin homónimo en otro servicio que deben seguir importables: el pool
+# de hashing de auth envía sus funciones a los procesos por nombre de módulo
+SHARED_MODULES = {"hashing"}
+PASSWORD = "bench-password"
+WORDS = ("historia", "viaje", "ciencia", "novela", "cocina", "guerra", "amor", "mar")
+
+_local = threading.local()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    _local.queries = getattr(_local, "queries", 0) + 1
+
+
+# ------------------------------------------------------
+# Arranque de los servicios en el mismo proceso
+# ------------------------------------------------------
+def start_forkserver(service_dir):
+    """Arranca el forkserver del pool de hashing de auth con su directorio en PYTHONPATH.
+
+    El servidor es un intérprete nuevo: sin esto no encuentra hashing.py
+    (en el contenedor lo encuentra porque gunicorn corre en ese directorio).
+    """
+    previous = os.environ.get("PYTHONPATH")
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [service_dir, previous]))
+    try:
+        multiprocessing.forkserver.ensure_running()
+    finally:
+        if previous is None:
+            del os.environ["PYTHONPATH"]
+        else:
+            os.environ["PYTHONPATH"] = previous
+
+
+def load_service(name, database_uri):
+    """Importa <name>_service/app.py con sus módulos aislados de los demás servicios."""
+    service_dir = os.path.join(ROOT, f"{name}_service")
+    os.environ["DATABASE_URI"] = database_uri
+    sys.path.insert(0, service_dir)
+    try:
+        module = importlib.import_module("app")
+        if name == "auth":
+            start_forkserver(service_dir)
+    finally:
+        sys.path.remove(service_dir)
+        # Los tres servicios tienen módulos homónimos (app, models, dbconfig...)
+        for mod_name, mod in list(sys.modules.items()):
+            if mod_name in SHARED_MODULES:
+                continue
+            if (getattr(mod, "__file__", None) or "").startswith(service_dir + os.sep):
+                del sys.modules[mod_name]
+    module.init_db()
+    return module
+
+
+class InProcessSession:
+    """Lo mínimo de requests.Session para que un ServiceClient llame a otra app sin red."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method, url, timeout=None, **kwargs):
+        response = self.app.test_client().open(urlsplit(url).path, method=method,
+                                               json=kwargs.get("json"), headers=kwargs.get("headers"))
+        return InProcessResponse(response)
+
+
+class InProcessResponse:
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self._body = response.get_json(silent=True)
+
+    def json(self):
+        return self._body
+
+
+def start_services(workdir):
+    fake_amqp.install()
+    for key, value in {"LOCK_DIR": workdir, "METRICS_DIR": "", "TRACE_EXPORTER": "none",
+                       "RABBITMQ_HOST": "fake-amqp", "AUTH_MODE": "local",
+                       "EMBEDDED_CONSUMER": "true"}.items():
+        os.environ.setdefault(key, value)
+    services = {}
+    for name in SERVICES:
+        uri = os.getenv(f"{name.upper()}_DATABASE_URI",
+                        f"sqlite:///{os.path.join(workdir, name + '.db')}")
+        services[name] = load_service(name, uri)
+    # purchase_service carga las revocaciones de auth (GET /revocations) al suscribirse
+    services["purchase"].token_verifier.client.session = InProcessSession(services["auth"].app)
+    for module in services.values():
+        module.start_background_tasks()
+    return services
+
+
+def wait_for(condition, timeout, label):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Tiempo agotado esperando {label}")
+        time.sleep(0.05)
+
+
+def catalog_count(catalog):
+    with catalog.app.app_context():
+        return catalog.db.session.execute(select(func.count()).select_from(catalog.Book)).scalar()
+
+
+def outbox_depth(purchase):
+    with purchase.app.app_context():
+        outbox = purchase.db.metadata.tables["outbox_event"]
+        return purchase.db.session.execute(select(func.count()).select_from(outbox)).scalar()
+
+
+def ndjson_books(rng, count):
+    return "".join(json.dumps({
+        "title": f"{rng.choice(WORDS).capitalize()} {rng.randrange(10 ** 6)}",
+        "author": f"Autor {rng.randrange(300)}",
+        "description": " ".join(rng.choice(WORDS) for _ in range(12)),
+        "price": round(rng.uniform(5, 60), 2), "stock": rng.randrange(5, 200),
+    }) + "\n" for _ in range(count)).encode()
+
+
+def seed(services, users, books, rng):
+    """Usuarios con token y libros sembrados vía POST /books/bulk (llegan al catálogo por eventos)."""
+    auth = services["auth"].app.test_client()
+    accounts = []
+    for i in range(users):
+        email = f"load-{i}@bookstore.local"
+        auth.post("/register", json={"email": email, "password": PASSWORD})
+        token = auth.post("/login", json={"email": email, "password": PASSWORD}).get_json()["token"]
+        accounts.append({"email": email, "token": token})
+
+    purchase = services["purchase"]
+    before = catalog_count(services["catalog"])
+    response = purchase.app.test_client().post("/books/bulk", data=ndjson_books(rng, books),
+                                               content_type="application/x-ndjson")
+    if response.status_code != 201:
+        raise SystemExit(f"No se pudieron sembrar libros: {response.status_code} {response.get_data(as_text=True)}")
+    wait_for(lambda: catalog_count(services["catalog"]) >= before + books, 120, "libros en el catálogo")
+    with purchase.app.app_context():
+        book_ids = purchase.db.session.execute(select(purchase.Book.id).order_by(purchase.Book.id)).scalars().all()
+    return accounts, book_ids
+
+
+# ------------------------------------------------------
+# Reproducción de una carga
+# ------------------------------------------------------
+def fill(value, variables):
+    """Sustituye {variable}; un valor que es sólo "{variable}" conserva su tipo."""
+    if isinstance(value, str):
+        if value.startswith("{") and value.endswith("}") and value[1:-1] in variables:
+            return variables[value[1:-1]]
+        return value.format(**variables)
+    if isinstance(value, list):
+        return [fill(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: fill(item, variables) for key, item in value.items()}
+    return value
+
+
+def run_thread(services, workload, data, rng, count, samples):
+    clients = {name: services[name].app.test_client() for name in SERVICES}
+    steps = workload["steps"]
+    weights = [step.get("weight", 1) for step in steps]
+    hot = data["book_ids"][:workload.get("hot_books", 5)]
+    for _ in range(count):
+        step = rng.choices(steps, weights)[0]
+        account = rng.choice(data["accounts"])
+        variables = {
+            "user_email": account["email"], "password": PASSWORD,
+            "book_id": rng.choice(data["book_ids"]), "hot_book_id": rng.choice(hot),
+            "page_after": rng.choice(data["book_ids"]) - 1, "word": rng.choice(WORDS),
+            "price": round(rng.uniform(5, 60), 2), "stock": rng.randrange(0, 200),
+        }
+        kwargs = {"method": step["method"], "headers": {}}
+        if step.get("auth"):
+            kwargs["headers"]["Authorization"] = f"Bearer {account['token']}"
+        if "json" in step:
+            kwargs["json"] = fill(step["json"], variables)
+        if "ndjson_books" in step:
+            kwargs["data"] = ndjson_books(rng, step["ndjson_books"])
+            kwargs["content_type"] = "application/x-ndjson"
+
+        _local.queries = 0
+        start = time.perf_counter()
+        response = clients[step["service"]].open(fill(step["path"], variables), **kwargs)
+        response.get_data()
+        elapsed = time.perf_counter() - start
+        samples.append((f"{step['service']} {step['method']} {step['path'].split('?')[0]}",
+                        elapsed, response.status_code, _local.queries))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def summarize(samples, wall):
+    endpoints = {}
+    for key, elapsed, status, queries in samples:
+        endpoints.setdefault(key, []).append((elapsed, status, queries))
+    report = {}
+    for key, rows in sorted(endpoints.items()):
+        latencies = [row[0] * 1000 for row in rows]
+        queries = [row[2] for row in rows]
+        statuses = {}
+        for row in rows:
+            statuses[str(row[1])] = statuses.get(str(row[1]), 0) + 1
+        report[key] = {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / wall, 1),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(max(latencies), 2),
+            "db_queries_avg": round(sum(queries) / len(queries), 2),
+            "db_queries_p95": percentile(queries, 0.95),
+            "statuses": statuses,
+            "server_errors": sum(1 for row in rows if row[1] >= 500),
+        }
+    return report
+
+
+def run_workload(services, workload, data, seed_value):
+    threads = workload.get("threads", 4)
+    total = workload.get("requests", 100)
+    samples = []
+    pool = [threading.Thread(target=run_thread, args=(
+        services, workload, data, random.Random(f"{seed_value}-{workload['name']}-{i}"),
+        total // threads + (1 if i < total % threads else 0), samples)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - start
+
+    # Tiempo hasta que el outbox de purchase queda vacío (eventos entregados)
+    settle_start = time.perf_counter()
+    wait_for(lambda: outbox_depth(services["purchase"]) == 0, 120, "el outbox vacío")
+    return {
+        "description": workload.get("description", ""),
+        "threads": threads,
+        "requests": len(samples),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 1),
+        "outbox_settle_seconds": round(time.perf_counter() - settle_start, 3),
+        "endpoints": summarize(samples, wall),
+    }
+
+
+# ------------------------------------------------------
+# Resultados
+# ------------------------------------------------------
+def database_url(service):
+    with service.app.app_context():
+        return service.db.engine.url.render_as_string(hide_password=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(results):
+    for name, workload in results["workloads"].items():
+        print(f"\n== {name}: {workload['requests']} peticiones, {workload['throughput_rps']} req/s, "
+              f"outbox vacío en {workload['outbox_settle_seconds']}s")
+        print(f"  {'endpoint':<40}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'SQL/req':>9}  estados")
+        for key, row in workload["endpoints"].items():
+            print(f"  {key:<40}{row['throughput_rps']:>9}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+                  f"{row['p99_ms']:>9}{row['db_queries_avg']:>9}  {row['statuses']}")
+
+
+def compare(results, baseline, tolerance):
+    """Lista de regresiones frente a baseline (p95 o req/s peor que la tolerancia)."""
+    regressions = []
+    print(f"\nComparación con {baseline.get('commit') or 'baseline'} (tolerancia {tolerance:.0%}):")
+    for name, workload in results["workloads"].items():
+        base_workload = baseline.get("workloads", {}).get(name)
+        if not base_workload:
+            continue
+        for key, row in workload["endpoints"].items():
+            base = base_workload["endpoints"].get(key)
+            if not base:
+                continue
+            p95 = row["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+            rps = row["throughput_rps"] / base["throughput_rps"] - 1 if base["throughput_rps"] else 0.0
+            worse = p95 > tolerance or rps < -tolerance
+            print(f"  {'✗' if worse else '✓'} {name:<18} {key:<40} p95 {p95:+.0%}  req/s {rps:+.0%}")
+            if worse:
+                regressions.append({"workload": name, "endpoint": key, "p95_change": round(p95, 3),
+                                    "throughput_change": round(rps, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", default=os.path.join(os.path.dirname(__file__), "workloads.jsonl"))
+    parser.add_argument("--only", action="append", help="ejecutar sólo estas cargas (repetible)")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplica las peticiones de cada carga")
+    parser.add_argument("--output", default="load_suite_results.json")
+    parser.add_argument("--compare", help="resultado JSON anterior con el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with open(args.workloads) as f:
+        workloads = [json.loads(line) for line in f if line.strip()]
+    if args.only:
+        workloads = [w for w in workloads if w["name"] in args.only]
+
+    workdir = tempfile.mkdtemp(prefix="bookstore-load-")
+    services = start_services(workdir)
+    purchase = services["purchase"]
+    wait_for(lambda: purchase.token_verifier.revocations_live and purchase.book_cache.enabled,
+             30, "las suscripciones de purchase_service")
+
+    rng = random.Random(args.seed)
+    accounts, book_ids = seed(services, args.users, args.books, rng)
+    data = {"accounts": accounts, "book_ids": book_ids}
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "databases": {name: database_url(services[name]) for name in SERVICES},
+        "seed": args.seed, "users": args.users, "books": args.books, "scale": args.scale,
+        "workloads": {},
+    }
+    for workload in workloads:
+        workload = dict(workload, requests=max(int(workload.get("requests", 100) * args.scale), 1))
+        print(f"Ejecutando {workload['name']} ({workload['requests']} peticiones, {workload.get('threads', 4)} hilos)...")
+        results["workloads"][workload["name"]] = run_workload(services, workload, data, args.seed)
+    results["amqp"] = dict(fake_amqp.BROKER.stats)
+
+    print_report(results)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResultados guardados en {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regresiones")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Microbenchmark del coste de la instrumentación (metrics.py).
+
+Mide nanosegundos por operación de inc/observe/timed en uno y varios
+hilos, el sobrecoste por petición de init_app sobre una app Flask mínima
+(test client, sin red) y el tiempo de generar /metrics con muchas series.
+
+Uso:
+    python benchmarks/metrics_overhead_bench.py --ops 200000 --threads 8 --requests 5000
+"""
+import argparse, os, sys, threading, time
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "purchase_service"))
+from metrics import Metrics  # noqa: E402
+
+
+def per_op_ns(fn, ops):
+    start = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    return (time.perf_counter() - start) / ops * 1e9
+
+
+def threaded_ns(fn, ops, threads):
+    """Tiempo de pared por operación con todos los hilos escribiendo a la vez."""
+    def work():
+        for _ in range(ops):
+            fn()
+
+    pool = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return (time.perf_counter() - start) / (ops * threads) * 1e9
+
+
+def request_us(app, requests):
+    client = app.test_client()
+    for _ in range(200):
+        client.get("/ping")
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get("/ping")
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def make_app(instrumented):
+    app = Flask(f"bench_{instrumented}")
+
+    @app.route("/ping")
+    def ping():
+        return "ok"
+
+    if instrumented:
+        Metrics(directory="").init_app(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--series", type=int, default=500)
+    args = parser.parse_args()
+
+    metrics = Metrics(directory="")
+    metrics.histogram("bench_seconds", "bench")
+
+    def timed():
+        with metrics.timed("bench_seconds", target="x"):
+            pass
+
+    cases = [
+        ("bucle vacío", lambda: None),
+        ("inc sin etiquetas", lambda: metrics.inc("bench_total")),
+        ("inc con 2 etiquetas", lambda: metrics.inc("bench_total", route="/books", method="GET")),
+        ("observe con 3 etiquetas", lambda: metrics.observe("bench_seconds", 0.004, route="/books",
+                                                            method="GET", status="200")),
+        ("timed (context manager)", timed),
+    ]
+    print(f"{'operación':<26}{'1 hilo':>12}{f'{args.threads} hilos':>14}")
+    for label, fn in cases:
+        single = per_op_ns(fn, args.ops)
+        multi = threaded_ns(fn, args.ops // args.threads, args.threads)
+        print(f"{label:<26}{single:>10.0f}ns{multi:>12.0f}ns")
+
+    plain = request_us(make_app(False), args.requests)
+    instrumented = request_us(make_app(True), args.requests)
+    print(f"\nPetición Flask sin métricas: {plain:.1f}µs, con métricas: {instrumented:.1f}µs "
+          f"(+{instrumented - plain:.1f}µs, {100 * (instrumented - plain) / plain:.1f}%)")
+
+    for i in range(args.series):
+        metrics.observe("bench_seconds", 0.01, route=f"/route/{i}")
+    start = time.perf_counter()
+    body = metrics.render()
+    print(f"render de {args.series} series de histograma: "
+          f"{(time.perf_counter() - start) * 1000:.1f}ms ({len(body) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
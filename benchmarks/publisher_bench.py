@@ -0,0 +1,83 @@
+"""
+Benchmark de publicación de eventos en RabbitMQ.
+
+Compara publicaciones por segundo entre el camino anterior de
+notify_catalog (una conexión por llamada) y BookEventPublisher.
+
+Uso:
+    RABBITMQ_HOST=localhost python benchmarks/publisher_bench.py --messages 2000 --threads 8
+"""
+import argparse, json, os, sys, threading, time
+import pika
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "purchase_service"))
+from publisher import BookEventPublisher  # noqa: E402
+
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
+QUEUE = "book_updates_bench"
+
+
+def legacy_notify(event_type, payload):
+    """Implementación original: conexión nueva por cada evento."""
+    connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
+    channel = connection.channel()
+    channel.queue_declare(queue=QUEUE)
+    message = {"event": event_type, "data": payload}
+    channel.basic_publish(exchange="", routing_key=QUEUE, body=json.dumps(message))
+    connection.close()
+
+
+def run(label, publish, messages, threads):
+    per_thread = messages // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            publish("book_updated", {"id": offset + i, "stock": i})
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return label, per_thread * threads, time.perf_counter() - start
+
+
+def purge():
+    connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
+    channel = connection.channel()
+    channel.queue_declare(queue=QUEUE)
+    channel.queue_purge(queue=QUEUE)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    results = []
+    purge()
+    results.append(run("conexión por llamada", legacy_notify, args.messages, args.threads))
+
+    purge()
+    publisher = BookEventPublisher(RABBITMQ_HOST, queue_name=QUEUE)
+    pending = []
+    start = time.perf_counter()
+    run("", lambda e, p: pending.append(publisher.publish(e, p)), args.messages, args.threads)
+    # Se mide hasta que el broker confirma el último mensaje
+    for future in pending:
+        future.result(timeout=60)
+    results.append(("publicador persistente", len(pending), time.perf_counter() - start))
+    purge()
+
+    print(f"{'modo':<25}{'mensajes':>10}{'segundos':>12}{'msg/s':>12}")
+    for label, count, seconds in results:
+        print(f"{label:<25}{count:>10}{seconds:>12.3f}{count / seconds:>12.0f}")
+    print(f"lotes enviados: {publisher.stats['batches']}, reconexiones: {publisher.stats['reconnects']}")
+    publisher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Desglose de latencia por tramo a partir de las trazas exportadas a archivo.
+
+Arranque los servicios con TRACE_EXPORTER=file y el mismo TRACE_FILE
+(o pase varios archivos), genere carga y ejecute:
+
+    python benchmarks/trace_breakdown.py traces.ndjson --slowest 5
+
+Muestra p50/p99 por tramo (servicio + span) y el árbol de spans de las
+trazas más lentas, para ver qué salto explica el p99.
+"""
+import argparse, json
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def load(paths):
+    spans = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue
+    return spans
+
+
+def print_tree(spans, parent_id, depth, origin):
+    for span in sorted((s for s in spans if s["parent_id"] == parent_id), key=lambda s: s["start"]):
+        offset = (span["start"] - origin) * 1000
+        print(f"    {'  ' * depth}{span['service']}:{span['name']:<32} "
+              f"+{offset:8.1f}ms {span['duration_ms']:9.1f}ms {span['status']}")
+        print_tree(spans, span["span_id"], depth + 1, origin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--slowest", type=int, default=3)
+    args = parser.parse_args()
+
+    spans = load(args.files)
+    if not spans:
+        print("Sin spans")
+        return
+
+    by_hop = {}
+    for span in spans:
+        by_hop.setdefault(f"{span['service']}:{span['name']}", []).append(span["duration_ms"])
+    print(f"{'tramo':<48}{'n':>7}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for hop, durations in sorted(by_hop.items(), key=lambda item: -percentile(item[1], 0.99)):
+        print(f"{hop:<48}{len(durations):>7}{percentile(durations, 0.5):>10.1f}"
+              f"{percentile(durations, 0.99):>10.1f}{max(durations):>10.1f}")
+
+    traces = {}
+    for span in spans:
+        traces.setdefault(span["trace_id"], []).append(span)
+
+    def total_ms(trace_spans):
+        start = min(s["start"] for s in trace_spans)
+        end = max(s["start"] + s["duration_ms"] / 1000 for s in trace_spans)
+        return (end - start) * 1000
+
+    slowest = sorted(traces.items(), key=lambda item: -total_ms(item[1]))[:args.slowest]
+    for trace_id, trace_spans in slowest:
+        print(f"\nTraza {trace_id}: {total_ms(trace_spans):.1f}ms, {len(trace_spans)} spans")
+        origin = min(s["start"] for s in trace_spans)
+        ids = {s["span_id"] for s in trace_spans}
+        # Raíces: sin padre o con el padre fuera del archivo (p. ej. en otro exportador)
+        for root_parent in {s["parent_id"] for s in trace_spans if s["parent_id"] not in ids}:
+            print_tree(trace_spans, root_parent, 0, origin)
+
+
+if __name__ == "__main__":
+    main()
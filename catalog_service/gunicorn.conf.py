@@ -0,0 +1,64 @@
+import math, multiprocessing, os
+
+# ------------------------------------------------------
+# Configuración de gunicorn (modo producción)
+# ------------------------------------------------------
+# Uso:  gunicorn -c gunicorn.conf.py
+# Cada valor se puede ajustar por variable de entorno sin reconstruir la
+# imagen. Los hilos (gthread) cubren la espera de E/S (MySQL, RabbitMQ);
+# los workers, el uso de varios núcleos.
+
+wsgi_app = "wsgi:create_app()"
+bind = f"0.0.0.0:{os.getenv('PORT', '5002')}"
+
+
+def available_cpus():
+    """Núcleos que puede usar el contenedor: cuota de CPU del cgroup o, si no hay, la afinidad."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else multiprocessing.cpu_count()
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+# Entre 2 y 4 por defecto: cada worker abre hasta DB_POOL_SIZE + DB_MAX_OVERFLOW
+# conexiones a MySQL (ver dbconfig.py) y cpu_count() ve los núcleos del nodo,
+# no los del contenedor
+workers = int(os.getenv("WEB_WORKERS", str(min(max(available_cpus(), 2), 4))))
+# Para los que reparten recursos por worker (p. ej. el pool de hashing de auth)
+os.environ["WEB_WORKERS"] = str(workers)
+
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+timeout = int(os.getenv("WEB_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+backlog = int(os.getenv("WEB_BACKLOG", "2048"))
+
+# Reciclar workers de vez en cuando acota fugas de memoria
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "0"))
+
+# Sin preload: cada worker abre sus propias conexiones (MySQL, RabbitMQ)
+# después del fork; las tareas únicas se coordinan en leader.py
+preload_app = False
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Cada worker vuelca sus métricas en METRICS_DIR y GET /metrics suma las de
+# todos (ver metrics.py); se vacía al arrancar para no sumar ejecuciones previas
+os.environ.setdefault("METRICS_DIR", os.path.join(worker_tmp_dir or "/tmp", "metrics"))
+
+accesslog = os.getenv("WEB_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    metrics_dir = os.environ["METRICS_DIR"]
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        os.remove(os.path.join(metrics_dir, name))
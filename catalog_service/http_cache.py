@@ -0,0 +1,114 @@
+import gzip, hashlib, os, threading
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional
+    brotli = None
+
+# ------------------------------------------------------
+# Caché de respuestas HTTP por versión del catálogo
+# ------------------------------------------------------
+# Cada respuesta GET se guarda ya serializada (y comprimida) junto con la
+# versión del catálogo con la que se generó. Mientras la versión no
+# cambie, la misma URL se sirve desde memoria, y un cliente que envía
+# If-None-Match con el ETag vigente recibe 304 sin tocar la tabla.
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+CACHED_HEADERS = ("X-Next-After",)
+
+
+class _Entry:
+    def __init__(self, body, mimetype, headers):
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers
+        self.encoded = {}
+
+
+class VersionedResponseCache:
+    """Respuestas pre-serializadas indexadas por (URL, versión)."""
+
+    def __init__(self, get_version, maxsize=RESPONSE_CACHE_SIZE):
+        self.get_version = get_version
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def _encoding(self, size):
+        if size < RESPONSE_COMPRESS_MIN_BYTES:
+            return None
+        accepted = request.accept_encodings
+        if brotli is not None and accepted["br"]:
+            return "br"
+        if accepted["gzip"]:
+            return "gzip"
+        return None
+
+    def _encode(self, entry, encoding):
+        body = entry.encoded.get(encoding)
+        if body is None:
+            if encoding == "br":
+                body = brotli.compress(entry.body)
+            else:
+                body = gzip.compress(entry.body, compresslevel=6)
+            entry.encoded[encoding] = body
+        return body
+
+    def cached(self, view):
+        """Decorador para vistas GET cuya salida depende sólo de la URL y el catálogo."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.args.get("format") == "ndjson":
+                return view(*args, **kwargs)
+
+            version = self.get_version()
+            if version is None:
+                return view(*args, **kwargs)
+            url = request.full_path
+            key = (url, version)
+            tag = f"{version}-{hashlib.sha1(url.encode()).hexdigest()[:12]}"
+
+            # Misma URL y misma versión => mismo contenido, sea cual sea la codificación
+            for etag in (tag, f"{tag}-gzip", f"{tag}-br"):
+                if request.if_none_match.contains_weak(etag):
+                    self.stats["not_modified"] += 1
+                    response = Response(status=304)
+                    response.set_etag(etag)
+                    response.vary.add("Accept-Encoding")
+                    return response
+
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+
+            if entry is None:
+                self.stats["misses"] += 1
+                generated = view(*args, **kwargs)
+                if not isinstance(generated, Response) or generated.status_code != 200:
+                    return generated
+                entry = _Entry(generated.get_data(), generated.mimetype,
+                               {h: generated.headers[h] for h in CACHED_HEADERS if h in generated.headers})
+                with self._lock:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+            else:
+                self.stats["hits"] += 1
+
+            encoding = self._encoding(len(entry.body))
+            etag = f"{tag}-{encoding}" if encoding else tag
+            body = self._encode(entry, encoding) if encoding else entry.body
+            response = Response(body, mimetype=entry.mimetype, headers=entry.headers)
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+            response.set_etag(etag)
+            response.vary.add("Accept-Encoding")
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapper
@@ -0,0 +1,337 @@
+import bisect, glob, json, os, re, threading, time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ------------------------------------------------------
+# Métricas en formato Prometheus (GET /metrics)
+# ------------------------------------------------------
+# Cada hilo escribe en sus propios contadores e histogramas (un dict por
+# hilo, sin locks en el camino caliente); al hacer scrape se suman los de
+# todos los hilos. Los gauges son funciones que sólo se evalúan al hacer
+# scrape (estadísticas del pool, del publicador, lag del consumidor...).
+#
+# Con varios procesos (workers de gunicorn, consumidor con --workers) cada
+# uno vuelca su estado cada METRICS_FLUSH_SECONDS en METRICS_DIR y /metrics
+# suma los archivos de todos, así que da lo mismo qué worker atienda el
+# scrape. Los gauges llevan la etiqueta worker (pid); los de procesos que
+# dejaron de escribir hace más de tres intervalos se descartan.
+
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    return None
+
+
+class Metrics:
+    """Registro de contadores, histogramas y gauges de un proceso."""
+
+    def __init__(self, directory=METRICS_DIR, flush_seconds=METRICS_FLUSH_SECONDS):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.app = None
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        # {nombre: (tipo, ayuda, buckets)}
+        self._meta = {}
+        self._gauges = []
+        self._flusher_pid = None
+
+    # --------------------------------------------------
+    # Declaración
+    # --------------------------------------------------
+    def counter(self, name, help_text):
+        self._meta[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._meta[name] = ("histogram", help_text, tuple(buckets))
+
+    def gauges(self, prefix, fn, label=None):
+        """Publica como gauges los valores numéricos del dict que devuelve fn().
+
+        Con label, fn devuelve {valor de la etiqueta: dict} (p. ej. un dict por motor).
+        """
+        self._gauges.append((prefix, fn, label))
+
+    # --------------------------------------------------
+    # Camino caliente
+    # --------------------------------------------------
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = ({}, {})
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, value=1, **labels):
+        counters = self._shard()[0]
+        # Etiquetas en el orden de la llamada; snapshot() las normaliza
+        key = (name, tuple(labels.items()))
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        histograms = self._shard()[1]
+        key = (name, tuple(labels.items()))
+        buckets = self._meta.get(name, (None, None, LATENCY_BUCKETS))[2]
+        # [conteo por bucket..., +Inf, suma]
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(buckets) + 2)
+        values[bisect.bisect_left(buckets, value)] += 1
+        values[-1] += value
+
+    @contextmanager
+    def timed(self, name, **labels):
+        """Mide el bloque en el histograma name; outcome=error si lanza excepción."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, outcome=outcome, **labels)
+
+    # --------------------------------------------------
+    # Agregación
+    # --------------------------------------------------
+    def snapshot(self):
+        """Suma los fragmentos de todos los hilos: (contadores, histogramas)."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        counters, histograms = {}, {}
+        for shard_counters, shard_histograms in shards:
+            # dict.copy() y list() son atómicos frente a los hilos que escriben
+            for (name, labels), value in shard_counters.copy().items():
+                key = (name, tuple(sorted(labels)))
+                counters[key] = counters.get(key, 0) + value
+            for (name, labels), values in shard_histograms.copy().items():
+                _merge_histogram(histograms, (name, tuple(sorted(labels))), list(values))
+        return counters, histograms
+
+    def collect_gauges(self):
+        """Evalúa los gauges registrados: [(nombre, etiquetas, valor)]."""
+        samples = []
+        worker = ("worker", str(os.getpid()))
+        for prefix, fn, label in self._gauges:
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        data = fn()
+                else:
+                    data = fn()
+            except Exception as e:
+                print(f"[metrics] ⚠️ No se pudo leer {prefix}: {e}")
+                continue
+            groups = data.items() if label else [(None, data)]
+            for label_value, values in groups:
+                if not isinstance(values, dict):
+                    continue
+                labels = ((label, str(label_value)), worker) if label else (worker,)
+                for key, value in values.items():
+                    number = _number(value)
+                    if number is not None:
+                        samples.append((f"{prefix}_{_NAME_RE.sub('_', str(key))}", labels, number))
+        return samples
+
+    # --------------------------------------------------
+    # Varios procesos
+    # --------------------------------------------------
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def flush(self):
+        """Vuelca el estado de este proceso en METRICS_DIR."""
+        counters, histograms = self.snapshot()
+        data = {
+            "time": time.time(),
+            "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+            "histograms": [[name, labels, values] for (name, labels), values in histograms.items()],
+            "gauges": self.collect_gauges(),
+        }
+        path = self._path(os.getpid())
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def start(self):
+        """Arranca el volcado periódico (una vez por proceso, también tras un fork)."""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        threading.Thread(target=self._run_flusher, daemon=True, name="metrics-flush").start()
+
+    def _run_flusher(self):
+        while True:
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[metrics] ❌ Error volcando métricas: {e}")
+            time.sleep(self.flush_seconds)
+
+    def _others(self):
+        """Estado volcado por los demás procesos."""
+        own = self._path(os.getpid())
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    # --------------------------------------------------
+    # Exposición
+    # --------------------------------------------------
+    def render(self):
+        """Texto en formato de exposición de Prometheus."""
+        counters, histograms = self.snapshot()
+        gauges = self.collect_gauges()
+        if self.directory:
+            stale = time.time() - 3 * self.flush_seconds
+            for data in self._others():
+                for name, labels, value in data["counters"]:
+                    key = (name, tuple(tuple(pair) for pair in labels))
+                    counters[key] = counters.get(key, 0) + value
+                for name, labels, values in data["histograms"]:
+                    _merge_histogram(histograms, (name, tuple(tuple(pair) for pair in labels)), values)
+                if data["time"] >= stale:
+                    gauges.extend((name, tuple(tuple(pair) for pair in labels), value)
+                                  for name, labels, value in data["gauges"])
+
+        series = {}
+        for (name, labels), value in counters.items():
+            series.setdefault(name, []).append((labels, value))
+        for (name, labels), values in histograms.items():
+            series.setdefault(name, []).append((labels, values))
+        for name, labels, value in gauges:
+            series.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(series):
+            kind, help_text, buckets = self._meta.get(name, (None, "", LATENCY_BUCKETS))
+            if kind is None:
+                kind = "histogram" if isinstance(series[name][0][1], list) else "gauge"
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series[name], key=lambda s: s[0]):
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels_text(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ("+Inf",), value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels_text(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels_text(labels)} {value[-1]}")
+                lines.append(f"{name}_count{_labels_text(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    # --------------------------------------------------
+    # Integración con Flask y SQLAlchemy
+    # --------------------------------------------------
+    def init_app(self, app):
+        """Latencia por ruta, consultas SQL por petición y GET /metrics."""
+        self.app = app
+        self.histogram("http_request_duration_seconds", "Duración de las peticiones HTTP por ruta")
+        self.histogram("db_queries_per_request", "Consultas SQL ejecutadas por petición", COUNT_BUCKETS)
+        self.counter("db_queries_total", "Consultas SQL ejecutadas")
+        event.listen(Engine, "before_cursor_execute", self._on_query)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule("/metrics", "metrics", self._metrics_view, methods=["GET"])
+
+    def _on_query(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.queries = getattr(self._local, "queries", 0) + 1
+        self.inc("db_queries_total")
+
+    def _before_request(self):
+        self._local.queries = 0
+        self._local.request_start = time.perf_counter()
+
+    def _after_request(self, response):
+        start = getattr(self._local, "request_start", None)
+        if start is None:
+            return response
+        self._local.request_start = None
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        self.observe("http_request_duration_seconds", time.perf_counter() - start,
+                     route=route, method=request.method, status=str(response.status_code))
+        self.observe("db_queries_per_request", self._local.queries, route=route)
+        return response
+
+    def _metrics_view(self):
+        """
+        Métricas en formato Prometheus
+        ---
+        tags:
+          - Estado
+        responses:
+          200:
+            description: Latencias por ruta, consultas SQL, llamadas salientes y gauges del servicio
+        """
+        return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+    def serve(self, port):
+        """GET /metrics en un servidor HTTP mínimo (procesos sin Flask web)."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+        return server
+
+
+def _merge_histogram(histograms, key, values):
+    total = histograms.get(key)
+    histograms[key] = values if total is None else [a + b for a, b in zip(total, values)]
+
+
+def clear_directory(directory):
+    """Borra el estado de ejecuciones anteriores (al arrancar el proceso maestro)."""
+    for path in glob.glob(os.path.join(directory, "*.json*")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+metrics = Metrics()
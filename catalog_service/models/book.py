@@ -3,7 +3,15 @@ class Book(db.Model):
     __tablename__ = 'book'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150))
-    author = db.Column(db.String(100))
+    author = db.Column(db.String(100), index=True)
     description = db.Column(db.Text)
-    price = db.Column(db.Float)
-    stock = db.Column(db.Integer)
\ No newline at end of file
+    price = db.Column(db.Float, index=True)
+    stock = db.Column(db.Integer)
+    # seq (id del evento en el outbox de purchase) del último evento aplicado;
+    # el consumidor descarta los eventos más antiguos que lleguen tarde
+    last_seq = db.Column(db.BigInteger)
+    __table_args__ = (
+        # Índice de texto completo para /books/search (sólo se crea en MySQL)
+        db.Index("ft_book_text", "title", "author", "description",
+                 mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
@@ -0,0 +1,6 @@
+from models import db
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
+    # Una sola fila (id=1) que el consumidor incrementa en cada lote aplicado
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
@@ -0,0 +1,109 @@
+import os
+from sqlalchemy import and_, case, literal, or_, select
+from sqlalchemy.dialects.mysql import match
+from models import db
+from models.book import Book
+
+# ------------------------------------------------------
+# Búsqueda de texto completo y por facetas sobre el catálogo
+# ------------------------------------------------------
+# En MySQL el texto se busca con MATCH ... AGAINST sobre el índice
+# FULLTEXT ft_book_text y el ranking es la relevancia de MySQL. En otros
+# motores (SQLite en desarrollo) se usa LIKE con una puntuación por campo.
+# Los filtros de autor (prefijo) y precio usan los índices B-tree.
+
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "100"))
+SEARCH_MAX_TERMS = 8
+SEARCH_FIELDS = ["id", "title", "author", "description", "price", "stock"]
+
+
+class SearchError(ValueError):
+    """Parámetros de búsqueda inválidos."""
+
+
+def parse_search_args(args):
+    """Valida los parámetros de la query string de /books/search."""
+    try:
+        params = {
+            "q": (args.get("q") or "").strip(),
+            "author": (args.get("author") or "").strip(),
+            "min_price": float(args["min_price"]) if args.get("min_price") else None,
+            "max_price": float(args["max_price"]) if args.get("max_price") else None,
+            "in_stock": args.get("in_stock", "").lower() in ("1", "true", "yes"),
+            "limit": int(args.get("limit", 20)),
+            "page": int(args.get("page", 1)),
+        }
+    except ValueError:
+        raise SearchError("min_price, max_price, limit y page deben ser numéricos")
+    if not 0 < params["limit"] <= SEARCH_MAX_LIMIT:
+        raise SearchError(f"limit debe estar entre 1 y {SEARCH_MAX_LIMIT}")
+    if params["page"] < 1:
+        raise SearchError("page debe ser mayor o igual a 1")
+    return params
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _text_score(q, dialect):
+    """Expresión de relevancia y condición de coincidencia para el texto q."""
+    if dialect == "mysql":
+        score = match(Book.title, Book.author, Book.description, against=q).in_natural_language_mode()
+        return score, score > 0
+
+    terms = q.split()[:SEARCH_MAX_TERMS]
+    weights = ((Book.title, 3), (Book.author, 2), (Book.description, 1))
+    score = literal(0)
+    conditions = []
+    for term in terms:
+        pattern = f"%{_escape_like(term)}%"
+        for column, weight in weights:
+            hit = column.ilike(pattern, escape="\\")
+            score = score + case((hit, weight), else_=0)
+            conditions.append(hit)
+    return score, or_(*conditions)
+
+
+def build_search_query(params, dialect):
+    """Construye el SELECT paginado y ordenado por relevancia."""
+    filters = []
+    if params["author"]:
+        filters.append(Book.author.like(f"{_escape_like(params['author'])}%", escape="\\"))
+    if params["min_price"] is not None:
+        filters.append(Book.price >= params["min_price"])
+    if params["max_price"] is not None:
+        filters.append(Book.price <= params["max_price"])
+    if params["in_stock"]:
+        filters.append(Book.stock > 0)
+
+    columns = [getattr(Book, f) for f in SEARCH_FIELDS]
+    if params["q"]:
+        score, matches = _text_score(params["q"], dialect)
+        filters.append(matches)
+        query = select(*columns, score.label("score")).order_by(score.desc(), Book.id)
+    else:
+        query = select(*columns, literal(0).label("score")).order_by(Book.id)
+
+    if filters:
+        query = query.where(and_(*filters))
+    # Una fila de más indica si existe la página siguiente
+    return query.limit(params["limit"] + 1).offset((params["page"] - 1) * params["limit"])
+
+
+def search_books(params):
+    """Ejecuta la búsqueda y devuelve la página de resultados."""
+    query = build_search_query(params, db.engine.dialect.name)
+    rows = db.session.execute(query).all()
+    items = [
+        dict(zip(SEARCH_FIELDS + ["score"], row))
+        for row in rows[:params["limit"]]
+    ]
+    for item in items:
+        item["score"] = float(item["score"] or 0)
+    return {
+        "items": items,
+        "page": params["page"],
+        "limit": params["limit"],
+        "has_more": len(rows) > params["limit"],
+    }
@@ -0,0 +1,13 @@
+import os, sys, tempfile
+
+# ------------------------------------------------------
+# Pruebas de catalog_service
+# ------------------------------------------------------
+# Los módulos del servicio se importan como en el contenedor (desde su
+# directorio) y la base de datos es un SQLite desechable; ninguna prueba
+# necesita MySQL ni RabbitMQ.
+# Uso:  cd catalog_service && python -m pytest -q
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URI"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "catalog.db")
+os.environ.pop("DATABASE_REPLICA_URI", None)
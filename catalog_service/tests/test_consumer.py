@@ -0,0 +1,197 @@
+import json
+import pytest
+import consumer
+from consumer import (BookUpdateConsumer, apply_events, applied_seqs, collapse_events,
+                      create_consumer_app, expand_message)
+from models import db
+from models.book import Book
+from models.catalog_version import CatalogVersion
+
+
+def event(name, seq=None, **data):
+    return {"event": name, "seq": seq, "data": data}
+
+
+def full(name, seq, book_id, **data):
+    """Evento con la fila completa del libro, como los publica purchase_service."""
+    row = dict(title=f"Libro {book_id}", author="Autor", description="", price=10.0, stock=1)
+    row.update(data)
+    return event(name, seq, id=book_id, **row)
+
+
+# ------------------------------------------------------
+# expand_message / collapse_events
+# ------------------------------------------------------
+def test_expand_message_unpacks_batches():
+    msg = {"event": "batch", "events": [
+        event("book_created", 1, id=1, title="A"),
+        {"event": "book_batch_updated", "seq": 2, "ts": 5.0,
+         "data": [{"id": 1, "stock": 3}, {"id": 2, "stock": 4}]},
+    ]}
+    expanded = expand_message(msg)
+    assert [e["event"] for e in expanded] == ["book_created", "book_updated", "book_updated"]
+    assert [e["data"]["id"] for e in expanded] == [1, 1, 2]
+    assert {e["seq"] for e in expanded[1:]} == {2}
+
+
+def test_partial_updates_merge_in_order():
+    upserts, deletes = collapse_events([
+        event("book_created", 1, id=1, title="A", price=10.0, stock=5),
+        event("book_updated", 2, id=1, stock=4),
+        event("book_updated", 3, id=1, price=12.0),
+    ])
+    assert upserts == {1: {"id": 1, "title": "A", "price": 12.0, "stock": 4, "last_seq": 3}}
+    assert deletes == {}
+
+
+def test_redelivered_and_older_events_are_skipped():
+    upserts, _ = collapse_events([
+        event("book_updated", 5, id=1, stock=1),
+        event("book_updated", 5, id=1, stock=2),
+        event("book_updated", 4, id=1, stock=3),
+    ])
+    assert upserts == {1: {"id": 1, "stock": 1, "last_seq": 5}}
+
+
+def test_events_already_applied_are_skipped():
+    upserts, deletes = collapse_events([
+        event("book_updated", 7, id=1, stock=1),
+        event("book_updated", 9, id=2, stock=2),
+        event("book_deleted", 3, id=3),
+    ], applied={1: 8, 2: 8, 3: 3})
+    assert upserts == {2: {"id": 2, "stock": 2, "last_seq": 9}}
+    assert deletes == {}
+
+
+def test_delete_wins_and_keeps_its_seq():
+    upserts, deletes = collapse_events([
+        event("book_updated", 1, id=1, stock=1),
+        event("book_deleted", 2, id=1),
+        event("book_deleted", None, id=2),
+    ])
+    assert upserts == {}
+    assert deletes == {1: 2, 2: None}
+
+
+def test_unknown_columns_and_events_without_id_are_ignored():
+    upserts, _ = collapse_events([
+        event("book_updated", 1, title="sin id"),
+        event("book_updated", 2, id=1, stock=1, last_seq=99, cover="x.png"),
+        event("book_updated", None, id=2, stock=2),
+    ])
+    assert upserts == {1: {"id": 1, "stock": 1, "last_seq": 2}, 2: {"id": 2, "stock": 2}}
+
+
+# ------------------------------------------------------
+# apply_events / _flush (SQLite)
+# ------------------------------------------------------
+@pytest.fixture(scope="module")
+def app():
+    return create_consumer_app()
+
+
+@pytest.fixture
+def session(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(CatalogVersion(id=1, version=0))
+        db.session.commit()
+        yield db.session
+        db.session.remove()
+
+
+def apply(*events):
+    upserts, deletes = collapse_events(list(events), applied_seqs({e["data"]["id"] for e in events}))
+    apply_events(upserts, deletes)
+    db.session.commit()
+
+
+def stored(book_id):
+    return db.session.execute(db.select(Book.stock, Book.last_seq).where(Book.id == book_id)).first()
+
+
+def test_upsert_keeps_newer_state(session):
+    apply(full("book_created", 1, 1, stock=5))
+    apply(full("book_updated", 3, 1, stock=3))
+    assert tuple(stored(1)) == (3, 3)
+    # Un evento más antiguo que llega tarde no sobrescribe
+    upserts, deletes = collapse_events([full("book_updated", 2, 1, stock=9)])
+    apply_events(upserts, deletes)
+    db.session.commit()
+    assert tuple(stored(1)) == (3, 3)
+    assert db.session.get(CatalogVersion, 1).version == 3
+
+
+def test_late_create_after_newer_update_keeps_all_fields(session):
+    apply(full("book_updated", 600, 5, title="A", price=12.0, stock=9))
+    apply(full("book_created", 100, 5, title="A", price=10.0, stock=20))
+    book = db.session.get(Book, 5)
+    assert (book.title, book.price, book.stock, book.last_seq) == ("A", 12.0, 9, 600)
+
+
+def test_partial_event_never_inserts_a_stub(session):
+    apply(event("book_updated", 2, id=5, stock=9))
+    assert stored(5) is None
+    apply(full("book_created", 1, 5, stock=20))
+    apply(event("book_updated", 3, id=5, stock=7))
+    apply(event("book_updated", 2, id=5, stock=8))
+    book = db.session.get(Book, 5)
+    assert (book.title, book.stock, book.last_seq) == ("Libro 5", 7, 3)
+
+
+def test_older_delete_does_not_remove_book(session):
+    apply(full("book_created", 4, 1, stock=5))
+    apply_events({}, {1: 2})
+    db.session.commit()
+    assert stored(1) is not None
+    apply_events({}, {1: 6})
+    db.session.commit()
+    assert stored(1) is None
+
+
+class FakeChannel:
+    def __init__(self):
+        self.log = []
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.log.append(("ack", delivery_tag, multiple))
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        self.log.append(("nack", delivery_tag, multiple, requeue))
+
+
+def message(tag, *events):
+    return tag, None, json.dumps({"event": "batch", "events": list(events)}).encode()
+
+
+def test_flush_acks_whole_batch(session):
+    channel = FakeChannel()
+    worker = BookUpdateConsumer(None, "rabbitmq")
+    worker._flush(channel, [message(1, full("book_created", 1, 1, stock=1)),
+                            message(2, event("book_updated", 2, id=1, stock=2))])
+    assert channel.log == [("ack", 2, True)]
+    assert tuple(stored(1)) == (2, 2)
+
+
+def test_flush_rejects_only_poison_message(session):
+    channel = FakeChannel()
+    worker = BookUpdateConsumer(None, "rabbitmq")
+    worker._flush(channel, [message(1, full("book_created", 1, 1)),
+                            message(2, full("book_created", 2, 2, price="zz")),
+                            message(3, full("book_created", 3, 3))])
+    assert channel.log == [("ack", 1, False), ("nack", 2, False, False), ("ack", 3, False)]
+    assert worker.stats["rejected"] == 1
+    assert stored(1) is not None and stored(2) is None and stored(3) is not None
+
+
+def test_flush_requeues_batch_on_database_error(session, monkeypatch):
+    def unavailable(events):
+        raise consumer.OperationalError("INSERT", None, Exception("gone away"))
+    channel = FakeChannel()
+    worker = BookUpdateConsumer(None, "rabbitmq")
+    monkeypatch.setattr(worker, "_commit", unavailable)
+    monkeypatch.setattr(consumer.time, "sleep", lambda seconds: None)
+    worker._flush(channel, [message(1, event("book_created", 1, id=1)),
+                            message(2, event("book_created", 2, id=2))])
+    assert channel.log == [("nack", 2, True, True)]
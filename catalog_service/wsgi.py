@@ -0,0 +1,12 @@
+from app import app, init_db, start_background_tasks
+
+# ------------------------------------------------------
+# Punto de entrada WSGI (gunicorn -c gunicorn.conf.py)
+# ------------------------------------------------------
+
+
+def create_app():
+    """Prepara la base de datos y las tareas de fondo de este worker."""
+    init_db()
+    start_background_tasks()
+    return app
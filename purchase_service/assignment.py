@@ -0,0 +1,279 @@
+import datetime, heapq, os, threading, time
+from sqlalchemy import func, insert, select, update
+from models import db
+from models.delivery import DeliveryProvider
+from models.delivery_assignment import DeliveryAssignment
+from models.purchase import Purchase
+from payments import PURCHASE_PAID
+
+# ------------------------------------------------------
+# Asignación automática de entregas
+# ------------------------------------------------------
+# Un hilo toma las compras pagadas por lotes y las reparte entre los
+# proveedores activos según su carga. La carga de cada proveedor
+# (entregas en estado Assigned) se guarda en un heap ordenado por
+# (carga + 1) / peso, con un contador de turno para desempatar; así se
+# reparte en proporción al peso (round-robin ponderado) y nunca se supera
+# la capacidad. Los contadores se reconstruyen desde delivery_assignment
+# al arrancar y cada ASSIGNMENT_RESYNC_SECONDS, lo que también absorbe
+# asignaciones hechas por otras réplicas. Cada lote se escribe con un
+# INSERT masivo y un único UPDATE de las compras. POST /assignments (a mano)
+# pasa por assign(): misma compra bloqueada, mismos contadores.
+
+ASSIGNMENT_BATCH_SIZE = int(os.getenv("ASSIGNMENT_BATCH_SIZE", "500"))
+ASSIGNMENT_INTERVAL = float(os.getenv("ASSIGNMENT_INTERVAL", "2"))
+ASSIGNMENT_RESYNC_SECONDS = float(os.getenv("ASSIGNMENT_RESYNC_SECONDS", "60"))
+ASSIGNMENT_RATE_WINDOW = 60
+DEFAULT_PROVIDER_CAPACITY = 50
+
+ASSIGNED = "Assigned"
+DELIVERED = "Delivered"
+ON_DELIVERY = "On Delivery"
+
+
+class AssignmentRejected(Exception):
+    """La asignación manual no es posible; status_code es la respuesta HTTP."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ProviderLoad:
+    """Carga de los proveedores con selección del menos cargado (ponderado)."""
+
+    def __init__(self):
+        self._heap = []
+        self.load = {}
+        self.capacity = {}
+        self.weight = {}
+        self._turn = 0
+
+    def rebuild(self, providers, loads):
+        """providers: [(id, capacity, weight)]; loads: {provider_id: activas}."""
+        self._heap = []
+        self.load, self.capacity, self.weight = {}, {}, {}
+        for provider_id, capacity, weight in providers:
+            self.load[provider_id] = loads.get(provider_id, 0)
+            self.capacity[provider_id] = capacity if capacity is not None else DEFAULT_PROVIDER_CAPACITY
+            self.weight[provider_id] = max(weight or 1, 1)
+            self._push(provider_id)
+
+    def _push(self, provider_id):
+        if self.load[provider_id] >= self.capacity[provider_id]:
+            return
+        self._turn += 1
+        score = (self.load[provider_id] + 1) / self.weight[provider_id]
+        heapq.heappush(self._heap, (score, self._turn, provider_id))
+
+    def pick(self):
+        """Proveedor para la siguiente entrega, o None si todos están llenos."""
+        while self._heap:
+            _, _, provider_id = heapq.heappop(self._heap)
+            # Entrada vieja de un proveedor que se llenó con take()
+            if self.load[provider_id] >= self.capacity[provider_id]:
+                continue
+            self.load[provider_id] += 1
+            self._push(provider_id)
+            return provider_id
+        return None
+
+    def take(self, provider_id):
+        """Una entrega asignada fuera de pick() (a mano) ocupa un hueco del proveedor."""
+        if provider_id in self.load:
+            self.load[provider_id] += 1
+
+    def release(self, provider_id):
+        """Una entrega terminó: el proveedor vuelve a tener hueco."""
+        if provider_id not in self.load or self.load[provider_id] == 0:
+            return
+        full = self.load[provider_id] >= self.capacity[provider_id]
+        self.load[provider_id] -= 1
+        # Si estaba lleno no estaba en el heap; si no, su entrada vieja queda
+        # con una puntuación algo peor hasta el siguiente rebuild
+        if full:
+            self._push(provider_id)
+
+    def free_slots(self):
+        return sum(max(self.capacity[p] - self.load[p], 0) for p in self.load)
+
+
+def provider_loads():
+    """Entregas activas por proveedor, leídas de la base de datos."""
+    return dict(db.session.execute(
+        select(DeliveryAssignment.provider_id, func.count())
+        .where(DeliveryAssignment.status == ASSIGNED)
+        .group_by(DeliveryAssignment.provider_id)
+    ).all())
+
+
+def assignment_backlog():
+    """Compras pagadas pendientes de asignar y ritmo de asignación (último minuto)."""
+    since = datetime.datetime.utcnow() - datetime.timedelta(seconds=ASSIGNMENT_RATE_WINDOW)
+    depth = db.session.execute(
+        select(func.count()).select_from(Purchase).where(Purchase.status == PURCHASE_PAID)
+    ).scalar()
+    recent = db.session.execute(
+        select(func.count()).select_from(DeliveryAssignment)
+        .where(DeliveryAssignment.assigned_at >= since)
+    ).scalar()
+    rate = recent / ASSIGNMENT_RATE_WINDOW
+    return {
+        "queue_depth": depth,
+        "assigned_last_minute": recent,
+        "drain_per_second": round(rate, 2),
+        "estimated_drain_seconds": round(depth / rate, 1) if rate else None,
+    }
+
+
+class AssignmentEngine:
+    """Hilo que asigna las compras pagadas a proveedores por lotes."""
+
+    def __init__(self, app, batch_size=ASSIGNMENT_BATCH_SIZE, interval=ASSIGNMENT_INTERVAL,
+                 resync_seconds=ASSIGNMENT_RESYNC_SECONDS):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self.resync_seconds = resync_seconds
+        self.loads = ProviderLoad()
+        self._lock = threading.Lock()
+        self._synced_at = 0.0
+        self.running = False
+        self.stats = {"assigned": 0, "batches": 0, "errors": 0, "last_batch_size": 0,
+                      "last_batch_ms": 0.0, "waiting_for_capacity": False}
+
+    def resync(self):
+        providers = db.session.execute(
+            select(DeliveryProvider.id, DeliveryProvider.capacity, DeliveryProvider.weight)
+            .where(DeliveryProvider.active.isnot(False))
+        ).all()
+        with self._lock:
+            self.loads.rebuild(providers, provider_loads())
+        self._synced_at = time.monotonic()
+
+    def release(self, provider_id):
+        with self._lock:
+            self.loads.release(provider_id)
+
+    def assign_once(self):
+        """Asigna un lote de compras pagadas. Devuelve cuántas asignó."""
+        if time.monotonic() - self._synced_at >= self.resync_seconds:
+            self.resync()
+            db.session.commit()
+
+        with self._lock:
+            limit = min(self.batch_size, self.loads.free_slots())
+        self.stats["waiting_for_capacity"] = limit == 0
+        if limit == 0:
+            return 0
+
+        start = time.perf_counter()
+        # SKIP LOCKED: otra réplica del motor toma otras compras en paralelo
+        purchase_ids = db.session.execute(
+            select(Purchase.id)
+            .where(Purchase.status == PURCHASE_PAID)
+            .order_by(Purchase.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not purchase_ids:
+            db.session.commit()
+            return 0
+
+        now = datetime.datetime.utcnow()
+        with self._lock:
+            rows = []
+            for purchase_id in purchase_ids:
+                provider_id = self.loads.pick()
+                if provider_id is None:
+                    break
+                rows.append({"purchase_id": purchase_id, "provider_id": provider_id,
+                             "status": ASSIGNED, "assigned_at": now})
+        if not rows:
+            db.session.commit()
+            return 0
+        try:
+            db.session.execute(insert(DeliveryAssignment), rows)
+            db.session.execute(
+                update(Purchase)
+                .where(Purchase.id.in_([row["purchase_id"] for row in rows]))
+                .values(status=ON_DELIVERY)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
+            # Los contadores ya sumaron este lote: volver a la verdad de la base de datos
+            db.session.rollback()
+            self._synced_at = 0.0
+            raise
+
+        self.stats["assigned"] += len(rows)
+        self.stats["batches"] += 1
+        self.stats["last_batch_size"] = len(rows)
+        self.stats["last_batch_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return len(rows)
+
+    def assign(self, purchase_id, provider_id):
+        """Asigna a mano una compra pagada a un proveedor, en una sola transacción.
+
+        Lanza AssignmentRejected si la compra no está pagada (o la está
+        asignando el motor) o el proveedor no existe o no tiene hueco.
+        """
+        purchase = db.session.execute(
+            select(Purchase).where(Purchase.id == purchase_id).with_for_update(skip_locked=True)
+        ).scalar_one_or_none()
+        if purchase is None:
+            if db.session.execute(select(Purchase.id).where(Purchase.id == purchase_id)).first():
+                raise AssignmentRejected("La compra se está asignando en este momento", 409)
+            raise AssignmentRejected("Compra no encontrada", 404)
+        if purchase.status != PURCHASE_PAID:
+            raise AssignmentRejected(f"La compra está en estado {purchase.status}", 409)
+
+        provider = db.session.get(DeliveryProvider, provider_id)
+        if provider is None or provider.active is False:
+            raise AssignmentRejected("Proveedor no encontrado o inactivo", 404)
+        active = db.session.execute(
+            select(func.count()).select_from(DeliveryAssignment)
+            .where(DeliveryAssignment.provider_id == provider_id,
+                   DeliveryAssignment.status == ASSIGNED)
+        ).scalar()
+        capacity = provider.capacity if provider.capacity is not None else DEFAULT_PROVIDER_CAPACITY
+        if active >= capacity:
+            raise AssignmentRejected("El proveedor no tiene capacidad libre", 409)
+
+        assignment = DeliveryAssignment(purchase_id=purchase_id, provider_id=provider_id,
+                                        status=ASSIGNED, assigned_at=datetime.datetime.utcnow())
+        db.session.add(assignment)
+        purchase.status = ON_DELIVERY
+        db.session.commit()
+        with self._lock:
+            self.loads.take(provider_id)
+        self.stats["assigned"] += 1
+        return assignment
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, daemon=True, name="assignment-engine").start()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    if self.assign_once() == self.batch_size:
+                        continue
+                except Exception as e:
+                    db.session.rollback()
+                    self.stats["errors"] += 1
+                    print(f"[Purchase Service] ❌ Error asignando entregas: {e}")
+                finally:
+                    db.session.remove()
+                time.sleep(self.interval)
+
+    def snapshot(self):
+        with self._lock:
+            providers = {
+                provider_id: {"load": load, "capacity": self.loads.capacity[provider_id],
+                              "weight": self.loads.weight[provider_id]}
+                for provider_id, load in self.loads.load.items()
+            }
+        return dict(self.stats, running=self.running, providers=providers)
@@ -0,0 +1,276 @@
+import asyncio, os, time
+from contextlib import asynccontextmanager
+from functools import wraps
+import httpx
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import QueuePool
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from app import (app as flask_app, init_db, start_leader_tasks, outbox_relay, publisher,
+                 payment_publisher, token_verifier, book_cache, RABBITMQ_HOST)
+from async_broker import AsyncEventPublisher, AsyncFanoutSubscription, AsyncOutboxRelay
+from auth import REVOCATION_EXCHANGE
+from book_cache import BOOK_EVENTS_EXCHANGE, BOOK_FIELDS, book_ids_from_message
+from dbconfig import engine_options
+from http_client import ServiceUnavailable
+from metrics import metrics
+from models.book import Book
+from stock import place_order
+from tracing import tracer
+
+# ------------------------------------------------------
+# Modo de servicio asíncrono (ASGI)
+# ------------------------------------------------------
+# POST /purchase se atiende en el bucle de eventos: la validación remota
+# del token usa un cliente HTTP asíncrono con pool de conexiones, la
+# transacción de la compra corre sobre aiomysql (SQLAlchemy asyncio, con
+# la misma lógica de stock.place_order vía run_sync) y el relay del outbox
+# y las suscripciones de RabbitMQ usan aio-pika (async_broker.py). Un solo
+# proceso mantiene así miles de compras en curso sin un hilo por petición.
+#
+# El resto de rutas son las de app.py, montadas tal cual en un pool de
+# hilos (a2wsgi), igual que los barridos de fondo de un solo líder.
+#
+# Uso:  SERVING_MODE=async gunicorn -c gunicorn.conf.py
+#       python async_app.py   (servidor de desarrollo, uvicorn)
+
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "100"))
+ASYNC_HTTP_MAX_KEEPALIVE = int(os.getenv("ASYNC_HTTP_MAX_KEEPALIVE", "20"))
+ASYNC_WSGI_THREADS = int(os.getenv("WEB_THREADS", "8"))
+ASYNC_DRIVERS = (("mysql+pymysql://", "mysql+aiomysql://"), ("sqlite://", "sqlite+aiosqlite://"))
+# Sin conexión libre en el pool (DB_POOL_TIMEOUT) o base de datos caída: 503
+# con Retry-After, como el rechazo por saturación de auth_service
+DB_UNAVAILABLE_RETRY_AFTER = "1"
+
+
+def async_database_uri(uri):
+    """La misma base de datos con el driver asíncrono (aiomysql / aiosqlite)."""
+    for sync_prefix, async_prefix in ASYNC_DRIVERS:
+        if uri.startswith(sync_prefix):
+            return async_prefix + uri[len(sync_prefix):]
+    return uri
+
+
+# Motor asíncrono con los mismos límites de pool que el síncrono (DB_POOL_*)
+_sync_uri = flask_app.config["SQLALCHEMY_DATABASE_URI"]
+_options = engine_options(_sync_uri)
+_options.pop("poolclass", None)  # asyncio usa su propio QueuePool adaptado
+engine = create_async_engine(os.getenv("ASYNC_DATABASE_URI") or async_database_uri(_sync_uri), **_options)
+async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+# Relay del outbox y publicadores sobre aio-pika; el relay de hilos de app.py
+# deja de escuchar los commits de este proceso
+async_publisher = AsyncEventPublisher(RABBITMQ_HOST, queue_name=publisher.queue_name,
+                                      fanout_exchange=publisher.fanout_exchange)
+async_payment_publisher = AsyncEventPublisher(RABBITMQ_HOST, queue_name=None,
+                                              fanout_exchange=payment_publisher.fanout_exchange)
+async_relay = AsyncOutboxRelay(async_session, async_publisher,
+                               routes={"payment_": async_payment_publisher})
+outbox_relay.detach()
+
+
+def set_revocations_live(live):
+    token_verifier.revocations_live = live
+
+
+def set_book_cache_live(live):
+    # Lo cacheado sin suscripción pudo perder invalidaciones
+    book_cache.enabled = False
+    book_cache.clear()
+    book_cache.enabled = live
+
+
+revocation_subscription = AsyncFanoutSubscription(
+    RABBITMQ_HOST, REVOCATION_EXCHANGE, token_verifier.revoke_message, set_revocations_live,
+    on_bound=token_verifier.load_revocations)
+book_events_subscription = AsyncFanoutSubscription(
+    RABBITMQ_HOST, BOOK_EVENTS_EXCHANGE,
+    lambda msg: book_cache.invalidate(book_ids_from_message(msg)), set_book_cache_live)
+
+http_stats = {"in_flight": 0, "requests": 0}
+
+
+def async_pool_stats():
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"status": pool.status()}
+    return {"size": pool.size(), "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0)}
+
+
+metrics.gauges("async_http", lambda: http_stats)
+metrics.gauges("async_db_pool", async_pool_stats)
+metrics.gauges("async_outbox_relay", lambda: async_relay.stats)
+metrics.gauges("async_publisher", lambda: async_publisher.stats)
+metrics.gauges("async_payment_publisher", lambda: async_payment_publisher.stats)
+
+# ------------------------------------------------------
+# Helpers: instrumentación, token y libros
+# ------------------------------------------------------
+def instrumented(route):
+    """Span de la petición, latencia por ruta y peticiones en curso (como init_app en Flask)."""
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(request):
+            start = time.perf_counter()
+            # Si el handler lanza una excepción, el servidor responde 500
+            status = 500
+            http_stats["in_flight"] += 1
+            http_stats["requests"] += 1
+            try:
+                with tracer.span(f"{request.method} {route}",
+                                 parent=request.headers.get("traceparent") or None) as span:
+                    response = await handler(request)
+                    status = response.status_code
+                    span.attributes["status_code"] = status
+                    if status >= 500:
+                        span.status = "error"
+                    if span.sampled:
+                        response.headers["X-Trace-Id"] = span.trace_id
+                return response
+            finally:
+                http_stats["in_flight"] -= 1
+                metrics.observe("http_request_duration_seconds", time.perf_counter() - start,
+                                route=route, method=request.method, status=str(status))
+        return wrapper
+    return decorator
+
+
+async def verify_remote(http, token):
+    """Valida el token contra auth_service sin bloquear el bucle de eventos.
+
+    Comparte breaker, plazo, reintentos y validaciones recientes con el modo
+    síncrono (token_verifier.client); el pool de conexiones es el de httpx.
+    """
+    try:
+        with tracer.span("auth.validate", url=token_verifier.auth_url):
+            with metrics.timed("outbound_request_duration_seconds", target="auth_validate"):
+                resp = await token_verifier.client.arequest(
+                    http, "POST", token_verifier.auth_url, json={"token": token},
+                    headers=tracer.inject({}))
+    except ServiceUnavailable as e:
+        return token_verifier.verify_stale(token, e)
+    return token_verifier.remote_result(token, resp)
+
+
+async def validate_jwt(request):
+    """Como app.validate_jwt: local si hay suscripción a revocaciones, si no auth_service."""
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return None, {"error": "token no proporcionado"}, 401
+    token = auth_header.split(" ")[1]
+    try:
+        if token_verifier.local_ready:
+            user, error = token_verifier.verify_local(token)
+        else:
+            user, error = await verify_remote(request.app.state.http, token)
+        if error:
+            return None, {"error": "token inválido o expirado"}, 401
+        return user, None, 200
+    except Exception as e:
+        return None, {"error": f"Error al validar token: {str(e)}"}, 503
+
+
+async def load_book(book_id):
+    """Lee un libro como dict (None si no existe); ver book_cache.load_book."""
+    async with async_session() as session:
+        row = (await session.execute(
+            select(*[getattr(Book, f) for f in BOOK_FIELDS]).where(Book.id == book_id)
+        )).first()
+    return dict(zip(BOOK_FIELDS, row)) if row else None
+
+# ======================================================
+# ==================== COMPRAS =========================
+# ======================================================
+@instrumented("/purchase")
+async def make_purchase(request):
+    """Crear una compra (mismo contrato que POST /purchase en app.py)"""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+
+    if not isinstance(data, dict) or "book_id" not in data or "quantity" not in data:
+        return JSONResponse({"error": "book_id y quantity son requeridos"}, 400)
+
+    book_id = data["book_id"]
+    quantity = data["quantity"]
+
+    if not isinstance(quantity, int) or quantity <= 0:
+        return JSONResponse({"error": "quantity debe ser un entero positivo"}, 400)
+
+    # ========= VALIDAR TOKEN ===========================
+    user, error, status = await validate_jwt(request)
+    if error:
+        return JSONResponse(error, status)
+
+    try:
+        # ========== CONSULTAR LIBRO (caché) ================
+        book = await book_cache.get_async(book_id, load_book)
+
+        if not book:
+            return JSONResponse({"error": "Libro no encontrado"}, 404)
+
+        # ========== RESERVAR STOCK Y CREAR PURCHASE ========
+        async with async_session() as session:
+            new_purchase, remaining_stock = await session.run_sync(place_order, user["id"], book, quantity)
+    except (SQLAlchemyError, asyncio.TimeoutError, OSError) as e:
+        return JSONResponse({"error": f"Base de datos no disponible: {e.__class__.__name__}"}, 503,
+                            headers={"Retry-After": DB_UNAVAILABLE_RETRY_AFTER})
+    if new_purchase is None:
+        return JSONResponse({
+            "error": "No hay suficiente stock disponible",
+            "stock_actual": remaining_stock
+        }, 400)
+
+    return JSONResponse({
+        "message": "Compra creada",
+        "purchase_id": new_purchase.id,
+        "total_price": new_purchase.total_price,
+        "remaining_stock": remaining_stock,
+        "reserved_until": new_purchase.reserved_until.isoformat()
+    }, 201)
+
+# ------------------------------------------------------
+# Aplicación ASGI
+# ------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app):
+    """Tablas, tareas de fondo y clientes de red de este worker."""
+    await asyncio.to_thread(init_db)
+    metrics.start()
+    start_leader_tasks()
+    app.state.http = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=ASYNC_HTTP_MAX_KEEPALIVE))
+    tasks = [asyncio.create_task(job.run())
+             for job in (async_relay, revocation_subscription, book_events_subscription)]
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await app.state.http.aclose()
+        await async_publisher.close()
+        await async_payment_publisher.close()
+        await engine.dispose()
+
+
+app = Starlette(routes=[
+    Route("/purchase", make_purchase, methods=["POST"]),
+    # Todas las demás rutas (y /metrics, /apidocs) siguen siendo las de Flask
+    Mount("/", app=WSGIMiddleware(flask_app, workers=ASYNC_WSGI_THREADS)),
+], lifespan=lifespan)
+
+# ------------------------------------------------------
+# Ejecución
+# ------------------------------------------------------
+if __name__ == "__main__":
+    # Servidor de desarrollo; en producción: SERVING_MODE=async gunicorn -c gunicorn.conf.py
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "5003")))
@@ -0,0 +1,198 @@
+import asyncio, json
+import aio_pika
+from aio_pika.exceptions import AMQPError, DeliveryError
+from metrics import metrics
+from outbox import OutboxRelay
+from partitions import all_queues, queue_arguments, queue_for
+from publisher import BookEventPublisher, encode_batch
+
+# ------------------------------------------------------
+# RabbitMQ con aio-pika (modo asíncrono, ver async_app.py)
+# ------------------------------------------------------
+# Equivalentes asyncio de los hilos de RabbitMQ del modo síncrono, sobre
+# el bucle de eventos del worker:
+#   AsyncEventPublisher       mismo enrutado, particiones y formato que
+#                             BookEventPublisher, con confirmaciones del broker
+#   AsyncOutboxRelay          OutboxRelay como tarea (claim/release/complete por run_sync)
+#   AsyncFanoutSubscription   suscripción a token_revocations / book_events
+# Los hilos de RabbitMQ de app.py no se arrancan en este modo.
+
+
+class AsyncEventPublisher(BookEventPublisher):
+    """BookEventPublisher sobre aio-pika: un canal con confirmaciones por publicador."""
+
+    def __init__(self, host, **kwargs):
+        super().__init__(host, **kwargs)
+        self._send_lock = None
+        self._exchange = None
+
+    async def publish_many(self, messages, timeout=30):
+        """Publica varios mensajes y espera la confirmación del broker."""
+        if not messages:
+            return
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        async with self._send_lock:
+            await asyncio.wait_for(self._publish(messages), timeout)
+        self.stats["published"] += len(messages)
+        self.stats["batches"] += 1
+
+    async def close(self):
+        try:
+            if self._connection is not None and not self._connection.is_closed:
+                await self._connection.close()
+        except (AMQPError, OSError):
+            pass
+        self._connection = None
+        self._channel = None
+
+    async def _publish(self, messages):
+        while True:
+            if self._channel is None:
+                await self._connect()
+            try:
+                for start in range(0, len(messages), self.batch_size):
+                    await self._send(messages[start:start + self.batch_size])
+                return
+            except DeliveryError as e:
+                # El broker rechazó el lote: se reintenta (entrega al-menos-una-vez)
+                self.stats["errors"] += 1
+                print(f"[Purchase Service] ⚠️ Publicación rechazada ({e}), reintentando...")
+                await asyncio.sleep(0.5)
+            except (AMQPError, OSError) as e:
+                self.stats["errors"] += 1
+                self.stats["reconnects"] += 1
+                print(f"[Purchase Service] ❌ Conexión con RabbitMQ perdida ({e}), reconectando...")
+                await self.close()
+
+    async def _connect(self):
+        delay = 0.5
+        while True:
+            try:
+                self._connection = await aio_pika.connect(host=self.host, heartbeat=self.heartbeat)
+                self._channel = await self._connection.channel(publisher_confirms=True,
+                                                               on_return_raises=True)
+                for name in all_queues(self.partitions, self.queue_name) if self.queue_name else []:
+                    await self._channel.declare_queue(name, arguments=queue_arguments(self.partitions))
+                if self.fanout_exchange:
+                    self._exchange = await self._channel.declare_exchange(
+                        self.fanout_exchange, aio_pika.ExchangeType.FANOUT)
+                return
+            except (AMQPError, OSError) as e:
+                print(f"[Purchase Service] ❌ RabbitMQ no disponible ({e}), reintentando en {delay}s...")
+                await self.close()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10)
+
+    async def _send(self, messages):
+        headers = self._headers(messages)
+
+        def message(group):
+            return aio_pika.Message(encode_batch(group).encode(), headers=headers,
+                                    content_type="application/json",
+                                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT)
+
+        groups = self._partition(messages) if self.queue_name else {}
+        for partition, group in sorted(groups.items()):
+            await self._channel.default_exchange.publish(
+                message(group), routing_key=queue_for(partition, self.partitions, self.queue_name),
+                mandatory=True)
+        if self.fanout_exchange:
+            await self._exchange.publish(message(messages), routing_key="", mandatory=False)
+
+
+class AsyncOutboxRelay(OutboxRelay):
+    """OutboxRelay como tarea asyncio; la transacción usa una AsyncSession."""
+
+    def __init__(self, sessionmaker, publisher, **kwargs):
+        super().__init__(None, publisher, **kwargs)
+        self.sessionmaker = sessionmaker
+        self._loop = None
+        self._wakeup_async = None
+
+    def _after_commit(self, session):
+        # Los commits pueden venir de hilos (rutas Flask montadas en la app ASGI)
+        if session.info.pop("outbox_pending", False) and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup_async.set)
+
+    async def drain_once_async(self):
+        """Publica un lote de eventos pendientes. Devuelve cuántos publicó."""
+        # Reserva, publicación y borrado como en OutboxRelay.drain_once: ninguna
+        # transacción queda abierta mientras se espera al broker
+        async with self.sessionmaker() as session:
+            claimed, batches = await session.run_sync(self.claim)
+        if not claimed:
+            return 0
+        try:
+            for publisher, messages in batches.items():
+                with metrics.timed("rabbitmq_publish_duration_seconds",
+                                   target=publisher.queue_name or publisher.fanout_exchange):
+                    await publisher.publish_many(messages)
+        except Exception:
+            async with self.sessionmaker() as session:
+                await session.run_sync(self.release, claimed)
+            raise
+        async with self.sessionmaker() as session:
+            await session.run_sync(self.complete, claimed)
+        return len(claimed)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup_async = asyncio.Event()
+        while True:
+            self._wakeup_async.clear()
+            try:
+                if await self.drain_once_async() == self.batch_size:
+                    continue
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[Purchase Service] ❌ Error en el relay del outbox: {e}")
+                await asyncio.sleep(self.poll_interval)
+            try:
+                await asyncio.wait_for(self._wakeup_async.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+class AsyncFanoutSubscription:
+    """Cola exclusiva enlazada a un exchange fanout; reconecta si se cae.
+
+    on_message recibe el cuerpo ya decodificado; on_state(True/False) avisa
+    cuando la suscripción queda activa o se pierde. on_bound (opcional) se
+    ejecuta en un hilo tras enlazar la cola y antes de on_state(True), p. ej.
+    para cargar el estado anterior a la suscripción; si falla, se reconecta.
+    """
+
+    def __init__(self, host, exchange, on_message, on_state, on_bound=None):
+        self.host = host
+        self.exchange = exchange
+        self.on_message = on_message
+        self.on_state = on_state
+        self.on_bound = on_bound
+
+    async def run(self):
+        while True:
+            connection = None
+            try:
+                connection = await aio_pika.connect(host=self.host)
+                channel = await connection.channel()
+                exchange = await channel.declare_exchange(self.exchange, aio_pika.ExchangeType.FANOUT)
+                queue = await channel.declare_queue(exclusive=True)
+                await queue.bind(exchange)
+                if self.on_bound is not None:
+                    await asyncio.to_thread(self.on_bound)
+                self.on_state(True)
+                print(f"[Purchase Service] ✅ Suscrito a {self.exchange} (asyncio)")
+                async with queue.iterator(no_ack=True) as messages:
+                    async for message in messages:
+                        self.on_message(json.loads(message.body))
+            except Exception as e:
+                print(f"[Purchase Service] ❌ Suscripción a {self.exchange} caída ({e}), reintentando en 3s...")
+            finally:
+                self.on_state(False)
+                if connection is not None and not connection.is_closed:
+                    try:
+                        await connection.close()
+                    except (AMQPError, OSError):
+                        pass
+            await asyncio.sleep(3)
@@ -0,0 +1,204 @@
+import hashlib, json, os, threading, time
+import jwt
+import pika
+from cache import TTLCache
+from http_client import ServiceClient, ServiceUnavailable
+from metrics import metrics
+from tracing import tracer
+
+# ------------------------------------------------------
+# Verificación local de JWT con caché de claims
+# ------------------------------------------------------
+# Los tokens HS256 se verifican en el propio proceso con la misma clave y
+# lógica que auth_service.decode_token. Los claims validados se guardan en
+# una caché acotada cuya expiración nunca supera el "exp" del token.
+# Las revocaciones de /logout llegan por el exchange fanout
+# token_revocations; tras cada conexión (y reconexión) el suscriptor carga
+# además las vigentes de GET /revocations de auth_service, porque la cola
+# exclusiva no recibe las anteriores a la suscripción. Hasta completar esa
+# carga la validación se delega en auth_service para no aceptar tokens
+# revocados. Las revocaciones se indexan por hash del token y por jti.
+#
+# Las llamadas a auth_service usan un ServiceClient (http_client.py) con
+# pool keep-alive, plazo, reintentos y circuit breaker. Mientras auth está
+# degradado (breaker abierto o sin respuesta) un token validado en los
+# últimos AUTH_STALE_TTL segundos se sigue aceptando, salvo que se haya
+# revocado; el resto recibe 503 al instante.
+
+SECRET_KEY = os.environ.get("SECRET_KEY", "supersecretkey")
+AUTH_URL = os.getenv("AUTH_URL", "http://auth-service:5001/validate")
+AUTH_REVOCATIONS_URL = os.getenv("AUTH_REVOCATIONS_URL", AUTH_URL.rsplit("/", 1)[0] + "/revocations")
+AUTH_MODE = os.getenv("AUTH_MODE", "local")  # local | remote
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+AUTH_STALE_TTL = float(os.getenv("AUTH_STALE_TTL", "30"))
+REVOCATION_EXCHANGE = "token_revocations"
+
+metrics.histogram("outbound_request_duration_seconds", "Llamadas HTTP a otros servicios")
+metrics.counter("auth_stale_validations_total",
+                "Tokens aceptados por una validación reciente mientras auth_service está degradado")
+
+
+def token_key(token):
+    """Clave de caché/revocación: nunca se guarda el token en claro."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenVerifier:
+    """Valida tokens JWT localmente o contra auth_service."""
+
+    def __init__(self, secret=SECRET_KEY, auth_url=AUTH_URL, mode=AUTH_MODE,
+                 cache_size=TOKEN_CACHE_SIZE, cache_ttl=TOKEN_CACHE_TTL,
+                 stale_ttl=AUTH_STALE_TTL, client=None, revocations_url=AUTH_REVOCATIONS_URL):
+        self.secret = secret
+        self.auth_url = auth_url
+        self.revocations_url = revocations_url
+        self.mode = mode
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.client = client or ServiceClient("auth")
+        # Validaciones remotas recientes, sólo para cuando auth está degradado
+        self.recent = TTLCache(maxsize=cache_size, ttl=stale_ttl)
+        self._revoked = {}
+        self._revoked_lock = threading.Lock()
+        self._revocations = 0
+        self.revocations_live = False
+
+    def verify(self, token):
+        """Devuelve (user, error) con user = {"id", "email"}."""
+        if not self.local_ready:
+            return self._verify_remote(token)
+        return self.verify_local(token)
+
+    @property
+    def local_ready(self):
+        """True si se puede validar sin auth_service (modo local y revocaciones al día)."""
+        return self.mode == "local" and self.revocations_live
+
+    def verify_local(self, token):
+        """Valida el token en el proceso, sin E/S (caché, revocaciones y firma)."""
+        key = token_key(token)
+        if key in self._revoked:
+            return None, "Token invalidado"
+        cached = self.cache.get(key)
+        if cached is not None:
+            user, jti = cached
+            if jti in self._revoked:
+                return None, "Token invalidado"
+            return user, None
+
+        try:
+            payload = jwt.decode(token, self.secret, algorithms=["HS256"])
+        except jwt.ExpiredSignatureError:
+            return None, "Token expirado"
+        except jwt.InvalidTokenError:
+            return None, "Token inválido"
+
+        jti = payload.get("jti")
+        if jti in self._revoked:
+            return None, "Token invalidado"
+        user = {"id": payload["user_id"], "email": payload["email"]}
+        self.cache.set(key, (user, jti), ttl=payload["exp"] - time.time())
+        return user, None
+
+    def _verify_remote(self, token):
+        try:
+            with tracer.span("auth.validate", url=self.auth_url):
+                with metrics.timed("outbound_request_duration_seconds", target="auth_validate"):
+                    resp = self.client.post(self.auth_url, json={"token": token},
+                                            headers=tracer.inject({}))
+        except ServiceUnavailable as e:
+            return self.verify_stale(token, e)
+        return self.remote_result(token, resp)
+
+    def remote_result(self, token, resp):
+        """Interpreta la respuesta de /validate y recuerda las validaciones correctas."""
+        if resp.status_code != 200:
+            self.recent.pop(token_key(token))
+            return None, "token inválido o expirado"
+        user = resp.json()["user"]
+        self.recent.set(token_key(token), user)
+        return user, None
+
+    def verify_stale(self, token, error):
+        """auth_service degradado: acepta una validación reciente o relanza el error."""
+        key = token_key(token)
+        user = self.recent.get(key)
+        if user is None or key in self._revoked:
+            raise error
+        metrics.inc("auth_stale_validations_total")
+        return user, None
+
+    def load_revocations(self):
+        """Carga las revocaciones vigentes de auth_service (por jti).
+
+        Se llama tras suscribirse al exchange: lo revocado antes de la
+        suscripción o durante una reconexión no llega por la cola.
+        """
+        resp = self.client.request("GET", self.revocations_url, headers=tracer.inject({}))
+        if resp.status_code != 200:
+            raise ServiceUnavailable(f"auth: HTTP {resp.status_code} en GET /revocations")
+        revocations = resp.json()["revocations"]
+        for item in revocations:
+            self.revoke(item["jti"], item["exp"])
+        return len(revocations)
+
+    def revoke_message(self, msg):
+        """Aplica un mensaje del exchange token_revocations."""
+        self.revoke(msg["token_hash"], msg.get("exp"))
+        if msg.get("jti"):
+            self.revoke(msg["jti"], msg.get("exp"))
+
+    def revoke(self, key, exp=None):
+        """Marca un token (por su hash o su jti) como revocado hasta su expiración."""
+        now = time.time()
+        with self._revoked_lock:
+            self._revoked[key] = exp or now + 4 * 3600
+            self._revocations += 1
+            # Purga periódica de revocaciones de tokens ya expirados
+            if self._revocations % 1000 == 0:
+                self._revoked = {k: e for k, e in self._revoked.items() if e > now}
+        self.cache.pop(key)
+        self.recent.pop(key)
+
+
+class RevocationListener:
+    """Suscripción al exchange de revocaciones publicado por auth_service."""
+
+    def __init__(self, host, verifier):
+        self.host = host
+        self.verifier = verifier
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name="token-revocations").start()
+
+    def _on_message(self, ch, method, properties, body):
+        self.verifier.revoke_message(json.loads(body))
+
+    def _run(self):
+        while True:
+            connection = None
+            try:
+                connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+                channel = connection.channel()
+                channel.exchange_declare(exchange=REVOCATION_EXCHANGE, exchange_type="fanout")
+                declared = channel.queue_declare(queue="", exclusive=True)
+                channel.queue_bind(exchange=REVOCATION_EXCHANGE, queue=declared.method.queue)
+                channel.basic_consume(queue=declared.method.queue,
+                                      on_message_callback=self._on_message, auto_ack=True)
+                # Con la cola ya enlazada: lo que se revoque desde ahora llega por ella
+                count = self.verifier.load_revocations()
+                self.verifier.revocations_live = True
+                print(f"[Purchase Service] ✅ Suscrito a revocaciones de tokens ({count} vigentes)")
+                channel.start_consuming()
+            except pika.exceptions.AMQPError as e:
+                print(f"[Purchase Service] ❌ Suscripción de revocaciones caída ({e}), reintentando en 3s...")
+            except (ServiceUnavailable, ValueError, KeyError) as e:
+                print(f"[Purchase Service] ❌ No se pudieron cargar las revocaciones ({e}), reintentando en 3s...")
+            finally:
+                self.verifier.revocations_live = False
+                try:
+                    if connection is not None and connection.is_open:
+                        connection.close()
+                except pika.exceptions.AMQPError:
+                    pass
+            time.sleep(3)
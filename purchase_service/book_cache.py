@@ -0,0 +1,213 @@
+import asyncio, json, os, threading, time
+import pika
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from cache import TTLCache
+from models import db
+from models.book import Book
+
+# ------------------------------------------------------
+# Caché read-through de libros
+# ------------------------------------------------------
+# Los datos de un libro cambian mucho menos de lo que se leen. Se guardan
+# en una caché LRU/TTL por proceso que se invalida:
+#   - en este proceso, tras el commit de cualquier transacción que haya
+#     registrado un evento de libro en el outbox;
+#   - en las demás réplicas, con los mismos eventos publicados en el
+#     exchange fanout book_events.
+# Si la suscripción a book_events se cae, la caché se vacía y se deja de
+# usar hasta reconectar. Un fallo de caché sobre el mismo libro se
+# resuelve con una sola consulta (single-flight), también en el modo
+# asíncrono (get_async). El stock que se va a descontar nunca se lee de
+# aquí (ver stock.reserve_stock).
+
+BOOK_CACHE_SIZE = int(os.getenv("BOOK_CACHE_SIZE", "10000"))
+BOOK_CACHE_TTL = float(os.getenv("BOOK_CACHE_TTL", "60"))
+BOOK_CACHE_NEGATIVE_TTL = float(os.getenv("BOOK_CACHE_NEGATIVE_TTL", "5"))
+BOOK_EVENTS_EXCHANGE = "book_events"
+BOOK_FIELDS = ("id", "title", "author", "description", "price", "stock")
+
+_MISSING = object()
+
+
+def load_book(book_id):
+    """Lee un libro de la base de datos como dict (None si no existe)."""
+    row = db.session.execute(
+        select(*[getattr(Book, f) for f in BOOK_FIELDS]).where(Book.id == book_id)
+    ).first()
+    return dict(zip(BOOK_FIELDS, row)) if row else None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class BookCache:
+    """Caché de libros con coalescencia de fallos y contadores."""
+
+    def __init__(self, maxsize=BOOK_CACHE_SIZE, ttl=BOOK_CACHE_TTL,
+                 negative_ttl=BOOK_CACHE_NEGATIVE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.negative_ttl = negative_ttl
+        self._inflight = {}
+        self._inflight_async = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.enabled = False
+        self.coalesced = 0
+        self.invalidations = 0
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+
+    def get(self, book_id, loader=load_book):
+        """Devuelve el libro desde la caché o lo carga una sola vez."""
+        if not self.enabled:
+            return loader(book_id)
+        value = self._cache.get(book_id, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            call = self._inflight.get(book_id)
+            leader = call is None
+            if leader:
+                call = self._inflight[book_id] = _Call()
+                generation = self._generation
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = loader(book_id)
+            self._store(book_id, call.value, generation)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[book_id]
+            call.done.set()
+
+    async def get_async(self, book_id, loader):
+        """Como get(), con loader corrutina; los fallos concurrentes comparten un Future.
+
+        Sólo se llama desde el bucle de eventos (un único hilo), así que las
+        cargas en curso no necesitan lock.
+        """
+        if not self.enabled:
+            return await loader(book_id)
+        value = self._cache.get(book_id, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        future = self._inflight_async.get(book_id)
+        if future is not None:
+            self.coalesced += 1
+            value, error = await asyncio.shield(future)
+            if error is not None:
+                raise error
+            return value
+
+        future = self._inflight_async[book_id] = asyncio.get_running_loop().create_future()
+        generation = self._generation
+        try:
+            value = await loader(book_id)
+            self._store(book_id, value, generation)
+            future.set_result((value, None))
+            return value
+        except Exception as e:
+            future.set_result((None, e))
+            raise
+        finally:
+            del self._inflight_async[book_id]
+            if not future.done():
+                future.cancel()
+
+    def _store(self, book_id, value, generation):
+        # Si hubo una invalidación durante la carga, el valor puede ser viejo
+        if self.enabled and generation == self._generation:
+            ttl = self.negative_ttl if value is None else None
+            self._cache.set(book_id, value, ttl=ttl)
+
+    def invalidate(self, book_ids):
+        with self._lock:
+            self._generation += 1
+        for book_id in book_ids:
+            self._cache.pop(book_id)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        self._cache.clear()
+
+    def _after_commit(self, session):
+        book_ids = session.info.pop("outbox_book_ids", None)
+        if book_ids:
+            self.invalidate(book_ids)
+
+    def _after_rollback(self, session):
+        session.info.pop("outbox_book_ids", None)
+
+    def stats(self):
+        stats = self._cache.stats()
+        stats.update(enabled=self.enabled, coalesced=self.coalesced,
+                     invalidations=self.invalidations)
+        return stats
+
+
+def book_ids_from_message(msg):
+    """Ids de libros afectados por un mensaje de book_events."""
+    events = msg["events"] if msg.get("event") == "batch" else [msg]
+    ids = set()
+    for evt in events:
+        data = evt.get("data")
+        for item in data if isinstance(data, list) else [data or {}]:
+            if item.get("id") is not None:
+                ids.add(item["id"])
+    return ids
+
+
+class BookCacheInvalidator:
+    """Suscripción a book_events que invalida la caché de esta réplica."""
+
+    def __init__(self, host, cache):
+        self.host = host
+        self.cache = cache
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name="book-cache-invalidator").start()
+
+    def _on_message(self, ch, method, properties, body):
+        self.cache.invalidate(book_ids_from_message(json.loads(body)))
+
+    def _run(self):
+        while True:
+            try:
+                connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+                channel = connection.channel()
+                channel.exchange_declare(exchange=BOOK_EVENTS_EXCHANGE, exchange_type="fanout")
+                declared = channel.queue_declare(queue="", exclusive=True)
+                channel.queue_bind(exchange=BOOK_EVENTS_EXCHANGE, queue=declared.method.queue)
+                channel.basic_consume(queue=declared.method.queue,
+                                      on_message_callback=self._on_message, auto_ack=True)
+                # Lo cacheado antes de suscribirse pudo perder invalidaciones
+                self.cache.clear()
+                self.cache.enabled = True
+                print("[Purchase Service] ✅ Suscrito a book_events (caché de libros activa)")
+                channel.start_consuming()
+            except pika.exceptions.AMQPError as e:
+                print(f"[Purchase Service] ❌ Suscripción a book_events caída ({e}), reintentando en 3s...")
+            finally:
+                self.cache.enabled = False
+                self.cache.clear()
+            time.sleep(3)
@@ -0,0 +1,175 @@
+import csv, io, json, math, os, resource, time, uuid
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from models import db
+from models.book import Book
+from outbox import enqueue_event
+
+# ------------------------------------------------------
+# Importación y exportación masiva de libros
+# ------------------------------------------------------
+# POST /books/bulk lee el cuerpo (NDJSON o CSV) línea a línea desde
+# request.stream, sin cargarlo entero en memoria. Las filas válidas se
+# insertan en lotes de BULK_CHUNK_SIZE con un único INSERT executemany y un
+# commit por lote; las inválidas se saltan y se informan. Cada lote lleva un
+# import_id para leer de vuelta los ids generados (MySQL no tiene RETURNING)
+# y se anuncia al catálogo con eventos book_batch_updated de como mucho
+# BULK_EVENT_MAX_BYTES (la columna payload del outbox es TEXT, 64 KB en MySQL).
+#
+# GET /books/export recorre la tabla con un cursor del lado del servidor
+# (yield_per) y va escribiendo la respuesta por bloques.
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+BULK_EVENT_MAX_BYTES = int(os.getenv("BULK_EVENT_MAX_BYTES", "48000"))
+BULK_EXPORT_CHUNK = int(os.getenv("BULK_EXPORT_CHUNK", "1000"))
+BULK_MAX_ERRORS = 100
+
+FORMATS = ("ndjson", "csv")
+EXPORT_FIELDS = ("id", "title", "author", "description", "price", "stock")
+EXPORT_COLUMNS = [getattr(Book, field) for field in EXPORT_FIELDS]
+
+
+class RowError(ValueError):
+    """Fila del import que no se puede insertar."""
+
+
+def detect_format(content_type, requested=None):
+    """Formato del cuerpo: ?format= o, si no viene, el Content-Type."""
+    fmt = (requested or "").lower()
+    if not fmt:
+        fmt = "csv" if "csv" in (content_type or "") else "ndjson"
+    if fmt not in FORMATS:
+        raise RowError(f"formato no soportado: {fmt} (ndjson o csv)")
+    return fmt
+
+
+def parse_rows(stream, fmt):
+    """Itera (línea, fila) leyendo el cuerpo línea a línea."""
+    lines = (raw.decode("utf-8", errors="replace") for raw in stream)
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def validate_row(raw):
+    """Normaliza una fila a las columnas de Book o lanza RowError."""
+    if not isinstance(raw, dict):
+        raise RowError("la fila no es un objeto JSON válido")
+    title = str(raw.get("title") or "").strip()
+    author = str(raw.get("author") or "").strip()
+    if not title or not author:
+        raise RowError("title y author son obligatorios")
+    if len(title) > 150 or len(author) > 100:
+        raise RowError("title (150) o author (100) demasiado largo")
+    try:
+        price = float(raw.get("price"))
+        stock = int(raw.get("stock") or 0)
+    except (TypeError, ValueError, OverflowError):
+        raise RowError("price debe ser un número y stock un entero")
+    # float() acepta "nan" e "inf" (y el JSON NaN/Infinity); NaN < 0 es False
+    if not math.isfinite(price):
+        raise RowError("price debe ser un número finito")
+    if price < 0 or stock < 0:
+        raise RowError("price y stock no pueden ser negativos")
+    return {"title": title, "author": author, "description": raw.get("description") or "",
+            "price": price, "stock": stock}
+
+
+def event_batches(books, max_bytes=BULK_EVENT_MAX_BYTES):
+    """Parte la lista de libros en trozos cuyo JSON no supera max_bytes."""
+    batch, size = [], 2
+    for book in books:
+        length = len(json.dumps(book)) + 2
+        if batch and size + length > max_bytes:
+            yield batch
+            batch, size = [], 2
+        batch.append(book)
+        size += length
+    if batch:
+        yield batch
+
+
+def max_rss_mb():
+    """Pico de memoria residente del proceso (ru_maxrss viene en KB en Linux)."""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _insert_chunk(rows, report):
+    import_id = uuid.uuid4().hex
+    db.session.execute(insert(Book), [dict(row, import_id=import_id) for row in rows])
+    books = db.session.execute(
+        select(*EXPORT_COLUMNS).where(Book.import_id == import_id).order_by(Book.id)
+    ).all()
+    for batch in event_batches([dict(zip(EXPORT_FIELDS, book)) for book in books]):
+        enqueue_event("book_batch_updated", batch)
+        report["events"] += 1
+    db.session.commit()
+    report["imported"] += len(books)
+    report["chunks"] += 1
+
+
+def import_books(rows, chunk_size=BULK_CHUNK_SIZE):
+    """Valida e inserta las filas por lotes. Devuelve el informe del import.
+
+    Los lotes ya confirmados se quedan aunque uno posterior falle; el
+    informe trae "error" y cuántos libros se importaron hasta ese punto.
+    """
+    report = {"imported": 0, "rejected": 0, "chunks": 0, "events": 0, "errors": []}
+    rss_before = max_rss_mb()
+    start = time.perf_counter()
+    chunk = []
+    try:
+        for line, raw in rows:
+            try:
+                chunk.append(validate_row(raw))
+            except RowError as e:
+                report["rejected"] += 1
+                if len(report["errors"]) < BULK_MAX_ERRORS:
+                    report["errors"].append({"line": line, "error": str(e)})
+                continue
+            if len(chunk) >= chunk_size:
+                _insert_chunk(chunk, report)
+                chunk = []
+        if chunk:
+            _insert_chunk(chunk, report)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        report["error"] = f"Error de base de datos: {e.__class__.__name__}"
+        print(f"[Purchase Service] ❌ Import masivo interrumpido tras {report['imported']} libros: {e}")
+
+    elapsed = time.perf_counter() - start
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["imported"] / elapsed, 1) if elapsed else None
+    report["max_rss_mb"] = max_rss_mb()
+    report["max_rss_growth_mb"] = round(report["max_rss_mb"] - rss_before, 1)
+    return report
+
+
+def export_books(fmt, chunk_size=BULK_EXPORT_CHUNK):
+    """Genera la tabla book en NDJSON o CSV, un bloque de filas cada vez."""
+    result = db.session.execute(
+        select(*EXPORT_COLUMNS).order_by(Book.id).execution_options(yield_per=chunk_size)
+    )
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for rows in result.partitions():
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+    for rows in result.partitions():
+        yield "".join(json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n" for row in rows)
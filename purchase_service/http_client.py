@@ -0,0 +1,226 @@
+import asyncio, os, random, threading, time
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# ------------------------------------------------------
+# Cliente HTTP entre servicios
+# ------------------------------------------------------
+# Una requests.Session por servicio de destino, con un pool de conexiones
+# keep-alive compartido por todos los hilos del worker. Cada llamada tiene
+# un plazo total (deadline) que incluye los reintentos; los errores de red,
+# timeouts y respuestas 502/503/504 se reintentan con backoff exponencial y
+# jitter mientras quede plazo. Un circuit breaker por destino corta las
+# llamadas tras HTTP_BREAKER_FAILURES fallos seguidos: durante
+# HTTP_BREAKER_RESET_SECONDS se falla al instante (CircuitOpen) y después
+# se deja pasar una sola llamada de prueba (half-open) antes de cerrarlo.
+# El modo asíncrono (async_app.py) usa el mismo breaker y política con su
+# cliente httpx (arequest).
+
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", os.getenv("WEB_THREADS", "8")))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "2"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "0.5"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.05"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "0.5"))
+HTTP_BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", "5"))
+HTTP_BREAKER_RESET_SECONDS = float(os.getenv("HTTP_BREAKER_RESET_SECONDS", "10"))
+RETRY_STATUSES = (502, 503, 504)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ServiceUnavailable(Exception):
+    """El servicio de destino no respondió a tiempo o devolvió un error de servidor."""
+
+
+class CircuitOpen(ServiceUnavailable):
+    """El breaker está abierto: la llamada no se intenta."""
+
+
+class CircuitBreaker:
+    """Breaker por número de fallos consecutivos (thread-safe)."""
+
+    def __init__(self, failure_threshold=HTTP_BREAKER_FAILURES,
+                 reset_seconds=HTTP_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"opens": 0, "rejected": 0}
+
+    def allow(self):
+        """True si la llamada puede intentarse (en half-open, sólo una a la vez)."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self._probing):
+                self._probing = self.state == HALF_OPEN
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.stats["opens"] += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """La llamada terminó sin resultado (p. ej. cancelada): libera la prueba en curso."""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self):
+        with self._lock:
+            return {"open": self.state == OPEN, "half_open": self.state == HALF_OPEN,
+                    "consecutive_failures": self._failures, **self.stats}
+
+
+class ServiceClient:
+    """Cliente HTTP hacia un servicio: pool keep-alive, deadline, reintentos y breaker."""
+
+    def __init__(self, name, pool_maxsize=HTTP_POOL_MAXSIZE, timeout=HTTP_TIMEOUT,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, retries=HTTP_RETRIES,
+                 backoff_base=HTTP_BACKOFF_BASE, backoff_max=HTTP_BACKOFF_MAX, breaker=None):
+        self.name = name
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.pool_maxsize = pool_maxsize
+        # Los reintentos los gestiona request() (con plazo y breaker), no urllib3
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "timeouts": 0}
+
+    # --------------------------------------------------
+    # API pública
+    # --------------------------------------------------
+    def request(self, method, url, deadline=None, **kwargs):
+        """Hace la llamada con reintentos dentro del plazo (segundos; por defecto timeout).
+
+        Devuelve la respuesta (también 4xx); lanza CircuitOpen o ServiceUnavailable.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen(f"{self.name}: circuito abierto")
+        expires = time.monotonic() + (deadline or self.timeout)
+        attempt = 0
+        while True:
+            remaining = expires - time.monotonic()
+            try:
+                self._count("requests")
+                resp = self.session.request(method, url, timeout=(min(self.connect_timeout, remaining),
+                                                                  remaining), **kwargs)
+                error = None if resp.status_code not in RETRY_STATUSES else \
+                    ServiceUnavailable(f"{self.name}: HTTP {resp.status_code}")
+            except requests.Timeout as e:
+                self._count("timeouts")
+                error = ServiceUnavailable(f"{self.name}: sin respuesta en el plazo ({e})")
+            except requests.RequestException as e:
+                error = ServiceUnavailable(f"{self.name}: {e}")
+            except BaseException:
+                self.breaker.release()
+                raise
+            if error is None:
+                self.breaker.record_success()
+                return resp
+            delay = self._backoff(attempt, expires)
+            if delay is None:
+                self._fail()
+                raise error
+            time.sleep(delay)
+            attempt += 1
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    async def arequest(self, http, method, url, deadline=None, **kwargs):
+        """Como request() pero con un httpx.AsyncClient (modo asíncrono)."""
+        if not self.breaker.allow():
+            raise CircuitOpen(f"{self.name}: circuito abierto")
+        expires = time.monotonic() + (deadline or self.timeout)
+        attempt = 0
+        while True:
+            remaining = expires - time.monotonic()
+            try:
+                self._count("requests")
+                resp = await http.request(method, url, timeout=httpx.Timeout(
+                    remaining, connect=min(self.connect_timeout, remaining)), **kwargs)
+                error = None if resp.status_code not in RETRY_STATUSES else \
+                    ServiceUnavailable(f"{self.name}: HTTP {resp.status_code}")
+            except httpx.TimeoutException as e:
+                self._count("timeouts")
+                error = ServiceUnavailable(f"{self.name}: sin respuesta en el plazo ({e})")
+            except httpx.TransportError as e:
+                error = ServiceUnavailable(f"{self.name}: {e}")
+            except BaseException:
+                self.breaker.release()
+                raise
+            if error is None:
+                self.breaker.record_success()
+                return resp
+            delay = self._backoff(attempt, expires)
+            if delay is None:
+                self._fail()
+                raise error
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        """Contadores, estado del breaker y del pool de conexiones (para /metrics)."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(self.breaker.snapshot())
+        # RecentlyUsedContainer no se puede iterar (urllib3 2.x); keys() copia bajo su lock
+        container = self._adapter.poolmanager.pools if self._adapter.poolmanager else {}
+        pools = [pool for pool in map(container.get, container.keys()) if pool is not None]
+        stats.update(
+            pool_maxsize=self.pool_maxsize,
+            pool_hosts=len(pools),
+            pool_connections_opened=sum(pool.num_connections for pool in pools),
+            # Huecos del pool tomados ahora mismo por una petición en curso
+            pool_in_use=sum(pool.pool.maxsize - pool.pool.qsize() for pool in pools
+                            if pool.pool is not None),
+        )
+        return stats
+
+    # --------------------------------------------------
+    # Internos
+    # --------------------------------------------------
+    def _backoff(self, attempt, expires):
+        """Espera antes del siguiente intento (jitter completo), o None si no hay que reintentar."""
+        if attempt >= self.retries:
+            return None
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        # Sin plazo para esperar y hacer otro intento útil: mejor fallar ya
+        if time.monotonic() + delay + self.connect_timeout >= expires:
+            return None
+        self._count("retries")
+        return delay
+
+    def _fail(self):
+        self._count("failures")
+        self.breaker.record_failure()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
@@ -1,3 +1,4 @@
 from flask_sqlalchemy import SQLAlchemy
+from routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
\ No newline at end of file
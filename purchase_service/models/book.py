@@ -7,4 +7,6 @@ class Book(db.Model):
     author = db.Column(db.String(100))
     description = db.Column(db.Text)
     price = db.Column(db.Float)
-    stock = db.Column(db.Integer)
\ No newline at end of file
+    stock = db.Column(db.Integer)
+    # Libros creados juntos por POST /books/bulk comparten import_id (un lote)
+    import_id = db.Column(db.String(32), index=True)
\ No newline at end of file
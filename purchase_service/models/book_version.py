@@ -0,0 +1,6 @@
+from models import db
+class BookVersion(db.Model):
+    __tablename__ = 'book_version'
+    # Una sola fila (id=1) que el relay del outbox incrementa con cada lote de eventos de libros
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
@@ -4,4 +4,9 @@ class DeliveryProvider(db.Model):
     __tablename__ = "delivery_provider"
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100))
-    contact = db.Column(db.String(100))
\ No newline at end of file
+    contact = db.Column(db.String(100))
+    # Entregas activas (Assigned) que admite a la vez
+    capacity = db.Column(db.Integer, default=50)
+    # Peso relativo en el reparto automático
+    weight = db.Column(db.Integer, default=1)
+    active = db.Column(db.Boolean, default=True)
\ No newline at end of file
@@ -1,10 +1,13 @@
+import datetime
 from models import db
 
 class DeliveryAssignment(db.Model):
     __tablename__ = "delivery_assignment"
     id = db.Column(db.Integer, primary_key=True)
-    purchase_id = db.Column(db.Integer, db.ForeignKey('purchase.id'))
-    provider_id = db.Column(db.Integer, db.ForeignKey('delivery_provider.id'))
-    status = db.Column(db.String(50), default="Pending")
-    purchase = db.relationship("Purchase", backref=db.backref("delivery", lazy=True))
-    provider = db.relationship("DeliveryProvider", backref=db.backref("assignments", lazy=True))
+    purchase_id = db.Column(db.Integer, db.ForeignKey('purchase.id'), index=True)
+    provider_id = db.Column(db.Integer, db.ForeignKey('delivery_provider.id'), index=True)
+    status = db.Column(db.String(50), default="Pending", index=True)
+    assigned_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+    # Compra y proveedor se cargan en el mismo SELECT (JOIN) para evitar consultas por fila
+    purchase = db.relationship("Purchase", lazy="joined", backref=db.backref("delivery", lazy=True))
+    provider = db.relationship("DeliveryProvider", lazy="joined", backref=db.backref("assignments", lazy=True))
@@ -0,0 +1,18 @@
+import datetime
+from models import db
+
+class OutboxEvent(db.Model):
+    __tablename__ = "outbox_event"
+    # El id autoincremental es la secuencia del evento: crece por libro y globalmente
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, index=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    # Contexto de traza de la petición que generó el evento (si se muestreó) y
+    # momento exacto del registro, para medir la latencia hasta el catálogo
+    trace_parent = db.Column(db.String(55))
+    enqueued_at = db.Column(db.Float)
+    # Reserva del relay que publica el evento (ver outbox.OutboxRelay.claim)
+    claimed_at = db.Column(db.Float, index=True)
+    claimed_by = db.Column(db.String(64))
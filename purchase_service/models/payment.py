@@ -1,10 +1,20 @@
+import datetime
 from models import db
 
 class Payment(db.Model):
     __tablename__ = "payment"
     id = db.Column(db.Integer, primary_key=True)
-    purchase_id = db.Column(db.Integer, db.ForeignKey('purchase.id'))
+    purchase_id = db.Column(db.Integer, db.ForeignKey('purchase.id'), index=True)
     amount = db.Column(db.Float)
     payment_method = db.Column(db.String(50))
-    payment_status = db.Column(db.String(50))
-    purchase = db.relationship("Purchase", backref=db.backref("payments", lazy=True))
\ No newline at end of file
+    payment_status = db.Column(db.String(50), index=True)
+    # Clave enviada por el cliente (Idempotency-Key): un reenvío nunca crea otro cobro
+    idempotency_key = db.Column(db.String(64), unique=True)
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, index=True)
+    gateway_reference = db.Column(db.String(100))
+    error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    # La compra se carga en el mismo SELECT (JOIN) para evitar consultas por fila
+    purchase = db.relationship("Purchase", lazy="joined", backref=db.backref("payments", lazy=True))
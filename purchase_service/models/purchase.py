@@ -3,8 +3,12 @@ from models import db
 class Purchase(db.Model):
     __tablename__ = "purchase"
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey('book.id'))
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), index=True)
     quantity = db.Column(db.Integer, default=1)
     total_price = db.Column(db.Float)
-    status = db.Column(db.String(50), default="Pending")
\ No newline at end of file
+    status = db.Column(db.String(50), default="Pending", index=True)
+    # Hasta cuándo se mantiene reservado el stock si no llega el pago
+    reserved_until = db.Column(db.DateTime, index=True)
+    # Compras creadas juntas desde POST /purchases/batch comparten cart_id
+    cart_id = db.Column(db.String(32), index=True)
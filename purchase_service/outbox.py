@@ -0,0 +1,262 @@
+import json, os, socket, threading, time
+from sqlalchemy import delete, event, or_, select, update
+from sqlalchemy.orm import Session
+from models import db
+from metrics import metrics
+from tracing import tracer
+from models.outbox import OutboxEvent
+from models.book_version import BookVersion
+
+# ------------------------------------------------------
+# Outbox transaccional de eventos
+# ------------------------------------------------------
+# Los endpoints escriben el evento en la tabla outbox_event dentro de la
+# misma transacción que el cambio en Book/Purchase. Un hilo relay reserva
+# un lote en orden de id (claimed_at/claimed_by, FOR UPDATE SKIP LOCKED) en
+# una transacción corta, lo publica en bloque hacia book_updates sin
+# transacción abierta y borra las filas confirmadas por el broker en otra
+# (entrega al-menos-una-vez). Cada worker y réplica tiene su relay, pero un
+# evento de libro sólo se reserva cuando todos los anteriores del mismo
+# libro están en su lote o ya se borraron: los eventos de un libro salen en
+# orden de seq (el id del evento) aunque otro relay tenga un lote en vuelo
+# o uno fallido se reintente.
+# Al reservar un lote con eventos de libros se incrementa BookVersion, la
+# versión compartida por todos los workers para los ETag de GET /books. Los eventos
+# cuyo tipo empieza por un prefijo de "routes" (p. ej. payment_) van a su
+# propio publicador en lugar de book_updates. En el modo asíncrono
+# (async_app.py) el mismo claim/complete corre como tarea de asyncio.
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))
+# Un lote reservado por un relay que no lo confirmó ni lo liberó en este
+# tiempo (worker caído) vuelve a estar disponible; mayor que el plazo de publicación
+OUTBOX_CLAIM_TIMEOUT = float(os.getenv("OUTBOX_CLAIM_TIMEOUT", "60"))
+BOOK_EVENT_PREFIX = "book_"
+HOSTNAME = socket.gethostname()
+
+metrics.counter("outbox_events_total", "Eventos registrados en el outbox por tipo")
+metrics.histogram("outbox_relay_lag_seconds", "Antigüedad del evento más viejo de cada lote publicado")
+metrics.histogram("rabbitmq_publish_duration_seconds",
+                  "Publicación de un lote del outbox hasta la confirmación del broker")
+
+
+def enqueue_event(event_type, payload, book_event=True, session=None):
+    """Registra un evento en la sesión actual; se publica al hacer commit.
+
+    book_event=False para eventos que no describen libros (no invalidan cachés).
+    session permite usar otra sesión que db.session (p. ej. la de AsyncSession.run_sync).
+    """
+    if session is None:
+        session = db.session
+    session.add(OutboxEvent(
+        # Los eventos por lotes (lista de libros) no pertenecen a un solo libro
+        book_id=payload.get("id") if book_event and isinstance(payload, dict) else None,
+        event_type=event_type,
+        payload=json.dumps(payload),
+        trace_parent=tracer.traceparent(),
+        enqueued_at=time.time(),
+    ))
+    session.info["outbox_pending"] = True
+    metrics.inc("outbox_events_total", event=event_type)
+    if not book_event:
+        return
+    # Libros afectados, para invalidar cachés locales tras el commit
+    items = payload if isinstance(payload, list) else [payload]
+    session.info.setdefault("outbox_book_ids", set()).update(
+        item["id"] for item in items if item.get("id") is not None)
+
+
+def event_book_ids(row):
+    """Libros a los que se refiere una fila del outbox (varios en un evento por lotes)."""
+    if row.book_id is not None:
+        return {row.book_id}
+    payload = json.loads(row.payload)
+    items = payload if isinstance(payload, list) else [payload]
+    return {item.get("id") for item in items if isinstance(item, dict)} - {None}
+
+
+class OutboxRelay:
+    """Hilo que drena la tabla outbox hacia RabbitMQ."""
+
+    def __init__(self, app, publisher, batch_size=OUTBOX_BATCH_SIZE,
+                 poll_interval=OUTBOX_POLL_INTERVAL, routes=None,
+                 claim_timeout=OUTBOX_CLAIM_TIMEOUT):
+        self.app = app
+        self.publisher = publisher
+        # {prefijo de event_type: publicador}
+        self.routes = routes or {}
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.stats = {"relayed": 0, "batches": 0, "errors": 0}
+        event.listen(Session, "after_commit", self._after_commit)
+
+    def _after_commit(self, session):
+        # Despertar al relay en cuanto un commit de este proceso deja eventos
+        if session.info.pop("outbox_pending", False):
+            self._wakeup.set()
+
+    def detach(self):
+        """Deja de escuchar los commits (otro relay drena la tabla en este proceso)."""
+        event.remove(Session, "after_commit", self._after_commit)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="outbox-relay")
+        self._thread.start()
+
+    def drain_once(self):
+        """Publica un lote de eventos pendientes. Devuelve cuántos publicó."""
+        claimed, batches = self.claim(db.session)
+        if not claimed:
+            return 0
+        # Sin transacción abierta mientras se espera al broker
+        try:
+            for publisher, messages in batches.items():
+                with metrics.timed("rabbitmq_publish_duration_seconds",
+                                   target=publisher.queue_name or publisher.fanout_exchange):
+                    publisher.publish_many(messages)
+        except Exception:
+            db.session.rollback()
+            self.release(db.session, claimed)
+            raise
+        self.complete(db.session, claimed)
+        return len(claimed)
+
+    @property
+    def owner(self):
+        """Identidad de este relay en claimed_by (host y pid del worker)."""
+        return f"{HOSTNAME}:{os.getpid()}"
+
+    def claim(self, session):
+        """Reserva el siguiente lote en una transacción corta y lo agrupa por publicador.
+
+        Marca las filas con claimed_at/claimed_by y confirma antes de volver;
+        devuelve ([(id, event_type, trace_parent, enqueued_at)], {publicador: mensajes}).
+        """
+        now = time.time()
+        # SKIP LOCKED: los relays de otras réplicas toman el lote siguiente sin esperar
+        rows = session.execute(
+            select(OutboxEvent)
+            .where(or_(OutboxEvent.claimed_at.is_(None),
+                       OutboxEvent.claimed_at < now - self.claim_timeout))
+            .order_by(OutboxEvent.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        rows = self._in_book_order(session, rows)
+        if not rows:
+            session.commit()
+            return [], {}
+
+        claimed = []
+        batches = {}
+        for row in rows:
+            publisher = next((p for prefix, p in self.routes.items()
+                              if row.event_type.startswith(prefix)), self.publisher)
+            message = {"event": row.event_type, "data": json.loads(row.payload), "seq": row.id}
+            # Para el consumidor: traza de origen y hora de registro (latencia de extremo a extremo)
+            if row.trace_parent:
+                message["trace"] = row.trace_parent
+            if row.enqueued_at:
+                message["ts"] = row.enqueued_at
+            batches.setdefault(publisher, []).append(message)
+            claimed.append((row.id, row.event_type, row.trace_parent, row.enqueued_at))
+        if rows[0].enqueued_at:
+            metrics.observe("outbox_relay_lag_seconds", now - rows[0].enqueued_at)
+
+        session.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_([seq for seq, *_ in claimed]))
+            .values(claimed_at=now, claimed_by=self.owner)
+            .execution_options(synchronize_session=False)
+        )
+        # Los cambios del lote ya están confirmados: las respuestas cacheadas de libros caducan
+        if any(event_type.startswith(BOOK_EVENT_PREFIX) for _, event_type, *_ in claimed):
+            session.execute(
+                update(BookVersion)
+                .where(BookVersion.id == 1)
+                .values(version=BookVersion.version + 1)
+            )
+        session.commit()
+        return claimed, batches
+
+    def _in_book_order(self, session, rows):
+        """Deja en el lote sólo los eventos que no adelantan a otro anterior de su libro.
+
+        Los eventos más antiguos que siguen en la tabla fuera del lote (reservados
+        o bloqueados por otro relay) frenan los siguientes de su libro; uno por
+        lotes (book_id NULL) ajeno frena todos los eventos de libros posteriores.
+        """
+        if not rows:
+            return rows
+        candidates = {row.id: row for row in rows}
+        # Lectura sin lock: también ve las filas que otro relay tiene bloqueadas
+        pending = session.execute(
+            select(OutboxEvent.id, OutboxEvent.book_id)
+            .where(OutboxEvent.id <= rows[-1].id,
+                   OutboxEvent.event_type.startswith(BOOK_EVENT_PREFIX, autoescape=True))
+            .order_by(OutboxEvent.id)
+        ).all()
+        blocked = set()
+        barrier = False
+        ready = set()
+        for seq, book_id in pending:
+            row = candidates.get(seq)
+            if row is None:
+                if book_id is None:
+                    barrier = True
+                else:
+                    blocked.add(book_id)
+                continue
+            books = event_book_ids(row)
+            if barrier or books & blocked:
+                blocked |= books
+            else:
+                ready.add(seq)
+        return [row for row in rows
+                if row.id in ready or not row.event_type.startswith(BOOK_EVENT_PREFIX)]
+
+    def release(self, session, claimed):
+        """La publicación falló: devuelve el lote para que cualquier relay lo reintente ya."""
+        session.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_([seq for seq, *_ in claimed]),
+                   OutboxEvent.claimed_by == self.owner)
+            .values(claimed_at=None, claimed_by=None)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+
+    def complete(self, session, claimed):
+        """Tras la confirmación del broker: borra el lote en otra transacción corta."""
+        published_at = time.time()
+        for seq, event_type, trace_parent, enqueued_at in claimed:
+            if trace_parent:
+                tracer.record("outbox.publish", trace_parent, enqueued_at or published_at,
+                              published_at, event=event_type, seq=seq)
+        session.execute(
+            delete(OutboxEvent)
+            .where(OutboxEvent.id.in_([seq for seq, *_ in claimed]))
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        self.stats["relayed"] += len(claimed)
+        self.stats["batches"] += 1
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                self._wakeup.clear()
+                try:
+                    if self.drain_once() == self.batch_size:
+                        continue
+                except Exception as e:
+                    db.session.rollback()
+                    self.stats["errors"] += 1
+                    print(f"[Purchase Service] ❌ Error en el relay del outbox: {e}")
+                    time.sleep(self.poll_interval)
+                finally:
+                    db.session.remove()
+                self._wakeup.wait(self.poll_interval)
@@ -0,0 +1,34 @@
+import os
+
+# ------------------------------------------------------
+# Particiones de la cola book_updates
+# ------------------------------------------------------
+# Con BOOK_UPDATES_PARTITIONS > 1 los eventos de un libro van siempre a la
+# cola book_updates.{id % P}. Cada partición tiene un único consumidor
+# activo (x-single-active-consumer), así que los eventos de un mismo libro
+# se aplican en orden aunque haya varios procesos consumiendo. Publicador
+# y consumidor deben usar el mismo número de particiones.
+
+BOOK_UPDATES_QUEUE = "book_updates"
+BOOK_UPDATES_PARTITIONS = int(os.getenv("BOOK_UPDATES_PARTITIONS", "1"))
+
+
+def partition_of(book_id, partitions=BOOK_UPDATES_PARTITIONS):
+    """Partición de un libro (los eventos sin id van a la 0)."""
+    if partitions <= 1 or book_id is None:
+        return 0
+    return int(book_id) % partitions
+
+
+def queue_for(partition, partitions=BOOK_UPDATES_PARTITIONS, base=BOOK_UPDATES_QUEUE):
+    """Nombre de la cola de una partición (la cola original si no hay particiones)."""
+    return base if partitions <= 1 else f"{base}.{partition}"
+
+
+def all_queues(partitions=BOOK_UPDATES_PARTITIONS, base=BOOK_UPDATES_QUEUE):
+    return [queue_for(p, partitions, base) for p in range(max(partitions, 1))]
+
+
+def queue_arguments(partitions=BOOK_UPDATES_PARTITIONS):
+    """Argumentos de queue_declare; deben coincidir en publicador y consumidor."""
+    return {"x-single-active-consumer": True} if partitions > 1 else None
@@ -0,0 +1,348 @@
+import datetime, importlib, os, random, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, update
+from models import db
+from models.payment import Payment
+from models.purchase import Purchase
+from outbox import enqueue_event
+from stock import PENDING_PAYMENT, EXPIRED
+
+# ------------------------------------------------------
+# Procesamiento asíncrono de pagos
+# ------------------------------------------------------
+# POST /payment sólo registra el pago (Pending) con su clave de
+# idempotencia y pasa la compra a "Payment Processing" en la misma
+# transacción, de modo que el barrido de reservas no la expira mientras
+# se cobra. Un pool de hilos por proceso llama a la pasarela fuera de
+# cualquier transacción y después, en un único commit:
+#   - cobro aceptado: pago Completed + compra Paid;
+#   - cobro rechazado o sin más reintentos: pago Failed + compra de vuelta
+#     a Pending Payment (puede reintentarse con otra clave);
+#   - error transitorio: el pago vuelve a Pending con next_attempt_at.
+# La pasarela recibe la clave de idempotencia, así que repetir un cobro
+# cuyo resultado se perdió no cobra dos veces. El resultado se consulta en
+# GET /payment/<id> o se recibe en el exchange fanout payment_events.
+
+PAYMENT_GATEWAY = os.getenv("PAYMENT_GATEWAY", "fake")  # fake | modulo:Clase
+PAYMENT_WORKERS = int(os.getenv("PAYMENT_WORKERS", "8"))
+PAYMENT_MAX_ATTEMPTS = int(os.getenv("PAYMENT_MAX_ATTEMPTS", "5"))
+PAYMENT_RETRY_BASE_SECONDS = float(os.getenv("PAYMENT_RETRY_BASE_SECONDS", "2"))
+PAYMENT_POLL_INTERVAL = float(os.getenv("PAYMENT_POLL_INTERVAL", "5"))
+PAYMENT_STUCK_SECONDS = float(os.getenv("PAYMENT_STUCK_SECONDS", "120"))
+PAYMENT_EVENTS_EXCHANGE = "payment_events"
+
+PAYMENT_PENDING = "Pending"
+PAYMENT_PROCESSING = "Processing"
+PAYMENT_COMPLETED = "Completed"
+PAYMENT_FAILED = "Failed"
+PURCHASE_PAYMENT_PROCESSING = "Payment Processing"
+PURCHASE_PAID = "Paid"
+
+
+class PaymentRejected(Exception):
+    """El pago no puede aceptarse; status_code es la respuesta HTTP."""
+
+    def __init__(self, message, status_code, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        # Segundos para la cabecera Retry-After (el cliente puede reintentar)
+        self.retry_after = retry_after
+
+
+class GatewayDeclined(Exception):
+    """La pasarela rechazó el cobro (no tiene sentido reintentar)."""
+
+
+class GatewayError(Exception):
+    """Fallo transitorio de la pasarela (timeout, 5xx...)."""
+
+
+class FakeGateway:
+    """Pasarela local para desarrollo y pruebas de carga.
+
+    El método de pago "fake_decline" siempre se rechaza; el resto falla
+    al azar según decline_rate / failure_rate.
+    """
+
+    def __init__(self, latency_ms=None, failure_rate=None, decline_rate=None):
+        self.latency = float(latency_ms if latency_ms is not None
+                             else os.getenv("FAKE_GATEWAY_LATENCY_MS", "200")) / 1000.0
+        self.failure_rate = float(failure_rate if failure_rate is not None
+                                  else os.getenv("FAKE_GATEWAY_FAILURE_RATE", "0"))
+        self.decline_rate = float(decline_rate if decline_rate is not None
+                                  else os.getenv("FAKE_GATEWAY_DECLINE_RATE", "0"))
+        self._charges = {}
+        self._lock = threading.Lock()
+
+    def charge(self, idempotency_key, amount, method):
+        time.sleep(self.latency)
+        with self._lock:
+            if idempotency_key in self._charges:
+                return self._charges[idempotency_key]
+        roll = random.random()
+        if method == "fake_decline" or roll < self.decline_rate:
+            raise GatewayDeclined("cobro rechazado por el emisor")
+        if roll < self.decline_rate + self.failure_rate:
+            raise GatewayError("la pasarela no respondió")
+        reference = f"fake_{uuid.uuid4().hex[:16]}"
+        with self._lock:
+            self._charges[idempotency_key] = reference
+        return reference
+
+
+def load_gateway(spec=PAYMENT_GATEWAY):
+    """Instancia la pasarela configurada: "fake" o "paquete.modulo:Clase"."""
+    if spec == "fake":
+        return FakeGateway()
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def accept_payment(purchase_id, amount, method, idempotency_key):
+    """Registra un pago pendiente en la sesión actual (sin commit ni cobro).
+
+    Devuelve (pago, creado). Un reenvío con la misma clave, o un pago para
+    una compra que ya tiene uno en curso o completado, devuelve el existente.
+    """
+    existing = Payment.query.filter_by(idempotency_key=idempotency_key).first()
+    if existing is not None:
+        _check_replay(existing, purchase_id, amount)
+        return existing, False
+
+    # El lock de la compra serializa pagos concurrentes con distinta clave
+    purchase = db.session.execute(
+        select(Purchase).where(Purchase.id == purchase_id).with_for_update()
+    ).scalar_one_or_none()
+    if purchase is None:
+        raise PaymentRejected("Compra no encontrada", 404)
+    active = Payment.query.filter(
+        Payment.purchase_id == purchase_id,
+        Payment.payment_status.in_([PAYMENT_PENDING, PAYMENT_PROCESSING, PAYMENT_COMPLETED]),
+    ).first()
+    if active is not None:
+        return active, False
+
+    now = datetime.datetime.utcnow()
+    if purchase.status == EXPIRED or (purchase.status == PENDING_PAYMENT and
+                                      purchase.reserved_until and purchase.reserved_until < now):
+        raise PaymentRejected("La reserva de la compra venció, el stock fue liberado", 409)
+    # "Pending" es el estado de las compras anteriores a la reserva de stock
+    if purchase.status not in (PENDING_PAYMENT, "Pending"):
+        raise PaymentRejected(f"La compra está en estado {purchase.status}", 409)
+    if purchase.total_price is not None and abs(purchase.total_price - amount) > 0.005:
+        raise PaymentRejected("El monto no coincide con el total de la compra", 400)
+
+    purchase.status = PURCHASE_PAYMENT_PROCESSING
+    payment = Payment(
+        purchase_id=purchase_id, amount=amount, payment_method=method,
+        payment_status=PAYMENT_PENDING, idempotency_key=idempotency_key, attempts=0,
+        # El poller sólo lo toma si el pool de este proceso no lo hizo antes
+        next_attempt_at=now + datetime.timedelta(seconds=PAYMENT_STUCK_SECONDS),
+        created_at=now, updated_at=now,
+    )
+    db.session.add(payment)
+    db.session.flush()
+    return payment, True
+
+
+def replayed_payment(purchase_id, amount, idempotency_key):
+    """El pago registrado por la petición concurrente con la misma clave.
+
+    Para cuando el INSERT choca con el índice único de idempotency_key.
+    """
+    existing = Payment.query.filter_by(idempotency_key=idempotency_key).first()
+    if existing is None:
+        # La otra petición aún no confirmó (o se deshizo): que el cliente reintente
+        raise PaymentRejected("Hay un pago en curso con la misma Idempotency-Key", 409, retry_after=1)
+    _check_replay(existing, purchase_id, amount)
+    return existing
+
+
+def _check_replay(existing, purchase_id, amount):
+    if existing.purchase_id != purchase_id or abs(existing.amount - amount) > 0.005:
+        raise PaymentRejected("Idempotency-Key ya usada con otros datos", 422)
+
+
+def payment_dict(payment):
+    return {
+        "payment_id": payment.id, "purchase_id": payment.purchase_id,
+        "amount": payment.amount, "method": payment.payment_method,
+        "status": payment.payment_status, "attempts": payment.attempts or 0,
+        "gateway_reference": payment.gateway_reference, "error": payment.error,
+        "purchase_status": payment.purchase.status if payment.purchase else None,
+    }
+
+
+def _payment_event(payment, purchase_status):
+    event_type = "payment_completed" if payment.payment_status == PAYMENT_COMPLETED else "payment_failed"
+    enqueue_event(event_type, {
+        "id": payment.id, "purchase_id": payment.purchase_id, "amount": payment.amount,
+        "status": payment.payment_status, "purchase_status": purchase_status,
+        "error": payment.error,
+    }, book_event=False)
+
+
+def _finish(payment_id, status, error=None, reference=None):
+    """Cierra el pago y actualiza la compra en la transacción actual.
+
+    Sólo cierra un pago que sigue en Processing: si otro worker ya lo cerró
+    (p. ej. tras recuperarlo por atascado) no hace nada y devuelve False.
+    """
+    now = datetime.datetime.utcnow()
+    result = db.session.execute(
+        update(Payment)
+        .where(Payment.id == payment_id, Payment.payment_status == PAYMENT_PROCESSING)
+        .values(payment_status=status, error=error[:255] if error else None, gateway_reference=reference,
+                next_attempt_at=None, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    payment = db.session.get(Payment, payment_id, populate_existing=True)
+    purchase_status = PURCHASE_PAID if status == PAYMENT_COMPLETED else PENDING_PAYMENT
+    db.session.execute(
+        update(Purchase)
+        .where(Purchase.id == payment.purchase_id, Purchase.status == PURCHASE_PAYMENT_PROCESSING)
+        .values(status=purchase_status)
+        .execution_options(synchronize_session=False)
+    )
+    _payment_event(payment, purchase_status)
+    return True
+
+
+class PaymentProcessor:
+    """Pool de hilos que cobra los pagos pendientes."""
+
+    def __init__(self, app, gateway=None, workers=PAYMENT_WORKERS,
+                 max_attempts=PAYMENT_MAX_ATTEMPTS, poll_interval=PAYMENT_POLL_INTERVAL):
+        self.app = app
+        self.gateway = gateway or load_gateway()
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {"completed": 0, "declined": 0, "retried": 0, "failed": 0, "recovered": 0}
+
+    def _pool(self):
+        # Un pool por proceso (los hilos no sobreviven al fork de gunicorn)
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix="payment")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, payment_id):
+        """Encola el cobro; debe llamarse después del commit que creó el pago."""
+        self._pool().submit(self._process, payment_id)
+
+    # --------------------------------------------------
+    # Cobro de un pago
+    # --------------------------------------------------
+    def _claim(self, payment_id):
+        """Pasa el pago a Processing si nadie lo tomó antes."""
+        result = db.session.execute(
+            update(Payment)
+            .where(Payment.id == payment_id, Payment.payment_status == PAYMENT_PENDING)
+            .values(payment_status=PAYMENT_PROCESSING, attempts=Payment.attempts + 1,
+                    updated_at=datetime.datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount != 1:
+            return None
+        return db.session.get(Payment, payment_id)
+
+    def _process(self, payment_id):
+        with self.app.app_context():
+            try:
+                payment = self._claim(payment_id)
+                if payment is None:
+                    return
+                key, amount, method = payment.idempotency_key, payment.amount, payment.payment_method
+                attempts = payment.attempts
+                # La sesión no retiene conexión ni locks mientras se espera a la pasarela
+                db.session.commit()
+                try:
+                    reference = self.gateway.charge(key, amount, method)
+                except GatewayDeclined as e:
+                    if self._record(payment_id, PAYMENT_FAILED, error=str(e)):
+                        self.stats["declined"] += 1
+                except Exception as e:
+                    self._retry_or_fail(payment_id, attempts, str(e))
+                else:
+                    if self._record(payment_id, PAYMENT_COMPLETED, reference=reference):
+                        self.stats["completed"] += 1
+            except Exception as e:
+                db.session.rollback()
+                print(f"[Purchase Service] ❌ Error procesando el pago {payment_id}: {e}")
+            finally:
+                db.session.remove()
+
+    def _record(self, payment_id, status, error=None, reference=None):
+        """Guarda el resultado del cobro. False si el pago ya no estaba en Processing."""
+        recorded = _finish(payment_id, status, error=error, reference=reference)
+        db.session.commit()
+        return recorded
+
+    def _retry_or_fail(self, payment_id, attempts, error):
+        if attempts >= self.max_attempts:
+            if self._record(payment_id, PAYMENT_FAILED, error=f"sin respuesta de la pasarela: {error}"):
+                self.stats["failed"] += 1
+            return
+        delay = PAYMENT_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        db.session.execute(
+            update(Payment)
+            .where(Payment.id == payment_id, Payment.payment_status == PAYMENT_PROCESSING)
+            .values(payment_status=PAYMENT_PENDING, error=error[:255],
+                    next_attempt_at=datetime.datetime.utcnow() + datetime.timedelta(seconds=delay))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        self.stats["retried"] += 1
+
+    # --------------------------------------------------
+    # Reintentos y recuperación (un solo proceso por contenedor)
+    # --------------------------------------------------
+    def poll_once(self):
+        """Encola los pagos cuyo reintento venció y recupera los atascados."""
+        now = datetime.datetime.utcnow()
+        # Un pago en Processing demasiado tiempo perdió su worker (reinicio);
+        # repetir el cobro es seguro gracias a la clave de idempotencia
+        stuck = db.session.execute(
+            update(Payment)
+            .where(Payment.payment_status == PAYMENT_PROCESSING,
+                   Payment.updated_at < now - datetime.timedelta(seconds=PAYMENT_STUCK_SECONDS))
+            .values(payment_status=PAYMENT_PENDING, next_attempt_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.stats["recovered"] += stuck
+        due = db.session.execute(
+            select(Payment.id)
+            .where(Payment.payment_status == PAYMENT_PENDING,
+                   (Payment.next_attempt_at.is_(None)) | (Payment.next_attempt_at <= now))
+            .order_by(Payment.id)
+            .limit(500)
+        ).scalars().all()
+        db.session.commit()
+        for payment_id in due:
+            self.submit(payment_id)
+        return len(due)
+
+    def start_polling(self):
+        threading.Thread(target=self._poll_forever, daemon=True, name="payment-poller").start()
+
+    def _poll_forever(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"[Purchase Service] ❌ Error revisando pagos pendientes: {e}")
+                finally:
+                    db.session.remove()
+                time.sleep(self.poll_interval)
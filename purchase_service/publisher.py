@@ -0,0 +1,249 @@
+import json, os, queue, threading, time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeout
+import pika
+from partitions import (BOOK_UPDATES_PARTITIONS, all_queues, partition_of,
+                        queue_arguments, queue_for)
+
+# ------------------------------------------------------
+# Publicador persistente de eventos hacia RabbitMQ
+# ------------------------------------------------------
+# Una sola conexión/canal por proceso, propiedad de un hilo de E/S.
+# Los hilos de las peticiones sólo encolan mensajes; el hilo de E/S los
+# agrupa (hasta PUBLISH_BATCH_SIZE mensajes o PUBLISH_LINGER_MS) en un
+# único mensaje AMQP con confirmación del broker y reconecta si se cae.
+# Con varias particiones, cada lote se reparte por id de libro entre las
+# colas book_updates.{id % P} (ver partitions.py).
+
+PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", "200"))
+PUBLISH_LINGER_MS = float(os.getenv("PUBLISH_LINGER_MS", "5"))
+PUBLISH_MAX_PENDING = int(os.getenv("PUBLISH_MAX_PENDING", "10000"))
+RABBITMQ_HEARTBEAT = int(os.getenv("RABBITMQ_HEARTBEAT", "30"))
+
+
+class PublisherOverloaded(Exception):
+    """La cola local de mensajes pendientes está llena."""
+
+
+def encode_batch(messages):
+    """Un mensaje se envía tal cual; varios, dentro de un sobre "batch"."""
+    if len(messages) == 1:
+        return json.dumps(messages[0])
+    return json.dumps({"event": "batch", "events": messages})
+
+
+class BookEventPublisher:
+    """Publica eventos de libros en una cola de RabbitMQ reutilizando la conexión."""
+
+    def __init__(self, host, queue_name="book_updates", fanout_exchange=None,
+                 batch_size=PUBLISH_BATCH_SIZE, linger_ms=PUBLISH_LINGER_MS,
+                 max_pending=PUBLISH_MAX_PENDING, heartbeat=RABBITMQ_HEARTBEAT,
+                 partitions=BOOK_UPDATES_PARTITIONS):
+        self.host = host
+        self.queue_name = queue_name
+        self.partitions = partitions
+        # Exchange fanout opcional donde se replica cada lote (p. ej. book_events).
+        # Con queue_name=None sólo se publica en el exchange (p. ej. payment_events)
+        self.fanout_exchange = fanout_exchange
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000.0
+        self.max_pending = max_pending
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pending = None
+        self._thread = None
+        self._connection = None
+        self._channel = None
+        self._closing = False
+        self.stats = {"published": 0, "batches": 0, "reconnects": 0, "errors": 0, "cancelled": 0}
+
+    # --------------------------------------------------
+    # API pública
+    # --------------------------------------------------
+    def publish(self, event_type, payload):
+        """Encola un evento sin bloquear la petición. Devuelve un Future."""
+        return self._submit([{"event": event_type, "data": payload}])
+
+    def publish_many(self, messages, timeout=30):
+        """Publica varios mensajes y espera la confirmación del broker."""
+        if not messages:
+            return
+        future = self._submit(messages)
+        try:
+            future.result(timeout=timeout)
+        except FutureTimeout:
+            # El llamante (el relay del outbox) lo reintentará: que el hilo de
+            # E/S no lo publique además más tarde
+            future.cancel()
+            raise
+
+    def close(self, timeout=5):
+        """Vacía los mensajes pendientes y cierra la conexión."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._closing = True
+        self._thread.join(timeout)
+
+    # --------------------------------------------------
+    # Internos
+    # --------------------------------------------------
+    def _submit(self, messages):
+        self._ensure_started()
+        future = Future()
+        try:
+            self._pending.put_nowait((messages, future))
+        except queue.Full:
+            raise PublisherOverloaded("demasiados eventos pendientes de publicar")
+        return future
+
+    def _ensure_started(self):
+        # Tras un fork (p. ej. workers de gunicorn) el hilo no existe en el hijo
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pending = queue.Queue(maxsize=self.max_pending)
+            self._connection = None
+            self._channel = None
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name="book-event-publisher")
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _connect(self):
+        delay = 0.5
+        while True:
+            try:
+                self._connection = pika.BlockingConnection(pika.ConnectionParameters(
+                    host=self.host, heartbeat=self.heartbeat,
+                    blocked_connection_timeout=self.heartbeat))
+                self._channel = self._connection.channel()
+                for name in all_queues(self.partitions, self.queue_name) if self.queue_name else []:
+                    self._channel.queue_declare(queue=name,
+                                                arguments=queue_arguments(self.partitions))
+                if self.fanout_exchange:
+                    self._channel.exchange_declare(exchange=self.fanout_exchange,
+                                                   exchange_type="fanout")
+                self._channel.confirm_delivery()
+                return
+            except pika.exceptions.AMQPError as e:
+                print(f"[Purchase Service] ❌ RabbitMQ no disponible ({e}), reintentando en {delay}s...")
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+
+    def _disconnect(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except pika.exceptions.AMQPError:
+            pass
+        self._connection = None
+        self._channel = None
+
+    def _next_batch(self):
+        """Espera el primer mensaje y agrupa los que lleguen durante el linger."""
+        try:
+            first = self._pending.get(timeout=1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        count = len(first[0])
+        deadline = time.monotonic() + self.linger
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._pending.get(timeout=remaining) if remaining > 0 else self._pending.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            count += len(item[0])
+        return batch
+
+    def _partition(self, messages):
+        """Reparte los mensajes por partición; un lote de libros se divide por id."""
+        groups = {}
+        for msg in messages:
+            data = msg.get("data")
+            if isinstance(data, list):
+                split = {}
+                for item in data:
+                    split.setdefault(partition_of(item.get("id"), self.partitions), []).append(item)
+                for partition, items in split.items():
+                    groups.setdefault(partition, []).append(dict(msg, data=items))
+            else:
+                partition = partition_of((data or {}).get("id"), self.partitions)
+                groups.setdefault(partition, []).append(msg)
+        return groups
+
+    def _headers(self, messages):
+        headers = {"published_at": time.time()}
+        # Cada evento lleva su propia traza en "trace"; la cabecera AMQP, la del primero
+        traceparent = next((m["trace"] for m in messages if m.get("trace")), None)
+        if traceparent:
+            headers["traceparent"] = traceparent
+        return headers
+
+    def _send(self, messages):
+        properties = pika.BasicProperties(content_type="application/json", delivery_mode=2,
+                                          headers=self._headers(messages))
+        groups = self._partition(messages) if self.queue_name else {}
+        for partition, group in sorted(groups.items()):
+            self._channel.basic_publish(exchange="",
+                                        routing_key=queue_for(partition, self.partitions, self.queue_name),
+                                        body=encode_batch(group), properties=properties, mandatory=True)
+        if self.fanout_exchange:
+            self._channel.basic_publish(exchange=self.fanout_exchange, routing_key="",
+                                        body=encode_batch(messages), properties=properties)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._closing:
+                    break
+                # Mantener vivos los heartbeats mientras no hay tráfico
+                if self._connection is not None:
+                    try:
+                        self._connection.process_data_events(time_limit=0)
+                    except pika.exceptions.AMQPError:
+                        self._disconnect()
+                continue
+
+            while True:
+                if self._channel is None:
+                    self._connect()
+                # Lo que ya expiró en publish_many (p. ej. esperando la reconexión) no se envía
+                live = [item for item in batch if not item[1].cancelled()]
+                self.stats["cancelled"] += len(batch) - len(live)
+                batch = live
+                if not batch:
+                    break
+                messages = [m for item, _ in batch for m in item]
+                try:
+                    for start in range(0, len(messages), self.batch_size):
+                        self._send(messages[start:start + self.batch_size])
+                    break
+                except (pika.exceptions.UnroutableError, pika.exceptions.NackError) as e:
+                    # El broker rechazó el lote: se reintenta (entrega al-menos-una-vez)
+                    self.stats["errors"] += 1
+                    print(f"[Purchase Service] ⚠️ Publicación rechazada ({e}), reintentando...")
+                    time.sleep(0.5)
+                except pika.exceptions.AMQPError as e:
+                    self.stats["errors"] += 1
+                    self.stats["reconnects"] += 1
+                    print(f"[Purchase Service] ❌ Conexión con RabbitMQ perdida ({e}), reconectando...")
+                    self._disconnect()
+            if not batch:
+                continue
+
+            self.stats["published"] += len(messages)
+            self.stats["batches"] += 1
+            for _, future in batch:
+                try:
+                    future.set_result(True)
+                except InvalidStateError:
+                    # Cancelado justo tras el envío: el relay lo reenviará (el consumidor deduplica por seq)
+                    pass
+        self._disconnect()
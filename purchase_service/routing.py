@@ -0,0 +1,100 @@
+import os, time
+from functools import wraps
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import OperationalError
+
+# ------------------------------------------------------
+# Enrutado de lecturas a la réplica
+# ------------------------------------------------------
+# Las vistas marcadas con @read_router.read_only leen de la réplica
+# (bind "replica", ver dbconfig.DATABASE_REPLICA_URI); todo lo demás, y
+# cualquier flush, va a la primaria. Se lee de la primaria cuando:
+#   - no hay réplica configurada o falló hace menos de REPLICA_RETRY_SECONDS
+#     (la vista se repite en la primaria; son vistas de sólo lectura);
+#   - el cliente escribió hace menos de READ_YOUR_WRITES_SECONDS (cookie
+#     db_primary_until que se fija en cada respuesta a una escritura);
+#   - la petición trae "X-Consistency: strong".
+#
+# Prueba local con dos bases SQLite (la "réplica" no recibe las escrituras,
+# lo que permite ver qué lecturas se enrutaron a cada una):
+#     DATABASE_URI=sqlite:///primary.db DATABASE_REPLICA_URI=sqlite:///replica.db python app.py
+
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+PIN_COOKIE = "db_primary_until"
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class RoutingSession(Session):
+    """Sesión que usa la réplica cuando la petición actual lo permite."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and self.info.get("use_replica"):
+            replica = self._db.engines.get("replica")
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReadRouter:
+    """Decide, petición a petición, si una vista de lectura usa la réplica."""
+
+    def __init__(self, db, pin_seconds=READ_YOUR_WRITES_SECONDS,
+                 retry_seconds=REPLICA_RETRY_SECONDS):
+        self.db = db
+        self.pin_seconds = pin_seconds
+        self.retry_seconds = retry_seconds
+        self._replica_down_until = 0.0
+        self.stats = {"replica_reads": 0, "primary_reads": 0, "pinned": 0, "replica_failures": 0}
+
+    def init_app(self, app):
+        app.after_request(self._pin_after_write)
+
+    def _pin_after_write(self, response):
+        if self.pin_seconds > 0 and request.method in WRITE_METHODS and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, f"{time.time() + self.pin_seconds:.3f}",
+                                max_age=int(self.pin_seconds) + 1, httponly=True, samesite="Lax")
+        return response
+
+    def _pinned(self):
+        if request.headers.get("X-Consistency", "").lower() == "strong":
+            return True
+        try:
+            return float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _use_replica(self):
+        if "replica" not in self.db.engines or time.monotonic() < self._replica_down_until:
+            return False
+        if self._pinned():
+            self.stats["pinned"] += 1
+            return False
+        return True
+
+    def read_only(self, view):
+        """Decorador para vistas que sólo leen."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            session = self.db.session
+            if not self._use_replica():
+                self.stats["primary_reads"] += 1
+                return view(*args, **kwargs)
+            session.info["use_replica"] = True
+            try:
+                result = view(*args, **kwargs)
+                self.stats["replica_reads"] += 1
+                return result
+            except OperationalError as e:
+                # Réplica caída: se deja de usar un rato y se repite en la primaria
+                self._replica_down_until = time.monotonic() + self.retry_seconds
+                self.stats["replica_failures"] += 1
+                print(f"[Purchase Service] ⚠️ Réplica no disponible ({e.orig}), leyendo de la primaria")
+                session.rollback()
+                session.info.pop("use_replica", None)
+                self.stats["primary_reads"] += 1
+                return view(*args, **kwargs)
+            finally:
+                session.info.pop("use_replica", None)
+        return wrapper
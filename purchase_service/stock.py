@@ -0,0 +1,159 @@
+import datetime, os, threading, time
+from sqlalchemy import select, update
+from models import db
+from book_cache import BOOK_FIELDS
+from models.book import Book
+from models.purchase import Purchase
+from outbox import enqueue_event
+
+# ------------------------------------------------------
+# Reserva atómica de stock
+# ------------------------------------------------------
+# El stock se descuenta con un único UPDATE condicional
+#   UPDATE book SET stock = stock - q WHERE id = ? AND stock >= q
+# de modo que dos compras concurrentes del mismo libro nunca sobrevenden
+# y sólo se bloquea la fila de ese libro durante la transacción.
+# Las compras quedan "Pending Payment" con una reserva que vence; si no
+# llega el pago a tiempo, el ReservationSweeper devuelve el stock.
+# Los eventos book_updated llevan la fila completa del libro (book_rows), no
+# sólo el stock: el catálogo se queda con el evento de mayor seq de cada libro.
+
+RESERVATION_TTL = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+RESERVATION_SWEEP_INTERVAL = float(os.getenv("RESERVATION_SWEEP_INTERVAL", "30"))
+RESERVATION_SWEEP_BATCH = int(os.getenv("RESERVATION_SWEEP_BATCH", "500"))
+
+PENDING_PAYMENT = "Pending Payment"
+EXPIRED = "Expired"
+
+
+def reserve_stock(book_id, quantity, session=None):
+    """Descuenta stock si alcanza. Devuelve True si la reserva se hizo."""
+    if session is None:
+        session = db.session
+    result = session.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.stock >= quantity)
+        .values(stock=Book.stock - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_stock(book_id, quantity):
+    """Devuelve stock reservado al libro."""
+    db.session.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values(stock=Book.stock + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def current_stock(book_id, session=None):
+    """Lee el stock directamente de la base de datos (sin caché de la sesión)."""
+    if session is None:
+        session = db.session
+    return session.execute(select(Book.stock).where(Book.id == book_id)).scalar()
+
+
+def book_rows(book_ids, session=None):
+    """Filas completas (BOOK_FIELDS) de los libros, leídas en la transacción actual."""
+    if session is None:
+        session = db.session
+    rows = session.execute(
+        select(*[getattr(Book, f) for f in BOOK_FIELDS])
+        .where(Book.id.in_(book_ids))
+        .order_by(Book.id)
+    ).all()
+    return [dict(zip(BOOK_FIELDS, row)) for row in rows]
+
+
+def reservation_deadline():
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=RESERVATION_TTL)
+
+
+def place_order(session, user_id, book, quantity):
+    """Reserva el stock y crea la compra "Pending Payment" en una transacción.
+
+    book es el dict de la caché de libros (sólo se usa su precio). Recibe la
+    sesión como primer argumento para poder ejecutarse también con
+    AsyncSession.run_sync (ver async_app.py). Devuelve (compra, stock
+    restante); la compra es None si no había stock suficiente.
+    """
+    if not reserve_stock(book["id"], quantity, session):
+        session.rollback()
+        return None, current_stock(book["id"], session)
+    row = book_rows([book["id"]], session)[0]
+    remaining_stock = row["stock"]
+
+    purchase = Purchase(
+        user_id=user_id,
+        book_id=book["id"],
+        quantity=quantity,
+        total_price=book["price"] * quantity,
+        status=PENDING_PAYMENT,
+        reserved_until=reservation_deadline()
+    )
+    session.add(purchase)
+    enqueue_event("book_updated", row, session=session)
+    session.commit()
+    return purchase, remaining_stock
+
+
+def expire_reservations(limit=RESERVATION_SWEEP_BATCH):
+    """Marca como vencidas las compras sin pago y libera su stock."""
+    now = datetime.datetime.utcnow()
+    expired = db.session.execute(
+        select(Purchase.id, Purchase.book_id, Purchase.quantity)
+        .where(Purchase.status == PENDING_PAYMENT, Purchase.reserved_until < now)
+        .order_by(Purchase.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+    released = {}
+    for purchase_id, book_id, quantity in expired:
+        # Condicional: un pago que llegue a la vez gana o pierde, pero no ambos
+        result = db.session.execute(
+            update(Purchase)
+            .where(Purchase.id == purchase_id, Purchase.status == PENDING_PAYMENT)
+            .values(status=EXPIRED)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            released[book_id] = released.get(book_id, 0) + quantity
+
+    for book_id in sorted(released):
+        release_stock(book_id, released[book_id])
+    for row in book_rows(released) if released else []:
+        enqueue_event("book_updated", row)
+    db.session.commit()
+    return len(expired)
+
+
+class ReservationSweeper:
+    """Hilo que libera periódicamente las reservas vencidas."""
+
+    def __init__(self, app, interval=RESERVATION_SWEEP_INTERVAL):
+        self.app = app
+        self.interval = interval
+        self.stats = {"expired": 0, "errors": 0}
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name="reservation-sweeper").start()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    count = expire_reservations()
+                    self.stats["expired"] += count
+                    if count == RESERVATION_SWEEP_BATCH:
+                        continue
+                except Exception as e:
+                    db.session.rollback()
+                    self.stats["errors"] += 1
+                    print(f"[Purchase Service] ❌ Error liberando reservas vencidas: {e}")
+                finally:
+                    db.session.remove()
+                time.sleep(self.interval)
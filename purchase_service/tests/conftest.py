@@ -0,0 +1,13 @@
+import os, sys, tempfile
+
+# ------------------------------------------------------
+# Pruebas de purchase_service
+# ------------------------------------------------------
+# Los módulos del servicio se importan como en el contenedor (desde su
+# directorio) y app.py usa una base de datos SQLite desechable; ninguna
+# prueba necesita MySQL ni RabbitMQ.
+# Uso:  cd purchase_service && python -m pytest -q
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URI"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "purchase.db")
+os.environ.pop("DATABASE_REPLICA_URI", None)
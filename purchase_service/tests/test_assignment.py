@@ -0,0 +1,162 @@
+from collections import Counter
+import pytest
+from sqlalchemy import select
+from app import app, db
+from assignment import (AssignmentEngine, AssignmentRejected, ProviderLoad, ASSIGNED,
+                        ON_DELIVERY)
+from models.delivery import DeliveryProvider
+from models.delivery_assignment import DeliveryAssignment
+from models.purchase import Purchase
+from payments import PURCHASE_PAID
+from stock import PENDING_PAYMENT
+
+
+def loads(providers, current=None):
+    load = ProviderLoad()
+    load.rebuild(providers, current or {})
+    return load
+
+
+def test_pick_balances_by_weight():
+    load = loads([(1, 100, 1), (2, 100, 3)])
+    picks = Counter(load.pick() for _ in range(40))
+    assert picks == {1: 10, 2: 30}
+
+
+def test_pick_starts_from_current_load():
+    load = loads([(1, 10, 1), (2, 10, 1)], {1: 5})
+    assert [load.pick() for _ in range(5)] == [2] * 5
+
+
+def test_pick_respects_capacity():
+    load = loads([(1, 2, 1), (2, 1, 1)])
+    assert sorted(load.pick() for _ in range(3)) == [1, 1, 2]
+    assert load.pick() is None
+    assert load.free_slots() == 0
+
+
+def test_release_reopens_full_provider():
+    load = loads([(1, 1, 1)])
+    assert load.pick() == 1
+    assert load.pick() is None
+    load.release(1)
+    assert load.free_slots() == 1
+    assert load.pick() == 1
+
+
+def test_release_ignores_unknown_and_idle_providers():
+    load = loads([(1, 1, 1)])
+    load.release(1)
+    load.release(99)
+    assert load.load == {1: 0}
+
+
+def test_take_fills_provider_outside_pick():
+    load = loads([(1, 1, 1), (2, 5, 1)])
+    load.take(1)
+    # La entrada de 1 sigue en el heap, pero ya no tiene hueco
+    assert [load.pick() for _ in range(3)] == [2, 2, 2]
+    assert load.load == {1: 1, 2: 3}
+
+
+# ------------------------------------------------------
+# AssignmentEngine (SQLite)
+# ------------------------------------------------------
+@pytest.fixture
+def engine():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([DeliveryProvider(id=1, name="A", capacity=2, weight=1),
+                            DeliveryProvider(id=2, name="B", capacity=2, weight=1),
+                            DeliveryProvider(id=3, name="C", capacity=5, weight=1, active=False)])
+        db.session.add_all([Purchase(id=i, user_id=1, status=PURCHASE_PAID) for i in range(1, 6)])
+        db.session.add(Purchase(id=6, user_id=1, status=PENDING_PAYMENT))
+        db.session.commit()
+        yield AssignmentEngine(app, batch_size=10)
+        db.session.remove()
+
+
+def assigned_to():
+    return Counter(db.session.execute(
+        select(DeliveryAssignment.provider_id).where(DeliveryAssignment.status == ASSIGNED)
+    ).scalars())
+
+
+def test_engine_assigns_up_to_capacity(engine):
+    assert engine.assign_once() == 4
+    assert assigned_to() == {1: 2, 2: 2}
+    assert db.session.get(Purchase, 1).status == ON_DELIVERY
+    assert db.session.get(Purchase, 5).status == PURCHASE_PAID
+    assert engine.assign_once() == 0
+    assert engine.stats["waiting_for_capacity"] is True
+
+
+def test_engine_release_frees_a_slot(engine):
+    engine.assign_once()
+    engine.release(1)
+    assert engine.assign_once() == 1
+    assert assigned_to() == {1: 3, 2: 2}
+
+
+def test_manual_assign_updates_loads(engine):
+    engine.resync()
+    engine.assign(1, 1)
+    engine.assign(2, 1)
+    assert db.session.get(Purchase, 1).status == ON_DELIVERY
+    # El motor ya cuenta las asignaciones manuales: sólo queda el proveedor 2
+    assert engine.assign_once() == 2
+    assert assigned_to() == {1: 2, 2: 2}
+
+
+@pytest.mark.parametrize("purchase_id, provider_id, status_code", [
+    (99, 1, 404),   # compra inexistente
+    (6, 1, 409),    # compra sin pagar
+    (1, 99, 404),   # proveedor inexistente
+    (1, 3, 404),    # proveedor inactivo
+])
+def test_manual_assign_rejections(engine, purchase_id, provider_id, status_code):
+    with pytest.raises(AssignmentRejected) as rejected:
+        engine.assign(purchase_id, provider_id)
+    assert rejected.value.status_code == status_code
+    db.session.rollback()
+    assert assigned_to() == {}
+
+
+def test_manual_assign_rejects_full_provider(engine):
+    engine.assign(1, 1)
+    engine.assign(2, 1)
+    with pytest.raises(AssignmentRejected) as rejected:
+        engine.assign(3, 1)
+    assert rejected.value.status_code == 409
+
+
+# ------------------------------------------------------
+# Validación de /providers y /assignments/<id>
+# ------------------------------------------------------
+@pytest.mark.parametrize("body", [
+    None,
+    {"contact": "x"},
+    {"name": "D", "contact": "x", "capacity": "muchas"},
+    {"name": "D", "contact": "x", "capacity": True},
+    {"name": "D", "contact": "x", "capacity": -1},
+    {"name": "D", "contact": "x", "weight": 1.5},
+])
+def test_invalid_provider_is_rejected(engine, body):
+    response = app.test_client().post("/providers", json=body)
+    assert response.status_code == 400
+    assert db.session.query(DeliveryProvider).count() == 3
+
+
+def test_provider_defaults(engine):
+    response = app.test_client().post("/providers", json={"name": "D", "contact": "x", "weight": 0})
+    provider = db.session.get(DeliveryProvider, response.get_json()["provider_id"])
+    assert (provider.capacity, provider.weight) == (50, 1)
+
+
+@pytest.mark.parametrize("body", [None, {}, {"status": 3}, {"status": ""}, {"status": "x" * 51}])
+def test_invalid_assignment_status_is_rejected(engine, body):
+    engine.assign(1, 1)
+    response = app.test_client().put("/assignments/1", json=body)
+    assert response.status_code == 400
+    assert assigned_to() == {1: 1}
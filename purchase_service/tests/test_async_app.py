@@ -0,0 +1,37 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import async_app
+
+
+@pytest.fixture
+def observed(monkeypatch):
+    calls = []
+    monkeypatch.setattr(async_app.metrics, "observe",
+                        lambda name, value, **labels: calls.append(labels))
+    return calls
+
+
+def request():
+    return SimpleNamespace(method="GET", headers={})
+
+
+def test_instrumented_records_status(observed):
+    @async_app.instrumented("/ok")
+    async def handler(request):
+        return SimpleNamespace(status_code=201, headers={})
+
+    assert asyncio.run(handler(request())).status_code == 201
+    assert observed == [{"route": "/ok", "method": "GET", "status": "201"}]
+
+
+def test_instrumented_records_failed_handler_as_500(observed):
+    @async_app.instrumented("/boom")
+    async def handler(request):
+        raise RuntimeError("boom")
+
+    in_flight = async_app.http_stats["in_flight"]
+    with pytest.raises(RuntimeError):
+        asyncio.run(handler(request()))
+    assert observed == [{"route": "/boom", "method": "GET", "status": "500"}]
+    assert async_app.http_stats["in_flight"] == in_flight
@@ -0,0 +1,142 @@
+import time
+import jwt
+import pika
+import pytest
+import auth
+from auth import RevocationListener, TokenVerifier
+from http_client import ServiceUnavailable
+
+SECRET = "test-secret"
+
+
+def make_token(jti, user_id=1):
+    return jwt.encode({"user_id": user_id, "email": "ana@example.com", "jti": jti,
+                       "exp": int(time.time()) + 3600}, SECRET, algorithm="HS256")
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeClient:
+    """Responde GET /revocations con las respuestas dadas, en orden."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        return self.responses.pop(0)
+
+
+def verifier(*responses):
+    return TokenVerifier(secret=SECRET, mode="local", client=FakeClient(*responses),
+                         revocations_url="http://auth/revocations")
+
+
+def revocations(*jtis):
+    return FakeResponse(200, {"revocations": [{"jti": jti, "exp": time.time() + 3600}
+                                              for jti in jtis]})
+
+
+def test_loaded_revocations_reject_tokens_by_jti():
+    tokens = verifier(revocations("revocado"))
+    assert tokens.load_revocations() == 1
+    assert tokens.client.calls == [("GET", "http://auth/revocations")]
+    assert tokens.verify_local(make_token("revocado")) == (None, "Token invalidado")
+    assert tokens.verify_local(make_token("vigente"))[1] is None
+
+
+def test_cached_token_is_rejected_after_jti_revocation():
+    tokens = verifier(revocations("a"))
+    token = make_token("a")
+    assert tokens.verify_local(token)[1] is None
+    tokens.load_revocations()
+    assert tokens.verify_local(token) == (None, "Token invalidado")
+
+
+def test_failed_load_raises_service_unavailable():
+    with pytest.raises(ServiceUnavailable):
+        verifier(FakeResponse(503)).load_revocations()
+
+
+def test_revoke_message_revokes_hash_and_jti():
+    tokens = verifier()
+    first, second = make_token("a"), make_token("a", user_id=2)
+    tokens.revoke_message({"token_hash": auth.token_key(first), "jti": "a",
+                           "exp": time.time() + 3600})
+    assert tokens.verify_local(first) == (None, "Token invalidado")
+    assert tokens.verify_local(second) == (None, "Token invalidado")
+
+
+class Stop(Exception):
+    pass
+
+
+class FakeChannel:
+    def __init__(self, tokens, seen):
+        self.tokens = tokens
+        self.seen = seen
+
+    def exchange_declare(self, **kwargs):
+        pass
+
+    def queue_declare(self, **kwargs):
+        return type("Declared", (), {"method": type("Method", (), {"queue": "q"})})
+
+    def queue_bind(self, **kwargs):
+        self.seen.append("bind")
+
+    def basic_consume(self, **kwargs):
+        pass
+
+    def start_consuming(self):
+        self.seen.append(("live", self.tokens.revocations_live))
+        raise pika.exceptions.AMQPConnectionError("caída")
+
+
+class FakeConnection:
+    is_open = False
+
+    def __init__(self, tokens, seen):
+        self._channel = FakeChannel(tokens, seen)
+
+    def channel(self):
+        return self._channel
+
+
+def run_listener(tokens, monkeypatch, connections):
+    """Ejecuta _run hasta agotar las conexiones simuladas."""
+    seen = []
+
+    def sleep(seconds):
+        seen.append(("sleep", tokens.revocations_live))
+        if sum(1 for item in seen if item[0] == "sleep") == connections:
+            raise Stop()
+
+    monkeypatch.setattr(auth.pika, "BlockingConnection", lambda params: FakeConnection(tokens, seen))
+    monkeypatch.setattr(auth.time, "sleep", sleep)
+    with pytest.raises(Stop):
+        RevocationListener("rabbitmq", tokens)._run()
+    return seen
+
+
+def test_listener_loads_revocations_after_every_bind(monkeypatch):
+    tokens = verifier(revocations("a"), revocations("a", "b"))
+    seen = run_listener(tokens, monkeypatch, connections=2)
+    assert seen == ["bind", ("live", True), ("sleep", False)] * 2
+    assert len(tokens.client.calls) == 2
+    assert tokens.verify_local(make_token("b")) == (None, "Token invalidado")
+
+
+def test_listener_stays_remote_until_revocations_load(monkeypatch):
+    tokens = verifier(FakeResponse(503))
+    seen = run_listener(tokens, monkeypatch, connections=1)
+    assert seen == ["bind", ("sleep", False)]
+    assert tokens.revocations_live is False
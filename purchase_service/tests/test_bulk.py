@@ -0,0 +1,18 @@
+import pytest
+from bulk import RowError, validate_row
+
+ROW = {"title": "A", "author": "B", "price": "10.5", "stock": "3"}
+
+
+def test_valid_row_is_normalized():
+    assert validate_row(ROW) == {"title": "A", "author": "B", "description": "",
+                                 "price": 10.5, "stock": 3}
+
+
+@pytest.mark.parametrize("changes", [
+    {"price": "nan"}, {"price": float("nan")}, {"price": "inf"}, {"price": float("-inf")},
+    {"price": "diez"}, {"price": "-1"}, {"stock": float("inf")}, {"stock": "-1"}, {"title": ""},
+])
+def test_invalid_row_is_rejected(changes):
+    with pytest.raises(RowError):
+        validate_row(dict(ROW, **changes))
@@ -0,0 +1,65 @@
+import pytest
+from flask import Flask, jsonify
+from http_cache import VersionedResponseCache
+
+
+@pytest.fixture
+def cached_app():
+    state = {"version": 1, "calls": 0}
+    cache = VersionedResponseCache(lambda: state["version"])
+    app = Flask("http_cache_test")
+
+    @app.route("/books")
+    @cache.cached
+    def books():
+        state["calls"] += 1
+        return jsonify([{"id": 1, "version": state["version"]}])
+
+    return app.test_client(), cache, state
+
+
+def test_second_request_is_served_from_cache(cached_app):
+    client, cache, state = cached_app
+    first = client.get("/books")
+    second = client.get("/books")
+    assert first.status_code == second.status_code == 200
+    assert first.get_data() == second.get_data()
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert state["calls"] == 1
+    assert cache.stats == {"hits": 1, "misses": 1, "not_modified": 0}
+
+
+def test_matching_etag_returns_304_without_calling_view(cached_app):
+    client, cache, state = cached_app
+    etag = client.get("/books").headers["ETag"]
+    response = client.get("/books", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.get_data() == b""
+    assert response.headers["ETag"] == etag
+    assert state["calls"] == 1
+    assert cache.stats["not_modified"] == 1
+
+
+def test_new_version_invalidates_etag(cached_app):
+    client, cache, state = cached_app
+    etag = client.get("/books").headers["ETag"]
+    state["version"] = 2
+    response = client.get("/books", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json() == [{"id": 1, "version": 2}]
+
+
+def test_etag_depends_on_url(cached_app):
+    client, cache, state = cached_app
+    etag = client.get("/books").headers["ETag"]
+    assert client.get("/books?limit=1", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_unknown_version_bypasses_cache(cached_app):
+    client, cache, state = cached_app
+    state["version"] = None
+    client.get("/books")
+    response = client.get("/books")
+    assert "ETag" not in response.headers
+    assert state["calls"] == 2
@@ -0,0 +1,119 @@
+import time
+import pytest
+import requests
+from http_client import CircuitBreaker, CircuitOpen, ServiceClient, ServiceUnavailable
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Devuelve las respuestas (o lanza las excepciones) en el orden dado."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+def client(*outcomes, retries=0, breaker=None):
+    service = ServiceClient("auth", timeout=2, connect_timeout=0.1, retries=retries,
+                            backoff_base=0.001, backoff_max=0.001, breaker=breaker)
+    service.session = FakeSession(*outcomes)
+    return service
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.snapshot()["open"] is False
+    breaker.record_failure()
+    assert breaker.snapshot()["open"] is True
+    assert not breaker.allow()
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_breaker_success_resets_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=0.01)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.snapshot()["opens"] == 2
+
+
+def test_breaker_release_frees_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_client_retries_retryable_status():
+    service = client(503, 200, retries=2)
+    assert service.request("POST", "http://auth/validate").status_code == 200
+    assert service.session.calls == 2
+    assert service.stats()["retries"] == 1
+
+
+def test_client_returns_client_errors_without_retry():
+    service = client(401, retries=2)
+    assert service.request("POST", "http://auth/validate").status_code == 401
+    assert service.session.calls == 1
+    assert service.breaker.state == "closed"
+
+
+def test_client_opens_circuit_then_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    service = client(requests.ConnectionError("down"), requests.Timeout("slow"), breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(ServiceUnavailable):
+            service.request("POST", "http://auth/validate")
+    with pytest.raises(CircuitOpen):
+        service.request("POST", "http://auth/validate")
+    assert service.session.calls == 2
+    assert service.stats()["timeouts"] == 1
+
+
+def test_client_closes_circuit_after_successful_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.01)
+    service = client(502, 200, breaker=breaker)
+    with pytest.raises(ServiceUnavailable):
+        service.request("GET", "http://auth/")
+    assert breaker.state == "open"
+    time.sleep(0.02)
+    assert service.request("GET", "http://auth/").status_code == 200
+    assert breaker.state == "closed"
@@ -0,0 +1,122 @@
+import time
+import pytest
+from sqlalchemy import select, update
+import app as app_module
+from app import app, db
+from models.book import Book
+from models.book_version import BookVersion
+from models.outbox import OutboxEvent
+from outbox import OutboxRelay, enqueue_event
+
+
+class FakePublisher:
+    queue_name = "book_updates"
+    fanout_exchange = None
+
+    def __init__(self):
+        self.sent = []
+        self.fail = False
+
+    def publish_many(self, messages, timeout=30):
+        if self.fail:
+            raise ConnectionError("broker caído")
+        self.sent.extend(messages)
+
+
+@pytest.fixture
+def relay():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(BookVersion(id=1, version=0))
+        db.session.commit()
+        relay = OutboxRelay(app, FakePublisher(), batch_size=10)
+        yield relay
+        relay.detach()
+        db.session.remove()
+
+
+def enqueue(*events):
+    for event_type, payload in events:
+        enqueue_event(event_type, payload, book_event=event_type.startswith("book_"))
+    db.session.commit()
+
+
+def claim_elsewhere(*seqs):
+    """Simula el lote que otro relay tiene reservado y aún no confirmó."""
+    db.session.execute(update(OutboxEvent).where(OutboxEvent.id.in_(seqs))
+                       .values(claimed_at=time.time(), claimed_by="other-host:1"))
+    db.session.commit()
+
+
+def sent(relay):
+    return [(m["seq"], m["event"]) for m in relay.publisher.sent]
+
+
+def remaining():
+    return db.session.execute(select(OutboxEvent.id).order_by(OutboxEvent.id)).scalars().all()
+
+
+def test_drain_publishes_in_order_and_deletes(relay):
+    enqueue(("book_created", {"id": 5, "title": "A"}), ("book_updated", {"id": 5, "stock": 9}))
+    assert relay.drain_once() == 2
+    assert sent(relay) == [(1, "book_created"), (2, "book_updated")]
+    assert remaining() == []
+    assert db.session.get(BookVersion, 1).version == 1
+
+
+def test_book_waits_for_older_event_claimed_elsewhere(relay):
+    enqueue(("book_created", {"id": 5, "title": "A"}), ("book_updated", {"id": 5, "stock": 9}),
+            ("book_updated", {"id": 6, "stock": 1}), ("payment_completed", {"id": 1}))
+    claim_elsewhere(1)
+    assert relay.drain_once() == 2
+    assert sent(relay) == [(3, "book_updated"), (4, "payment_completed")]
+    # El otro relay confirma su lote: ya puede salir el siguiente evento del libro 5
+    db.session.execute(OutboxEvent.__table__.delete().where(OutboxEvent.id == 1))
+    db.session.commit()
+    assert relay.drain_once() == 1
+    assert sent(relay)[-1] == (2, "book_updated")
+
+
+def test_batch_event_elsewhere_blocks_later_book_events(relay):
+    enqueue(("book_batch_updated", [{"id": 1, "stock": 1}, {"id": 2, "stock": 2}]),
+            ("book_updated", {"id": 7, "stock": 1}), ("payment_failed", {"id": 3}))
+    claim_elsewhere(1)
+    assert relay.drain_once() == 1
+    assert sent(relay) == [(3, "payment_failed")]
+
+
+def test_batch_event_waits_for_older_events_of_its_books(relay):
+    enqueue(("book_updated", {"id": 2, "stock": 5}),
+            ("book_batch_updated", [{"id": 1, "stock": 1}, {"id": 2, "stock": 2}]),
+            ("book_updated", {"id": 1, "stock": 0}), ("book_updated", {"id": 8, "stock": 3}))
+    claim_elsewhere(1)
+    assert relay.drain_once() == 1
+    assert sent(relay) == [(4, "book_updated")]
+
+
+def test_failed_batch_is_released_and_retried_first(relay):
+    enqueue(("book_created", {"id": 5, "title": "A"}))
+    relay.publisher.fail = True
+    with pytest.raises(ConnectionError):
+        relay.drain_once()
+    assert db.session.get(OutboxEvent, 1).claimed_at is None
+    enqueue(("book_updated", {"id": 5, "stock": 9}))
+    relay.publisher.fail = False
+    assert relay.drain_once() == 2
+    assert sent(relay) == [(1, "book_created"), (2, "book_updated")]
+
+
+def test_new_version_is_never_filled_from_stale_book_cache(relay, monkeypatch):
+    db.session.add(Book(id=5, title="A", author="B", description="", price=10.0, stock=3))
+    db.session.commit()
+    db.session.get(Book, 5).stock = 1
+    enqueue_event("book_updated", {"id": 5, "stock": 1})
+    db.session.commit()
+    relay.claim(db.session)
+    # Como en otra réplica que aún no recibió book_updated por book_events
+    monkeypatch.setattr(app_module.book_cache, "enabled", True)
+    app_module.book_cache._cache.set(5, {"id": 5, "title": "A", "stock": 3})
+    response = app.test_client().get("/books/5")
+    assert response.headers["ETag"].startswith('"1-')
+    assert response.get_json()["stock"] == 1
@@ -0,0 +1,120 @@
+import datetime
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+import app as app_module
+from app import app, db
+from models.outbox import OutboxEvent
+from models.payment import Payment
+from models.purchase import Purchase
+from payments import PAYMENT_COMPLETED, PAYMENT_FAILED, PURCHASE_PAID
+from stock import PENDING_PAYMENT
+
+
+@pytest.fixture
+def client(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(app_module.payment_processor, "submit", submitted.append)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        purchase = Purchase(user_id=1, quantity=1, total_price=10.0, status=PENDING_PAYMENT,
+                            reserved_until=datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+        db.session.add(purchase)
+        db.session.commit()
+        client = app.test_client()
+        client.purchase_id = purchase.id
+        client.submitted = submitted
+        yield client
+        db.session.remove()
+
+
+def pay(client, key, amount=10.0, purchase_id=None):
+    body = {"purchase_id": purchase_id or client.purchase_id, "amount": amount,
+            "payment_method": "card"}
+    return client.post("/payment", json=body, headers={"Idempotency-Key": key})
+
+
+def duplicate_key(*args):
+    """accept_payment como si otra petición hubiera insertado la misma clave antes."""
+    raise IntegrityError("INSERT INTO payment", None, Exception("Duplicate entry"))
+
+
+def test_payment_is_accepted_once(client):
+    first = pay(client, "key-1")
+    assert first.status_code == 202
+    assert first.get_json()["status"] == "Pending"
+    assert first.headers["Location"] == f"/payment/{first.get_json()['payment_id']}"
+    assert client.submitted == [first.get_json()["payment_id"]]
+
+
+def test_same_key_replays_existing_payment(client):
+    payment_id = pay(client, "key-1").get_json()["payment_id"]
+    replay = pay(client, "key-1")
+    assert replay.status_code == 200
+    assert replay.get_json()["payment_id"] == payment_id
+    assert client.submitted == [payment_id]
+
+
+def test_same_key_with_other_data_is_rejected(client):
+    pay(client, "key-1")
+    assert pay(client, "key-1", amount=12.0).status_code == 422
+    assert pay(client, "key-1", purchase_id=client.purchase_id + 1).status_code == 422
+
+
+@pytest.mark.parametrize("body", [
+    None,
+    {"amount": 10.0, "payment_method": "card"},
+    {"purchase_id": "1", "amount": 10.0, "payment_method": "card"},
+    {"purchase_id": 1, "amount": "diez", "payment_method": "card"},
+    {"purchase_id": 1, "amount": -10.0, "payment_method": "card"},
+    {"purchase_id": 1, "amount": True, "payment_method": "card"},
+    {"purchase_id": 1, "amount": "inf", "payment_method": "card"},
+    {"purchase_id": True, "amount": 10.0, "payment_method": "card"},
+    {"purchase_id": 1, "amount": 10.0, "payment_method": ""},
+])
+def test_invalid_body_is_rejected(client, body):
+    response = client.post("/payment", json=body, headers={"Idempotency-Key": "key-1"})
+    assert response.status_code == 400
+    assert client.submitted == []
+
+
+def test_overlong_key_is_rejected(client):
+    assert pay(client, "k" * 65).status_code == 400
+
+
+def test_concurrent_insert_replays_committed_payment(client, monkeypatch):
+    payment_id = pay(client, "key-1").get_json()["payment_id"]
+    monkeypatch.setattr(app_module, "accept_payment", duplicate_key)
+    replay = pay(client, "key-1")
+    assert replay.status_code == 200
+    assert replay.get_json()["payment_id"] == payment_id
+    assert pay(client, "key-1", amount=12.0).status_code == 422
+    assert client.submitted == [payment_id]
+
+
+def test_concurrent_insert_not_yet_committed_asks_to_retry(client, monkeypatch):
+    monkeypatch.setattr(app_module, "accept_payment", duplicate_key)
+    response = pay(client, "key-1")
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "1"
+    assert client.submitted == []
+
+
+def test_result_is_recorded_only_while_processing(client):
+    payment_id = pay(client, "key-1").get_json()["payment_id"]
+    processor = app_module.payment_processor
+    assert processor._claim(payment_id) is not None
+    assert processor._record(payment_id, PAYMENT_COMPLETED, reference="ref-1")
+    # Un worker que llega tarde (p. ej. tras recuperar el pago por atascado) no lo pisa
+    assert not processor._record(payment_id, PAYMENT_FAILED, error="sin respuesta")
+    payment = db.session.get(Payment, payment_id)
+    assert (payment.payment_status, payment.gateway_reference) == (PAYMENT_COMPLETED, "ref-1")
+    assert payment.purchase.status == PURCHASE_PAID
+    assert db.session.execute(select(OutboxEvent.event_type)).scalars().all() == ["payment_completed"]
+
+
+@pytest.mark.parametrize("limit, status_code", [(1, 200), (1000, 200), (0, 400), (1001, 400)])
+def test_list_limit_out_of_range_is_rejected(client, limit, status_code):
+    pay(client, "key-1")
+    assert client.get(f"/payments?limit={limit}").status_code == status_code
@@ -0,0 +1,154 @@
+import json, threading
+from concurrent.futures import TimeoutError as FutureTimeout
+import pika
+import pytest
+import publisher as publisher_module
+from publisher import BookEventPublisher, PublisherOverloaded, encode_batch
+
+
+class FakeChannel:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def queue_declare(self, queue, arguments=None):
+        self.broker.declared.append(queue)
+
+    def exchange_declare(self, exchange, exchange_type):
+        self.broker.declared.append(exchange)
+
+    def confirm_delivery(self):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        if self.broker.failures:
+            raise self.broker.failures.pop(0)
+        self.broker.published.append((exchange or routing_key, json.loads(body)))
+
+
+class FakeConnection:
+    is_open = True
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def channel(self):
+        return FakeChannel(self.broker)
+
+    def process_data_events(self, time_limit=0):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeBroker:
+    """Sustituye a pika.BlockingConnection; connected controla cuándo se puede conectar."""
+
+    def __init__(self):
+        self.published = []
+        self.declared = []
+        self.failures = []
+        self.connects = 0
+        self.connected = threading.Event()
+        self.connected.set()
+
+    def __call__(self, parameters):
+        self.connected.wait()
+        self.connects += 1
+        return FakeConnection(self)
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = FakeBroker()
+    monkeypatch.setattr(publisher_module.pika, "BlockingConnection", broker)
+    return broker
+
+
+def make_publisher(**kwargs):
+    options = dict(queue_name="book_updates", linger_ms=50, partitions=1)
+    options.update(kwargs)
+    return BookEventPublisher("rabbitmq", **options)
+
+
+def book_event(book_id, seq, **data):
+    return {"event": "book_updated", "seq": seq, "data": dict(data, id=book_id)}
+
+
+def test_encode_batch_wraps_several_messages():
+    assert json.loads(encode_batch([{"a": 1}])) == {"a": 1}
+    assert json.loads(encode_batch([{"a": 1}, {"b": 2}])) == {"event": "batch",
+                                                              "events": [{"a": 1}, {"b": 2}]}
+
+
+def test_concurrent_events_share_one_confirmed_message(broker):
+    pub = make_publisher()
+    futures = [pub.publish("book_updated", {"id": i, "stock": i}) for i in range(3)]
+    for future in futures:
+        assert future.result(timeout=5) is True
+    assert len(broker.published) == 1
+    queue, body = broker.published[0]
+    assert queue == "book_updates"
+    assert [e["data"]["id"] for e in body["events"]] == [0, 1, 2]
+    assert pub.stats["published"] == 3 and pub.stats["batches"] == 1
+    assert broker.connects == 1
+    pub.close()
+
+
+def test_batches_are_split_by_partition(broker):
+    pub = make_publisher(partitions=2, fanout_exchange="book_events")
+    pub.publish_many([book_event(1, 1, stock=1), book_event(2, 2, stock=2),
+                      {"event": "book_batch_updated", "seq": 3,
+                       "data": [{"id": 3, "stock": 3}, {"id": 4, "stock": 4}]}], timeout=5)
+    sent = dict(broker.published)
+    assert set(broker.declared) == {"book_updates.0", "book_updates.1", "book_events"}
+    assert [e["data"] for e in sent["book_updates.0"]["events"]] == [
+        {"id": 2, "stock": 2}, [{"id": 4, "stock": 4}]]
+    assert [e["data"] for e in sent["book_updates.1"]["events"]] == [
+        {"id": 1, "stock": 1}, [{"id": 3, "stock": 3}]]
+    # El exchange fanout recibe el lote completo
+    assert len(sent["book_events"]["events"]) == 3
+    pub.close()
+
+
+def test_nacked_batch_is_retried(broker, monkeypatch):
+    monkeypatch.setattr(publisher_module.time, "sleep", lambda seconds: None)
+    broker.failures.append(pika.exceptions.NackError([]))
+    pub = make_publisher()
+    pub.publish_many([book_event(1, 1, stock=1)], timeout=5)
+    assert len(broker.published) == 1
+    assert pub.stats["errors"] == 1
+    pub.close()
+
+
+def test_lost_connection_reconnects_and_resends(broker):
+    broker.failures.append(pika.exceptions.StreamLostError("reset"))
+    pub = make_publisher()
+    pub.publish_many([book_event(1, 1, stock=1)], timeout=5)
+    assert len(broker.published) == 1
+    assert broker.connects == 2 and pub.stats["reconnects"] == 1
+    pub.close()
+
+
+def test_timed_out_batch_is_not_sent_later(broker):
+    broker.connected.clear()
+    pub = make_publisher()
+    with pytest.raises(FutureTimeout):
+        pub.publish_many([book_event(1, 1, stock=1)], timeout=0.05)
+    broker.connected.set()
+    pub.publish_many([book_event(2, 2, stock=2)], timeout=5)
+    assert [body["data"]["id"] for _, body in broker.published] == [2]
+    assert pub.stats["cancelled"] == 1
+    pub.close()
+
+
+def test_full_local_queue_rejects_events(broker):
+    broker.connected.clear()
+    pub = make_publisher(max_pending=1, linger_ms=0)
+    pub.publish("book_updated", {"id": 1})
+    # El hilo de E/S puede haber tomado ya el primero: llenar la cola de nuevo
+    with pytest.raises(PublisherOverloaded):
+        for i in range(3):
+            pub.publish("book_updated", {"id": i})
+    broker.connected.set()
+    pub.close()
@@ -0,0 +1,48 @@
+import datetime, json
+import pytest
+from sqlalchemy import select
+from app import app, db
+from models.book import Book
+from models.outbox import OutboxEvent
+from models.purchase import Purchase
+from stock import EXPIRED, PENDING_PAYMENT, expire_reservations, place_order
+
+BOOK = {"id": 1, "title": "A", "author": "B", "description": "", "price": 10.0}
+
+
+@pytest.fixture
+def session():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Book(stock=3, **BOOK))
+        db.session.commit()
+        yield db.session
+        db.session.remove()
+
+
+def events():
+    return [(event_type, json.loads(payload)) for event_type, payload in db.session.execute(
+        select(OutboxEvent.event_type, OutboxEvent.payload).order_by(OutboxEvent.id))]
+
+
+def test_order_reserves_stock_and_publishes_full_row(session):
+    purchase, remaining = place_order(session, 7, dict(BOOK, stock=3), 2)
+    assert remaining == 1
+    assert purchase.status == PENDING_PAYMENT and purchase.total_price == 20.0
+    assert events() == [("book_updated", dict(BOOK, stock=1))]
+
+
+def test_order_without_stock_changes_nothing(session):
+    purchase, remaining = place_order(session, 7, dict(BOOK, stock=3), 4)
+    assert purchase is None and remaining == 3
+    assert events() == []
+
+
+def test_expired_reservation_returns_stock_with_full_row(session):
+    purchase, _ = place_order(session, 7, dict(BOOK, stock=3), 2)
+    purchase.reserved_until = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    session.commit()
+    assert expire_reservations() == 1
+    assert session.get(Purchase, purchase.id).status == EXPIRED
+    assert events()[-1] == ("book_updated", dict(BOOK, stock=3))
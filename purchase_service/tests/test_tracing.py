@@ -0,0 +1,19 @@
+from tracing import parse_traceparent
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+
+def test_parse_traceparent_sampled():
+    assert parse_traceparent(f"00-{TRACE_ID}-{SPAN_ID}-01") == (TRACE_ID, SPAN_ID, True)
+
+
+def test_parse_traceparent_not_sampled():
+    assert parse_traceparent(f" 00-{TRACE_ID}-{SPAN_ID}-00 ") == (TRACE_ID, SPAN_ID, False)
+
+
+def test_parse_traceparent_invalid():
+    for value in (None, "", "garbage", f"00-{TRACE_ID}-{SPAN_ID}",
+                  f"00-{TRACE_ID[:-1]}-{SPAN_ID}-01", f"00-{TRACE_ID}-{SPAN_ID}-zz",
+                  f"00-{'x' * 32}-{SPAN_ID}-01"):
+        assert parse_traceparent(value) is None